@@ -25,9 +25,45 @@ def create_app(config_name: str | None = None) -> Flask:
 
     app.config.from_object(get_config(config_name))
 
+    from app.sqlite_profile import init_sqlite, sqlite_engine_options
+
     # Extensions
+    sqlite_engine_options(app)
     db.init_app(app)
     migrate.init_app(app, db)
+    init_sqlite(app, db)
+
+    from app.services.instrumentation import instrumentation
+
+    instrumentation.init_app(app, db)
+
+    from app.services.sql_profiler import sql_profiler
+
+    sql_profiler.init_app(app, db)
+
+    from app.repositories.reading_repository import init_write_behind
+
+    init_write_behind(app)
+
+    from app.services.device_registry import device_registry
+
+    device_registry.init_app(app)
+
+    from app.services.compression import sample_compressor
+
+    sample_compressor.init_app(app)
+
+    from app.services.summary_counters import summary_counters
+
+    summary_counters.init_app(app)
+
+    from app.services.rule_engine import rule_engine
+
+    rule_engine.init_app(app)
+
+    from app.services.event_log import event_log
+
+    event_log.init_app(app)
     CORS(app, resources={r"/api/*": {"origins": "*"}})
 
     # Blueprints
@@ -35,6 +71,10 @@ def create_app(config_name: str | None = None) -> Flask:
 
     register_blueprints(app)
 
+    from app.cli import register_commands
+
+    register_commands(app)
+
     def _seed_admin():
         """Crea/actualiza un admin por defecto si no existe."""
         try:
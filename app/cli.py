@@ -0,0 +1,181 @@
+import time
+from datetime import datetime
+
+import click
+from flask import Flask
+
+
+def register_commands(app: Flask) -> None:
+    """Registra los comandos `flask ...` de mantenimiento."""
+
+    @app.cli.group("schema")
+    def schema():
+        """Esquema de la base (actualizacion de bases ya desplegadas)."""
+
+    @schema.command("upgrade")
+    @click.option("--dry-run", is_flag=True, help="Solo muestra el DDL.")
+    def schema_upgrade(dry_run: bool):
+        """Crea las tablas y columnas nuevas que falten (idempotente; correr tras cada despliegue)."""
+
+        from app.services.schema_service import SchemaService
+
+        statements = SchemaService().upgrade(dry_run=dry_run)
+        for statement in statements:
+            click.echo(f"{statement};")
+        if not statements:
+            click.echo("El esquema ya esta al dia.")
+
+    @app.cli.group("rollups")
+    def rollups():
+        """Tablas de rollup de lecturas (1m/1h/1d)."""
+
+    @rollups.command("rebuild")
+    @click.option("--home-id", type=int, default=None, help="Solo este hogar (por defecto todos).")
+    @click.option(
+        "--since",
+        type=click.DateTime(formats=["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"]),
+        default=None,
+        help="Recalcular desde esta fecha UTC (se alinea a la medianoche local del hogar).",
+    )
+    def rollups_rebuild(home_id: int | None, since: datetime | None):
+        """Recalcula los rollups a partir de la tabla readings (backfill)."""
+
+        from app.repositories import HomeRepository, RollupRepository
+
+        repo = RollupRepository()
+        home_ids = [home_id] if home_id else [h.id for h in HomeRepository().list_homes()]
+        for hid in home_ids:
+            count = repo.rebuild(hid, since=since)
+            click.echo(f"home {hid}: {count} lecturas agregadas")
+
+    @app.cli.group("partitions")
+    def partitions():
+        """Particiones por rango de timestamp de readings/events (MySQL/MariaDB)."""
+
+    @partitions.command("init")
+    @click.option("--dry-run", is_flag=True, help="Solo muestra el DDL.")
+    @click.option("--yes", is_flag=True, help="No pide confirmacion.")
+    def partitions_init(dry_run: bool, yes: bool):
+        """Convierte readings/events en tablas particionadas (reconstruye la tabla: hacerlo en ventana de mantenimiento)."""
+
+        from app.services.retention_service import RetentionService
+
+        click.echo(
+            "Aviso: MySQL no admite claves foraneas en tablas particionadas. Se eliminan las FKs de "
+            "readings, events y telemetry_samples (se pierde ON DELETE CASCADE) y la PK pasa a (id, timestamp). "
+            "Los borrados de dispositivos/hogares hechos por la app limpian esas filas; un DELETE manual no.",
+            err=True,
+        )
+        if not dry_run and not yes:
+            click.confirm("Continuar?", abort=True)
+        try:
+            statements = RetentionService().init_partitions(dry_run=dry_run)
+        except RuntimeError as exc:
+            raise click.ClickException(str(exc))
+        for statement in statements:
+            click.echo(f"{statement};")
+
+    @partitions.command("list")
+    def partitions_list():
+        """Lista las particiones existentes."""
+
+        from app.repositories.partition_repository import PARTITIONED_TABLES, PartitionRepository
+
+        repo = PartitionRepository()
+        if not repo.supported:
+            click.echo("El motor actual no usa particiones.")
+            return
+        for table in PARTITIONED_TABLES:
+            for name, upper in repo.list_partitions(table):
+                click.echo(f"{table}\t{name}\t< {upper or 'MAXVALUE'}")
+
+    @app.cli.group("retention")
+    def retention():
+        """Retencion por hogar de readings/events."""
+
+    @retention.command("prune")
+    @click.option("--dry-run", is_flag=True, help="Solo informa lo que se archivaria y eliminaria.")
+    def retention_prune(dry_run: bool):
+        """Crea particiones futuras, archiva y elimina datos vencidos (pensado para cron diario)."""
+
+        from app.services.retention_service import RetentionService
+
+        report = RetentionService().prune(dry_run=dry_run)
+        for statement in report["created"]:
+            click.echo(f"{statement};")
+        for item in report["dropped"]:
+            click.echo(f"drop {item['table']}.{item['partition']}: {item['rows']} filas")
+        for item in report["deleted"]:
+            click.echo(f"delete {item['table']} home {item['home_id']}: {item['rows']} filas")
+        for path in report["archives"]:
+            click.echo(f"archivo: {path}")
+
+    @app.cli.group("readings")
+    def readings():
+        """Exportacion/importacion masiva de la telemetria."""
+
+    date_type = click.DateTime(formats=["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"])
+    table_option = click.option(
+        "--table",
+        type=click.Choice(["readings", "telemetry_samples"]),
+        default=None,
+        help="Tabla a transferir (por defecto la de TELEMETRY_STORAGE).",
+    )
+    format_option = click.option(
+        "--format",
+        "fmt",
+        type=click.Choice(["csv", "jsonl", "parquet"]),
+        default=None,
+        help="Formato (por defecto segun la extension; .gz comprime CSV/JSONL).",
+    )
+
+    def _transfer(table: str | None):
+        from app.services.bulk_io import BulkTransfer
+
+        if table is None:
+            table = "telemetry_samples" if app.config.get("TELEMETRY_STORAGE") == "samples" else "readings"
+        return BulkTransfer(table)
+
+    @readings.command("export")
+    @click.argument("path")
+    @table_option
+    @format_option
+    @click.option("--home-id", type=int, default=None, help="Solo este hogar.")
+    @click.option("--since", type=date_type, default=None, help="Desde esta fecha UTC (inclusive).")
+    @click.option("--until", type=date_type, default=None, help="Hasta esta fecha UTC (exclusive).")
+    @click.option("--chunk-size", type=int, default=10000, show_default=True, help="Filas por lectura del cursor.")
+    def readings_export(path, table, fmt, home_id, since, until, chunk_size):
+        """Exporta la tabla a PATH ("-" = stdout) leyendo con un cursor del servidor."""
+
+        try:
+            transfer = _transfer(table)
+            started = time.monotonic()
+            rows = transfer.export(path, fmt, chunk_size=chunk_size, home_id=home_id, since=since, until=until)
+        except (RuntimeError, ValueError) as exc:
+            raise click.ClickException(str(exc))
+        if path != "-":
+            click.echo(f"{transfer.name}: {rows} filas exportadas en {time.monotonic() - started:.1f} s")
+
+    @readings.command("import")
+    @click.argument("path")
+    @table_option
+    @format_option
+    @click.option("--batch-size", type=int, default=5000, show_default=True, help="Filas por INSERT/commit.")
+    @click.option("--keep-ids", is_flag=True, help="Conserva la columna id (por defecto se asignan ids nuevos).")
+    def readings_import(path, table, fmt, batch_size, keep_ids):
+        """Importa PATH ("-" = stdin) con INSERTs multi-fila por lotes.
+
+        device_latest se actualiza con cada lote; los rollups no se recalculan:
+        correr `flask rollups rebuild` despues.
+        """
+
+        try:
+            transfer = _transfer(table)
+            started = time.monotonic()
+            rows = transfer.import_(path, fmt, batch_size=batch_size, keep_ids=keep_ids)
+        except (RuntimeError, ValueError) as exc:
+            raise click.ClickException(str(exc))
+        click.echo(f"{transfer.name}: {rows} filas importadas en {time.monotonic() - started:.1f} s")
+
+
+__all__ = ["register_commands"]
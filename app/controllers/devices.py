@@ -1,14 +1,18 @@
 ﻿from __future__ import annotations
 
 import os
+import threading
 from typing import Any, Dict
 
 import requests
-from flask import Blueprint, current_app, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, make_response, request, stream_with_context
 
+from app.repositories.write_behind import WriteBehindUnavailable
 from app.services.control_service import ControlService
 from app.services.device_service import DeviceService
-from app.services.telemetry_service import TelemetryService
+from app.services.telemetry_service import SampleError, TelemetryService
+from app.services.proxy_cache import CircuitBreaker, ProxyCache
+from app.services.upstream_client import UpstreamClient
 
 
 # Blueprint raiz /api usado por el frontend local.
@@ -18,6 +22,45 @@ from app.services.telemetry_service import TelemetryService
 REMOTE_API_ROOT = os.getenv("REMOTE_API_ROOT", "http://44.222.106.109:8000")
 
 
+def _local_mode() -> bool:
+    """Con REMOTE_API_ROOT vacio la app atiende /api con sus servicios locales."""
+
+    return not REMOTE_API_ROOT
+
+
+_upstream_client: UpstreamClient | None = None
+_sensor_cache: ProxyCache | None = None
+_slots: Dict[str, threading.BoundedSemaphore] = {}
+
+
+def _upstream() -> UpstreamClient:
+    """Cliente HTTP compartido (pool keep-alive) hacia REMOTE_API_ROOT."""
+
+    global _upstream_client
+    if _upstream_client is None:
+        _upstream_client = UpstreamClient.from_config(REMOTE_API_ROOT, current_app.config)
+    return _upstream_client
+
+
+def _proxy_cache() -> ProxyCache:
+    """Cache SWR + single-flight + circuit breaker de las lecturas proxyadas."""
+
+    global _sensor_cache
+    if _sensor_cache is None:
+        config = current_app.config
+        _sensor_cache = ProxyCache(
+            ttl=config.get("PROXY_CACHE_TTL", 2.0),
+            stale_ttl=config.get("PROXY_CACHE_STALE", 60.0),
+            breaker=CircuitBreaker(
+                failure_threshold=config.get("PROXY_BREAKER_FAILURES", 5),
+                reset_timeout=config.get("PROXY_BREAKER_RESET", 30.0),
+            ),
+            submit=_upstream().submit,
+            wait_timeout=config.get("UPSTREAM_CONNECT_TIMEOUT", 2.0) + config.get("UPSTREAM_READ_TIMEOUT", 5.0),
+        )
+    return _sensor_cache
+
+
 def _auth_headers() -> Dict[str, str]:
     token = current_app.config.get("API_TOKEN", "")
     headers: Dict[str, str] = {}
@@ -26,14 +69,33 @@ def _auth_headers() -> Dict[str, str]:
     return headers
 
 
+def _api_key_error():
+    """En ingesta local, exige X-API-Key si API_TOKEN esta configurado."""
+
+    token = current_app.config.get("API_TOKEN", "")
+    if token and request.headers.get("X-API-Key") != token:
+        return jsonify({"error": "unauthorized"}), 401
+    return None
+
+
 devices_bp = Blueprint("devices", __name__, url_prefix="/api")
 
-# Instancias locales (no se usan para EC2 pero se conservan por si las necesitas)
+# Instancias locales: atienden /api cuando REMOTE_API_ROOT esta vacio (modo local)
 telemetry_service = TelemetryService()
 control_service = ControlService()
 device_service = DeviceService()
 
 
+@devices_bp.errorhandler(WriteBehindUnavailable)
+def _write_behind_unavailable(exc):
+    """Buffer write-behind lleno o base caida: el cliente reintenta, nada se descarta."""
+
+    resp = jsonify({"error": "ingest_unavailable", "detail": str(exc)})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = "5"
+    return resp
+
+
 @devices_bp.get("")
 @devices_bp.get("/")
 def list_telemetry():
@@ -43,19 +105,15 @@ def list_telemetry():
     Si el backend remoto responde con error, devolvemos el error tal cual.
     """
 
-    params: Dict[str, Any] = {}
+    if _local_mode():
+        return jsonify(telemetry_service.get_latest(request.args.get("device", "esp32-1")))
+
+    params = _device_params()
     if "limit" in request.args:
         params["limit"] = request.args["limit"]
-    if "device" in request.args:
-        params["device"] = request.args["device"]
 
     try:
-        resp = requests.get(
-            f"{REMOTE_API_ROOT}/api",
-            params=params,
-            headers=_auth_headers(),
-            timeout=5,
-        )
+        resp = _upstream().get("/api", params=params, headers=_auth_headers())
     except requests.RequestException as exc:  # pragma: no cover - red
         return jsonify({"error": "remote_unreachable", "detail": str(exc)}), 502
 
@@ -77,37 +135,102 @@ def ingest_telemetry():
     """
 
     payload = request.get_json(silent=True) or {}
+    if _local_mode():
+        error = _api_key_error()
+        if error:
+            return error
+        try:
+            return jsonify(telemetry_service.ingest(payload)), 200
+        except SampleError as exc:
+            return jsonify({"error": "invalid_sample", "detail": str(exc)}), 400
     try:
-        resp = requests.post(
-            f"{REMOTE_API_ROOT}/api",
-            json=payload,
-            headers=_auth_headers(),
-            timeout=5,
-        )
+        resp = _upstream().post("/api", json=payload, headers=_auth_headers())
     except requests.RequestException as exc:  # pragma: no cover - red
         return jsonify({"error": "remote_unreachable", "detail": str(exc)}), 502
 
     return jsonify(resp.json()), resp.status_code
 
 
-def _proxy_sensor(sensor_name: str):
-    """Llama al backend remoto (/api/<sensor>) y normaliza el formato.
+@devices_bp.post("/batch")
+def ingest_batch():
+    """Ingesta en lote; en modo proxy se reenvia a REMOTE_API_ROOT como POST /api.
 
-    El backend remoto devuelve: {device, sensor, value, ts, time}.
-    Aqui lo convertimos a: {device, <sensor_name>: value, timestamp}.
+    Pensado para gateways que acumulan muestras mientras estan offline. Acepta un
+    arreglo de payloads con el mismo formato que POST /api, o bien
+    {"device": "...", "samples": [...]} donde `device` es el valor por defecto.
+    Cada muestra puede traer `ts` (epoch) o `timestamp` (ISO) con su hora original.
+    Todas las lecturas se insertan con un solo executemany y un unico commit; si
+    alguna muestra es invalida se rechaza el lote completo con 400 y su `index`.
     """
 
+    if not _local_mode():
+        try:
+            resp = _upstream().post("/api/batch", json=request.get_json(silent=True), headers=_auth_headers())
+        except requests.RequestException as exc:  # pragma: no cover - red
+            return jsonify({"error": "remote_unreachable", "detail": str(exc)}), 502
+        try:
+            data = resp.json()
+        except ValueError:  # pragma: no cover - formato inesperado
+            data = {"error": "invalid_json"}
+        return jsonify(data), resp.status_code
+
+    error = _api_key_error()
+    if error:
+        return error
+
+    body = request.get_json(silent=True)
+    default_device = "esp32-1"
+    samples = body
+    if isinstance(body, dict):
+        samples = body.get("samples")
+        default_device = body.get("device") or default_device
+    if not isinstance(default_device, str):
+        return jsonify({"error": "invalid_payload", "detail": "device debe ser un texto"}), 400
+    if not isinstance(samples, list) or not all(isinstance(s, dict) for s in samples):
+        return jsonify({"error": "invalid_payload", "detail": "se espera un arreglo de muestras"}), 400
+
+    max_samples = current_app.config.get("INGEST_BATCH_MAX", 5000)
+    if len(samples) > max_samples:
+        return jsonify({"error": "batch_too_large", "max": max_samples}), 413
+
+    try:
+        return jsonify(telemetry_service.ingest_batch(samples, default_device=default_device)), 200
+    except SampleError as exc:
+        return jsonify({"error": "invalid_sample", "index": exc.index, "detail": str(exc)}), 400
+
+
+def _device_params() -> Dict[str, Any]:
     params: Dict[str, Any] = {}
     if "device" in request.args:
         params["device"] = request.args["device"]
+    return params
+
+
+def _proxy_sensor(
+    sensor_name: str,
+    params: Dict[str, Any] | None = None,
+    headers: Dict[str, str] | None = None,
+    client: UpstreamClient | None = None,
+):
+    """Llama al backend remoto (/api/<sensor>) y normaliza el formato.
+
+    El backend remoto devuelve: {device, sensor, value, ts, time}.
+    Aqui lo convertimos a: {device, <sensor_name>: value, timestamp}.
+    No toca `request` ni `current_app` si recibe params, headers y client,
+    asi puede correr en otro hilo.
+    """
+
+    if _local_mode():
+        return _local_sensor(sensor_name)
+
+    # params/headers se pasan explicitos cuando se llama desde hilos del fan-out
+    if params is None:
+        params = _device_params()
+    if headers is None:
+        headers = _auth_headers()
 
     try:
-        resp = requests.get(
-            f"{REMOTE_API_ROOT}/api/{sensor_name}",
-            params=params,
-            headers=_auth_headers(),
-            timeout=5,
-        )
+        resp = (client or _upstream()).get(f"/api/{sensor_name}", params=params, headers=headers)
     except requests.RequestException as exc:  # pragma: no cover - red
         return None, 502, {"error": "remote_unreachable", "detail": str(exc)}
 
@@ -119,7 +242,12 @@ def _proxy_sensor(sensor_name: str):
             data = {"error": "remote_error"}
         return None, resp.status_code, data
 
-    data = resp.json()
+    try:
+        data = resp.json()
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return None, 502, {"error": "invalid_json"}
     device = data.get("device")
     value = data.get("value")
     timestamp = data.get("time")
@@ -129,17 +257,98 @@ def _proxy_sensor(sensor_name: str):
     return norm, 200, None
 
 
+def _cached_sensor(
+    sensor_name: str,
+    params: Dict[str, Any] | None = None,
+    headers: Dict[str, str] | None = None,
+    cache: ProxyCache | None = None,
+    client: UpstreamClient | None = None,
+):
+    """_proxy_sensor a traves del ProxyCache: N dashboards mirando el mismo
+    dispositivo generan una sola consulta al remoto por TTL.
+
+    Desde los hilos del fan-out hay que pasar cache y client ya resueltos:
+    alli no hay contexto de aplicacion para leer la config.
+    """
+
+    if _local_mode():
+        return _local_sensor(sensor_name)
+    if params is None:
+        params = _device_params()
+    if headers is None:
+        headers = _auth_headers()
+    if cache is None:
+        cache = _proxy_cache()
+    if client is None:
+        client = _upstream()
+    key = (f"/api/{sensor_name}", tuple(sorted(params.items())))
+    return cache.get(key, lambda: _proxy_sensor(sensor_name, params, headers, client))
+
+
+def _local_sensor(sensor_name: str):
+    """Equivalente local de _proxy_sensor usando el ultimo valor de TelemetryService."""
+
+    device = request.args.get("device", "esp32-1")
+    latest = telemetry_service.get_latest(device)
+    value = latest.get("metrics", {}).get(sensor_name)
+    if value is None:
+        return None, 404, {"error": "no_data", "device": device}
+    return {"device": device, "timestamp": latest.get("timestamp"), sensor_name: value}, 200, None
+
+
+@devices_bp.get("/stream")
+def telemetry_stream():
+    """Server-Sent Events con cada muestra que ingiere este backend para `device`.
+
+    El dashboard abre un EventSource en vez de consultar /api/temp, /api/hum y
+    /api/motion cada pocos segundos; la carga depende del ritmo de ingesta y no
+    del numero de pestanas abiertas. Solo existe en modo local (en modo proxy
+    aqui no se ingiere nada): 404 y el dashboard vuelve al polling. Cada stream
+    ocupa un hilo del worker, asi que hay como mucho STREAM_MAX_CLIENTS a la vez
+    y los demas reciben 503 (tambien caen al polling).
+    """
+
+    if not _local_mode():
+        return jsonify({"error": "stream_unavailable", "detail": "solo en modo local (REMOTE_API_ROOT vacio)"}), 404
+    slots = _thread_slots("STREAM_MAX_CLIENTS", 4)
+    if not slots.acquire(blocking=False):
+        return jsonify({"error": "too_many_streams"}), 503
+
+    device = request.args.get("device", "esp32-1")
+    events = telemetry_service.stream(
+        device,
+        heartbeat=current_app.config.get("STREAM_HEARTBEAT", 15.0),
+        max_seconds=current_app.config.get("STREAM_MAX_SECONDS", 300.0),
+    )
+    resp = Response(stream_with_context(events), mimetype="text/event-stream")
+    # El servidor cierra la respuesta aunque el generador no llegue a arrancar
+    resp.call_on_close(slots.release)
+    resp.headers["Cache-Control"] = "no-cache"
+    # nginx: no bufferizar el stream
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
 @devices_bp.get("/telemetry/latest")
 def latest_telemetry():
     """Agrega temp/hum/motion desde el backend remoto.
 
     Esto no es usado directamente por el firmware, solo por el dashboard si se quiere.
+    Las tres consultas al remoto se lanzan en paralelo (~1 RTT en vez de 3).
     """
 
+    names = ("temp", "hum", "motion")
+    if _local_mode():
+        results = [_proxy_sensor(name) for name in names]
+    else:
+        # Todo lo que lee request/current_app se resuelve aqui, en el hilo del request
+        params, headers = _device_params(), _auth_headers()
+        cache, client = _proxy_cache(), _upstream()
+        results = client.map(lambda name: _cached_sensor(name, params, headers, cache, client), names)
+
     metrics: Dict[str, Any] = {}
     timestamp = None
-    for name in ("temp", "hum", "motion"):
-        norm, status, err = _proxy_sensor(name)
+    for name, (norm, status, err) in zip(names, results):
         if status != 200 or not norm:
             continue
         metrics[name] = norm.get(name)
@@ -150,7 +359,7 @@ def latest_telemetry():
 
 @devices_bp.get("/temp")
 def latest_temp():
-    norm, status, err = _proxy_sensor("temp")
+    norm, status, err = _cached_sensor("temp")
     if status != 200 or not norm:
         return jsonify(err or {"error": "no_data"}), status
     return jsonify(norm), 200
@@ -158,7 +367,7 @@ def latest_temp():
 
 @devices_bp.get("/hum")
 def latest_humidity():
-    norm, status, err = _proxy_sensor("hum")
+    norm, status, err = _cached_sensor("hum")
     if status != 200 or not norm:
         return jsonify(err or {"error": "no_data"}), status
     return jsonify(norm), 200
@@ -166,7 +375,7 @@ def latest_humidity():
 
 @devices_bp.get("/motion")
 def latest_motion():
-    norm, status, err = _proxy_sensor("motion")
+    norm, status, err = _cached_sensor("motion")
     if status != 200 or not norm:
         return jsonify(err or {"error": "no_data"}), status
     # motion se devuelve como booleano
@@ -176,16 +385,15 @@ def latest_motion():
 
 @devices_bp.post("/control")
 def set_control():
-    """Proxy de POST /api/control hacia el backend remoto."""
+    """Proxy de POST /api/control hacia el backend remoto (o ControlService en modo local)."""
 
     payload = request.get_json(silent=True) or {}
+    if _local_mode():
+        device = payload.get("device", "esp32-1")
+        state = control_service.set_controls(device, payload)
+        return jsonify({"status": "ok", "device": device, "controls": state}), 200
     try:
-        resp = requests.post(
-            f"{REMOTE_API_ROOT}/api/control",
-            json=payload,
-            headers=_auth_headers(),
-            timeout=5,
-        )
+        resp = _upstream().post("/api/control", json=payload, headers=_auth_headers())
     except requests.RequestException as exc:  # pragma: no cover - red
         return jsonify({"error": "remote_unreachable", "detail": str(exc)}), 502
 
@@ -194,23 +402,82 @@ def set_control():
 
 @devices_bp.get("/control")
 def get_control():
-    """Proxy de GET /api/control hacia el backend remoto."""
-
-    params: Dict[str, Any] = {}
-    if "device" in request.args:
-        params["device"] = request.args["device"]
+    """Proxy de GET /api/control hacia el backend remoto (o ControlService en modo local).
+
+    Soporta GET condicional: la respuesta lleva un ETag con la version de los
+    controles del dispositivo y un If-None-Match que coincide devuelve 304 sin
+    cuerpo. Con `?wait=N` (long-poll) y un ETag vigente, la peticion espera hasta
+    N segundos (tope CONTROL_LONGPOLL_MAX) a que cambien los controles. Cada
+    espera ocupa un hilo del worker: como mucho CONTROL_LONGPOLL_MAX_WAITERS
+    esperan a la vez y el resto responde de inmediato (como sin `wait`).
+    """
 
+    wait = request.args.get("wait", 0.0, type=float) or 0.0
+    wait = max(0.0, min(wait, current_app.config.get("CONTROL_LONGPOLL_MAX", 30.0)))
+    if not wait:
+        return _control_response(0.0)
+    if not _longpoll_slots().acquire(blocking=False):
+        return _control_response(0.0)
     try:
-        resp = requests.get(
-            f"{REMOTE_API_ROOT}/api/control",
-            params=params,
-            headers=_auth_headers(),
-            timeout=5,
+        return _control_response(wait)
+    finally:
+        _longpoll_slots().release()
+
+
+def _thread_slots(config_key: str, default: int) -> threading.BoundedSemaphore:
+    """Hilos de este worker que pueden quedar ocupados por peticiones largas (long-poll, SSE)."""
+
+    slots = _slots.get(config_key)
+    if slots is None:
+        slots = _slots.setdefault(
+            config_key, threading.BoundedSemaphore(max(0, current_app.config.get(config_key, default)))
         )
+    return slots
+
+
+def _longpoll_slots() -> threading.BoundedSemaphore:
+    return _thread_slots("CONTROL_LONGPOLL_MAX_WAITERS", 8)
+
+
+def _control_response(wait: float):
+    """Controles del dispositivo (local o proxyados); con `wait` hace long-poll."""
+
+    if _local_mode():
+        device = request.args.get("device", "esp32-1")
+        controls, version = control_service.get_controls_versioned(device)
+        etag = control_service.etag(device, version)
+        if wait and request.if_none_match.contains(etag):
+            version = control_service.wait_for_change(device, version, wait)
+            controls, version = control_service.get_controls_versioned(device)
+            etag = control_service.etag(device, version)
+        resp = jsonify(controls)
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "no-cache"
+        return resp.make_conditional(request)
+
+    params = _device_params()
+    if wait:
+        params["wait"] = wait
+
+    headers = _auth_headers()
+    if request.headers.get("If-None-Match"):
+        headers["If-None-Match"] = request.headers["If-None-Match"]
+
+    try:
+        resp = _upstream().get("/api/control", params=params, headers=headers, extra_timeout=wait)
     except requests.RequestException as exc:  # pragma: no cover - red
         return jsonify({"error": "remote_unreachable", "detail": str(exc)}), 502
 
-    return jsonify(resp.json()), resp.status_code
+    if resp.status_code == 304:
+        not_modified = make_response("", 304)
+        if resp.headers.get("ETag"):
+            not_modified.headers["ETag"] = resp.headers["ETag"]
+        return not_modified
+
+    out = make_response(jsonify(resp.json()), resp.status_code)
+    if resp.headers.get("ETag"):
+        out.headers["ETag"] = resp.headers["ETag"]
+    return out
 
 
 @devices_bp.get("/devices")
@@ -218,4 +485,6 @@ def list_devices():
     """Endpoint local de conveniencia; no depende del backend remoto."""
 
     items = device_service.list_devices()
-    return jsonify([device_service.to_dict(d) for d in items])
+    # Ultimos valores de todos los dispositivos en una sola consulta a device_latest
+    latest = telemetry_service.latest_metrics([d.id for d in items])
+    return jsonify([{**device_service.to_dict(d), "latest": latest.get(d.id)} for d in items])
@@ -1,108 +1,218 @@
-from flask import Blueprint, jsonify, make_response, request
-from io import BytesIO
-from datetime import datetime
-
-import matplotlib
-
-matplotlib.use("Agg")
-import matplotlib.dates as mdates  # noqa: E402
-import matplotlib.pyplot as plt  # noqa: E402
+from flask import Blueprint, current_app, jsonify, make_response, request
+from datetime import datetime, timedelta, timezone
 
 from app.models import MeasureType
-
+from app.repositories.reading_repository import get_write_buffer
+
+from app.services.chart_cache import RenderCache
+from app.services.compression import sample_compressor
+from app.services.device_registry import device_registry
+from app.services.event_log import event_log
+from app.services.instrumentation import cache_lines, instrumentation
+from app.services.charts import render_png, render_svg
 from app.services.metrics_service import MetricsService
+from app.services.rule_engine import rule_engine
+from app.services.sql_profiler import sql_profiler
 
 metrics_bp = Blueprint("metrics", __name__, url_prefix="/api/metrics")
+# /metrics en la raiz, donde lo busca Prometheus por defecto
+prometheus_bp = Blueprint("prometheus", __name__)
 metrics_service = MetricsService()
 
+# Formato -> (renderizador, Content-Type)
+CHART_BACKENDS = {
+    "png": (render_png, "image/png"),
+    "svg": (render_svg, "image/svg+xml"),
+}
+
+_chart_cache: RenderCache | None = None
+
+
+def _render_cache() -> RenderCache:
+    """Cache LRU de graficos renderizados (uno por proceso/worker)."""
+
+    global _chart_cache
+    if _chart_cache is None:
+        _chart_cache = RenderCache(
+            max_entries=current_app.config.get("CHART_CACHE_ENTRIES", 64),
+            max_bytes=current_app.config.get("CHART_CACHE_MAX_BYTES", 8 * 1024 * 1024),
+        )
+    return _chart_cache
+
+# Alias cortos aceptados en ?measure=
+MEASURE_ALIASES = {
+    "temp": MeasureType.TEMPERATURE,
+    "hum": MeasureType.HUMIDITY,
+    "motion": MeasureType.MOTION,
+}
+
+
+def _parse_time(raw: str | None, default: datetime) -> datetime:
+    """Epoch en segundos o ISO-8601 (se normaliza a UTC naive). ValueError si no se entiende."""
+
+    if not raw:
+        return default
+    try:
+        return datetime.utcfromtimestamp(float(raw))
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 
 @metrics_bp.get("/summary")
 def summary():
-    return jsonify(metrics_service.summary())
+    return jsonify(metrics_service.summary(home_id=request.args.get("home_id", type=int)))
+
+
+@metrics_bp.get("/ingest")
+def ingest_stats():
+    """Contadores de ingesta: buffers write-behind, compresion, reglas, eventos y cache de graficos."""
+
+    buffer = get_write_buffer()
+    stats = {
+        "write_behind": buffer is not None,
+        "chart_cache": _render_cache().stats(),
+        "compression": sample_compressor.stats(),
+        "rules": rule_engine.stats(),
+        "events": event_log.stats(),
+    }
+    if buffer is not None:
+        stats["readings"] = buffer.stats()
+    return jsonify(stats)
+
+
+@prometheus_bp.get("/metrics")
+def prometheus_metrics():
+    """Metricas del proceso en formato de texto de Prometheus (una serie por worker)."""
+
+    if not instrumentation.enabled:
+        return jsonify({"error": "metrics_disabled"}), 404
+
+    from app.controllers import devices
+
+    caches = {
+        "device_registry": (device_registry.hits, device_registry.misses),
+        "chart": (_render_cache().hits, _render_cache().misses),
+    }
+    if devices._sensor_cache is not None:
+        counters = devices._sensor_cache.counters
+        caches["proxy"] = (counters["hits"] + counters["stale_hits"], counters["misses"])
+    lines = cache_lines(caches)
+
+    buffers = [buffer for buffer in (get_write_buffer(), event_log._buffer) if buffer is not None]
+    if buffers:
+        lines += [
+            "# HELP smarthome_write_behind_depth Rows queued for the background writer.",
+            "# TYPE smarthome_write_behind_depth gauge",
+        ]
+        lines += [f'smarthome_write_behind_depth{{buffer="{buffer.name}"}} {buffer.depth()}' for buffer in buffers]
+
+    resp = make_response(instrumentation.render() + "\n".join(lines) + "\n")
+    resp.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return resp
+
+
+@metrics_bp.get("/sql")
+def sql_profiles():
+    """Ultimos reportes del profiler SQL (`?issues=1`: solo con N+1 o consultas lentas)."""
+
+    if not sql_profiler.enabled:
+        return jsonify({"error": "sql_profiler_disabled", "detail": "SQL_PROFILER_ENABLED=1"}), 404
+    issues_only = request.args.get("issues", "0").lower() in ("1", "true", "yes")
+    return jsonify({"reports": sql_profiler.reports(issues_only=issues_only)})
+
+
+@metrics_bp.get("/sql/<int:report_id>")
+def sql_profile(report_id: int):
+    """Reporte completo de un request, con cada sentencia (id en el header X-SQL-Profile)."""
+
+    if not sql_profiler.enabled:
+        return jsonify({"error": "sql_profiler_disabled", "detail": "SQL_PROFILER_ENABLED=1"}), 404
+    report = sql_profiler.report(report_id)
+    if report is None:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(report)
+
+
+@metrics_bp.get("/series")
+def series():
+    """Serie temporal de una medida reducida a `points` puntos (LTTB o min/max).
+
+    Lee de readings o de la tabla de rollup adecuada segun el rango, asi que el
+    costo queda acotado aunque se pidan meses de datos.
+    """
+
+    measure_raw = (request.args.get("measure") or "temp").strip()
+    measure = MEASURE_ALIASES.get(measure_raw.lower())
+    if measure is None:
+        try:
+            measure = MeasureType(measure_raw.upper())
+        except ValueError:
+            return jsonify({"error": "invalid_measure", "detail": measure_raw}), 400
+
+    now = datetime.utcnow()
+    try:
+        end = _parse_time(request.args.get("to"), now)
+        start = _parse_time(request.args.get("from"), end - timedelta(hours=24))
+    except (ValueError, OverflowError, OSError):
+        return jsonify({"error": "invalid_range", "detail": "from/to: epoch o ISO-8601"}), 400
+    if start >= end:
+        return jsonify({"error": "invalid_range", "detail": "from debe ser anterior a to"}), 400
+
+    max_points = current_app.config.get("SERIES_MAX_POINTS", 2000)
+    points = request.args.get("points", type=int) or current_app.config.get("SERIES_DEFAULT_POINTS", 500)
+    points = max(3, min(points, max_points))
+    mode = request.args.get("mode", "lttb")
+    if mode not in ("lttb", "minmax"):
+        return jsonify({"error": "invalid_mode", "detail": "lttb | minmax"}), 400
+
+    result = metrics_service.series(
+        measure,
+        start,
+        end,
+        points,
+        home_id=request.args.get("home_id", type=int),
+        device_name=request.args.get("device") or None,
+        mode=mode,
+    )
+    if result is None:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(result)
 
 
 @metrics_bp.get("/chart.png")
+@metrics_bp.get("/chart.svg")
 def chart_png():
-    """Devuelve un PNG con las metricas mas recientes."""
-
-    home_id = request.args.get("home_id", type=int)
-    home, readings = metrics_service.get_home_and_readings(home_id=home_id, limit=60)
-
-    fig, ax = plt.subplots(figsize=(7, 3))
-    fig.patch.set_facecolor("#0c1423")
-    ax.set_facecolor("#0c1423")
-
-    if not readings:
-        ax.text(
-            0.5,
-            0.5,
-            "Sin datos disponibles",
-            ha="center",
-            va="center",
-            color="#9fb1cc",
-            fontsize=12,
-        )
-        ax.axis("off")
+    """Devuelve el grafico de las metricas mas recientes (PNG o SVG).
+
+    El formato sale de `?format=png|svg`, de la extension de la ruta o de
+    CHART_FORMAT. El grafico se renderiza una vez por version de datos (hogar +
+    lectura mas reciente) y se sirve desde memoria; con If-None-Match responde 304.
+    """
+
+    fmt = request.args.get("format")
+    if not fmt:
+        fmt = "svg" if request.path.endswith(".svg") else current_app.config.get("CHART_FORMAT", "png")
+    if fmt not in CHART_BACKENDS:
+        return jsonify({"error": "invalid_format", "detail": "png | svg"}), 400
+    renderer, content_type = CHART_BACKENDS[fmt]
+
+    home, version = metrics_service.chart_version(request.args.get("home_id", type=int))
+    etag = f"chart-{fmt}-{version}"
+    if request.if_none_match.contains(etag):
+        resp = make_response("", 304)
     else:
-        temps = []
-        hums = []
-        motions = []
-        for r in readings:
-            ts = r.timestamp
-            if not isinstance(ts, datetime):
-                ts = datetime.utcnow()
-            if r.measure is MeasureType.TEMPERATURE:
-                temps.append((ts, r.value))
-            elif r.measure is MeasureType.HUMIDITY:
-                hums.append((ts, r.value))
-            elif r.measure is MeasureType.MOTION:
-                motions.append((ts, r.value))
-
-        for series, color, label in (
-            (temps, "#5dd5ff", "Temp (C)"),
-            (hums, "#7ef3c3", "Hum (%)"),
-        ):
-            if series:
-                series.sort(key=lambda x: x[0])
-                ax.plot(
-                    [x[0] for x in series],
-                    [x[1] for x in series],
-                    color=color,
-                    linewidth=2,
-                    label=label,
-                )
-                ax.fill_between(
-                    [x[0] for x in series],
-                    [x[1] for x in series],
-                    alpha=0.08,
-                    color=color,
-                )
-
-        if motions:
-            motions.sort(key=lambda x: x[0])
-            ax.scatter(
-                [x[0] for x in motions],
-                [x[1] * 100 for x in motions],
-                color="#ffb347",
-                label="Motion",
-                s=18,
-                alpha=0.8,
-            )
-
-        ax.legend(facecolor="#11182a", edgecolor="#1b2538", labelcolor="#f3f6fb")
-        ax.grid(color="#1b2538", linestyle="--", linewidth=0.6, alpha=0.6)
-        ax.set_xlabel("Tiempo", color="#9fb1cc")
-        ax.set_ylabel("Lecturas", color="#9fb1cc")
-        ax.tick_params(colors="#9fb1cc")
-        ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
-
-    buf = BytesIO()
-    fig.tight_layout()
-    fig.savefig(buf, format="png", dpi=120, facecolor=fig.get_facecolor())
-    plt.close(fig)
-    buf.seek(0)
-
-    resp = make_response(buf.read())
-    resp.headers["Content-Type"] = "image/png"
-    resp.headers["Cache-Control"] = "no-store"
+
+        def render():
+            _, readings = metrics_service.get_home_and_readings(home_id=home.id if home else None, limit=60)
+            return etag, renderer(readings), content_type
+
+        _, body, content_type = _render_cache().get_or_render((fmt, version), render)
+        resp = make_response(body)
+        resp.headers["Content-Type"] = content_type
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
     return resp
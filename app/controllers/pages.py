@@ -1,9 +1,11 @@
 from flask import Blueprint, render_template, redirect, url_for, session
 
 from app.services.home_service import HomeService
+from app.services.telemetry_service import TelemetryService
 
 pages_bp = Blueprint("pages", __name__)
 home_service = HomeService()
+telemetry_service = TelemetryService()
 
 
 @pages_bp.route("/")
@@ -26,7 +28,9 @@ def dashboard(home_id: int):
     home = home_service.home_repo.get_by_id(home_id)
     if not home:
         return redirect(url_for("pages.dashboard_list"))
-    return render_template("dashboard.html", home=home)
+    # Valores iniciales desde device_latest: el panel no arranca vacio hasta el primer sondeo
+    latest = telemetry_service.home_latest(home.id)
+    return render_template("dashboard.html", home=home, latest=latest)
 
 
 @pages_bp.route("/home/<int:home_id>/dashboard")
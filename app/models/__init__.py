@@ -12,11 +12,16 @@ from .enums import (
 from .entities import (
     Controller,
     Device,
+    DeviceLatest,
     Event,
     Home,
     Reading,
+    ReadingRollupDay,
+    ReadingRollupHour,
+    ReadingRollupMinute,
     Rule,
     RuleAction,
+    TelemetrySample,
     User,
     UserHome,
 )
@@ -33,11 +38,16 @@ __all__ = [
     "MeasureType",
     "Controller",
     "Device",
+    "DeviceLatest",
     "Event",
     "Home",
     "Reading",
+    "ReadingRollupDay",
+    "ReadingRollupHour",
+    "ReadingRollupMinute",
     "Rule",
     "RuleAction",
+    "TelemetrySample",
     "User",
     "UserHome",
 ]
@@ -1,7 +1,17 @@
 from datetime import datetime
+
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
+
 from app import db
 
 
+@compiles(BigInteger, "sqlite")
+def _sqlite_bigint(type_, compiler, **kw):
+    # En SQLite solo INTEGER PRIMARY KEY es alias del rowid (id autoincremental)
+    return "INTEGER"
+
+
 class TimestampMixin:
     """Adds created_at and updated_at columns to a model."""
 
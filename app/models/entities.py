@@ -1,5 +1,6 @@
 from datetime import datetime
 from sqlalchemy import text
+from sqlalchemy.orm import declared_attr
 
 from app import db
 from .base import TimestampMixin
@@ -43,6 +44,8 @@ class Home(db.Model, TimestampMixin):
     description = db.Column(db.String(500))
     address = db.Column(db.String(500))
     timezone = db.Column(db.String(64), nullable=False)
+    # Dias de readings/events a conservar; NULL = RETENTION_DAYS, 0 = sin limite
+    retention_days = db.Column(db.Integer)
 
     members = db.relationship(
         "UserHome",
@@ -63,11 +66,13 @@ class Home(db.Model, TimestampMixin):
         "Reading",
         back_populates="home",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     events = db.relationship(
         "Event",
         back_populates="home",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     rules = db.relationship(
         "Rule",
@@ -182,10 +187,10 @@ class Device(db.Model, TimestampMixin):
     home = db.relationship("Home", back_populates="devices")
     controller = db.relationship("Controller", back_populates="devices")
     readings = db.relationship(
-        "Reading", back_populates="device", cascade="all, delete-orphan"
+        "Reading", back_populates="device", cascade="all, delete-orphan", passive_deletes=True
     )
     events = db.relationship(
-        "Event", back_populates="device", cascade="all, delete-orphan"
+        "Event", back_populates="device", cascade="all, delete-orphan", passive_deletes=True
     )
     rule_actions = db.relationship(
         "RuleAction", back_populates="device", cascade="all, delete-orphan"
@@ -219,6 +224,114 @@ class Reading(db.Model):
     home = db.relationship("Home", back_populates="readings")
 
 
+class TelemetrySample(db.Model):
+    """Una fila por payload del firmware (TELEMETRY_STORAGE=samples).
+
+    Sin medida ni unidad repetidas: columnas FLOAT de 4 bytes y flags TINYINT;
+    los valores ausentes en el payload quedan en NULL.
+    """
+
+    __tablename__ = "telemetry_samples"
+    __table_args__ = (
+        db.Index("idx_telemetry_samples_device_id_timestamp", "device_id", "timestamp"),
+        db.Index("idx_telemetry_samples_home_id_timestamp", "home_id", "timestamp"),
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    device_id = db.Column(
+        db.BigInteger,
+        db.ForeignKey("devices.id", ondelete="CASCADE", onupdate="CASCADE"),
+        nullable=False,
+    )
+    home_id = db.Column(
+        db.BigInteger,
+        db.ForeignKey("homes.id", ondelete="CASCADE", onupdate="CASCADE"),
+        nullable=False,
+    )
+    timestamp = db.Column(db.DateTime, nullable=False)
+    temp = db.Column(db.Float)
+    hum = db.Column(db.Float)
+    motion = db.Column(db.Boolean)
+    door_open = db.Column(db.Boolean)
+    door_angle = db.Column(db.SmallInteger)
+
+
+class DeviceLatest(db.Model):
+    """Ultimo valor de cada medida de cada dispositivo (upsert en cada ingesta)."""
+
+    __tablename__ = "device_latest"
+    __table_args__ = (db.Index("idx_device_latest_home_id", "home_id"),)
+
+    device_id = db.Column(
+        db.BigInteger,
+        db.ForeignKey("devices.id", ondelete="CASCADE", onupdate="CASCADE"),
+        primary_key=True,
+    )
+    measure = db.Column(db.Enum(MeasureType), primary_key=True)
+    home_id = db.Column(
+        db.BigInteger,
+        db.ForeignKey("homes.id", ondelete="CASCADE", onupdate="CASCADE"),
+        nullable=False,
+    )
+    value = db.Column(db.Float, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+
+
+class ReadingRollupMixin:
+    """Agregado incremental (min/max/sum/count/last) por dispositivo, medida y bucket.
+
+    `bucket_start` es el inicio del bucket en UTC; los buckets de hora y dia se
+    alinean a la zona horaria del hogar (`Home.timezone`).
+    """
+
+    @declared_attr
+    def device_id(cls):
+        return db.Column(
+            db.BigInteger,
+            db.ForeignKey("devices.id", ondelete="CASCADE", onupdate="CASCADE"),
+            primary_key=True,
+        )
+
+    @declared_attr
+    def home_id(cls):
+        return db.Column(
+            db.BigInteger,
+            db.ForeignKey("homes.id", ondelete="CASCADE", onupdate="CASCADE"),
+            nullable=False,
+        )
+
+    @declared_attr
+    def __table_args__(cls):
+        return (
+            db.Index(f"idx_{cls.__tablename__}_home_id_bucket_start", "home_id", "bucket_start"),
+        )
+
+    measure = db.Column(db.Enum(MeasureType), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    min_value = db.Column(db.Float, nullable=False)
+    max_value = db.Column(db.Float, nullable=False)
+    sum_value = db.Column(db.Float, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    last_value = db.Column(db.Float, nullable=False)
+    last_timestamp = db.Column(db.DateTime, nullable=False)
+
+    @property
+    def avg_value(self):
+        return self.sum_value / self.count if self.count else None
+
+
+class ReadingRollupMinute(db.Model, ReadingRollupMixin):
+    __tablename__ = "reading_rollups_1m"
+
+
+class ReadingRollupHour(db.Model, ReadingRollupMixin):
+    __tablename__ = "reading_rollups_1h"
+
+
+class ReadingRollupDay(db.Model, ReadingRollupMixin):
+    __tablename__ = "reading_rollups_1d"
+
+
 class Event(db.Model):
     __tablename__ = "events"
     __table_args__ = (
@@ -1,17 +1,25 @@
 from .base import BaseRepository
 from .controller_repository import ControllerRepository
+from .device_latest_repository import DeviceLatestRepository
 from .device_repository import DeviceRepository
+from .event_repository import EventRepository
 from .home_repository import HomeRepository
 from .reading_repository import ReadingRepository
+from .partition_repository import PartitionRepository
+from .rollup_repository import RollupRepository
 from .rule_repository import RuleRepository
 from .user_repository import UserRepository
 
 __all__ = [
     "BaseRepository",
     "ControllerRepository",
+    "DeviceLatestRepository",
     "DeviceRepository",
+    "EventRepository",
     "HomeRepository",
     "ReadingRepository",
+    "PartitionRepository",
+    "RollupRepository",
     "RuleRepository",
     "UserRepository",
 ]
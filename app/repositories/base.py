@@ -1,3 +1,8 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
 from app import db
 
 
@@ -18,3 +23,34 @@ class BaseRepository:
     def refresh(self, entity):  # pragma: no cover - helper
         db.session.refresh(entity)
         return entity
+
+    def upsert(self, model, rows, merge):
+        """INSERT multi-fila que fusiona con la fila existente si la PK ya existe.
+
+        `merge(table, incoming, least, greatest)` devuelve las asignaciones
+        {columna: expresion}; `incoming` referencia los valores de la fila nueva.
+        En MySQL las asignaciones se aplican en orden (una columna ya asignada
+        devuelve su valor nuevo), asi que el orden del dict importa.
+        """
+
+        if not rows:
+            return
+        table = model.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ("mysql", "mariadb"):
+            stmt = mysql_insert(table)
+            assignments = merge(table, stmt.inserted, func.least, func.greatest)
+            stmt = stmt.on_duplicate_key_update(list(assignments.items()))
+        elif dialect in ("sqlite", "postgresql"):
+            stmt = (sqlite_insert if dialect == "sqlite" else pg_insert)(table)
+            if dialect == "sqlite":
+                least, greatest = func.min, func.max
+            else:
+                least, greatest = func.least, func.greatest
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[c.name for c in table.primary_key.columns],
+                set_=merge(table, stmt.excluded, least, greatest),
+            )
+        else:  # pragma: no cover - dialectos no soportados
+            raise NotImplementedError(f"upsert no soportado para {dialect}")
+        db.session.execute(stmt, rows)
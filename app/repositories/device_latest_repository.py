@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import case, select
+
+from app import db
+from app.models import DeviceLatest, MeasureType
+from .base import BaseRepository
+
+
+def _merge(table, incoming, least, greatest):
+    # value antes que timestamp: MySQL aplica las asignaciones en orden
+    newer = incoming.timestamp >= table.c.timestamp
+    return {
+        "value": case((newer, incoming.value), else_=table.c.value),
+        "home_id": case((newer, incoming.home_id), else_=table.c.home_id),
+        "timestamp": greatest(table.c.timestamp, incoming.timestamp),
+    }
+
+
+class DeviceLatestRepository(BaseRepository):
+    def apply(self, rows: Iterable[Dict[str, Any]]):
+        """Upsert del valor mas nuevo de cada (dispositivo, medida) de las filas de readings (sin commit)."""
+
+        newest: Dict[Tuple[int, MeasureType], Dict[str, Any]] = {}
+        for row in rows:
+            key = (row["device_id"], row["measure"])
+            current = newest.get(key)
+            if current is None or row["timestamp"] >= current["timestamp"]:
+                newest[key] = {
+                    "device_id": row["device_id"],
+                    "measure": row["measure"],
+                    "home_id": row["home_id"],
+                    "value": row["value"],
+                    "timestamp": row["timestamp"],
+                }
+        if newest:
+            self.upsert(DeviceLatest, list(newest.values()), _merge)
+
+    def for_devices(self, device_ids: List[int] | None = None) -> Dict[int, Dict[MeasureType, Tuple[float, datetime]]]:
+        """{device_id: {medida: (valor, timestamp)}}; sin ids, de todos los dispositivos."""
+
+        stmt = select(DeviceLatest.device_id, DeviceLatest.measure, DeviceLatest.value, DeviceLatest.timestamp)
+        if device_ids is not None:
+            stmt = stmt.where(DeviceLatest.device_id.in_(device_ids))
+        latest: Dict[int, Dict[MeasureType, Tuple[float, datetime]]] = {}
+        for device_id, measure, value, timestamp in db.session.execute(stmt):
+            latest.setdefault(device_id, {})[measure] = (value, timestamp)
+        return latest
+
+    def for_device(self, device_id: int) -> Dict[MeasureType, Tuple[float, datetime]]:
+        return self.for_devices([device_id]).get(device_id, {})
+
+    def by_home(self) -> Dict[int, Dict[MeasureType, Tuple[float, datetime]]]:
+        """{home_id: {medida: (valor, timestamp)}} de todos los hogares en una sola consulta."""
+
+        latest: Dict[int, Dict[MeasureType, Tuple[float, datetime]]] = {}
+        rows = db.session.execute(
+            select(DeviceLatest.home_id, DeviceLatest.measure, DeviceLatest.value, DeviceLatest.timestamp)
+        )
+        for home_id, measure, value, timestamp in rows:
+            measures = latest.setdefault(home_id, {})
+            if measure not in measures or timestamp > measures[measure][1]:
+                measures[measure] = (value, timestamp)
+        return latest
+
+    def for_home(self, home_id: int) -> Dict[MeasureType, Tuple[float, datetime]]:
+        """Valor mas nuevo de cada medida entre los dispositivos del hogar."""
+
+        latest: Dict[MeasureType, Tuple[float, datetime]] = {}
+        rows = db.session.execute(
+            select(DeviceLatest.measure, DeviceLatest.value, DeviceLatest.timestamp).where(DeviceLatest.home_id == home_id)
+        )
+        for measure, value, timestamp in rows:
+            if measure not in latest or timestamp > latest[measure][1]:
+                latest[measure] = (value, timestamp)
+        return latest
@@ -1,5 +1,7 @@
 from datetime import datetime
 
+from sqlalchemy import or_
+
 from app.models import Device, DeviceState, DeviceType
 from .base import BaseRepository
 
@@ -8,6 +10,12 @@ class DeviceRepository(BaseRepository):
     def get_by_name(self, name: str):
         return Device.query.filter_by(name=name).first()
 
+    def get_by_id(self, device_id: int):
+        return Device.query.get(device_id)
+
+    def count(self) -> int:
+        return Device.query.count()
+
     def list_devices(self):
         return Device.query.order_by(Device.id.asc()).all()
 
@@ -47,3 +55,19 @@ class DeviceRepository(BaseRepository):
         if active is not None:
             device.active = active
         return device
+
+    def set_state(self, device_id: int, state: DeviceState) -> bool:
+        """UPDATE directo por PK solo si el estado guardado es otro; no hace commit.
+
+        La comparacion la hace la base (no un cache del proceso), asi que es
+        correcta aunque otro worker haya cambiado el estado. True si cambio.
+        """
+
+        changed = Device.query.filter(
+            Device.id == device_id,
+            or_(Device.state.is_(None), Device.state != state),
+        ).update(
+            {"state": state, "updated_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+        return changed > 0
@@ -0,0 +1,22 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import insert
+
+from app import db
+from app.models import Event
+from .base import BaseRepository
+
+
+class EventRepository(BaseRepository):
+    def add_rows(self, rows: List[Dict[str, Any]]):
+        """Inserta eventos ya armados como dicts con un solo executemany (sin commit)."""
+
+        if rows:
+            db.session.execute(insert(Event), rows)
+
+    def list_by_device(self, device_id: int, since: datetime | None = None, limit: int = 100):
+        query = Event.query.filter(Event.device_id == device_id)
+        if since is not None:
+            query = query.filter(Event.timestamp >= since)
+        return query.order_by(Event.timestamp.desc()).limit(limit).all()
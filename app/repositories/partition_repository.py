@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import delete, event, func, select, text
+
+from app import db
+from app.models import Device, Event, Home, Reading, TelemetrySample
+from .base import BaseRepository
+
+# Tablas particionadas por rango de `timestamp`
+PARTITIONED_TABLES = {
+    "readings": Reading,
+    "events": Event,
+    "telemetry_samples": TelemetrySample,
+}
+
+# (nombre, limite superior exclusivo; None = MAXVALUE)
+Partition = Tuple[str, datetime | None]
+
+
+def period_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "day":
+        return datetime(ts.year, ts.month, ts.day)
+    return datetime(ts.year, ts.month, 1)
+
+
+def next_period(start: datetime, granularity: str) -> datetime:
+    if granularity == "day":
+        return start + timedelta(days=1)
+    if start.month == 12:
+        return datetime(start.year + 1, 1, 1)
+    return datetime(start.year, start.month + 1, 1)
+
+
+def partition_name(start: datetime, granularity: str) -> str:
+    return f"p{start:%Y%m%d}" if granularity == "day" else f"p{start:%Y%m}"
+
+
+def _partition_def(start: datetime, granularity: str) -> str:
+    upper = next_period(start, granularity)
+    return f"PARTITION {partition_name(start, granularity)} VALUES LESS THAN ('{upper:%Y-%m-%d %H:%M:%S}')"
+
+
+class PartitionRepository(BaseRepository):
+    """DDL de particiones RANGE COLUMNS(timestamp) en MySQL/MariaDB.
+
+    Los limites son UTC (como los timestamps guardados). En otros motores
+    `supported` es False y la retencion se aplica con DELETE por lotes.
+    """
+
+    @property
+    def supported(self) -> bool:
+        return db.session.get_bind().dialect.name in ("mysql", "mariadb")
+
+    def list_partitions(self, table: str) -> List[Partition]:
+        rows = db.session.execute(
+            text(
+                "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS"
+                " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL"
+                " ORDER BY PARTITION_ORDINAL_POSITION"
+            ),
+            {"table": table},
+        ).all()
+        partitions: List[Partition] = []
+        for name, description in rows:
+            if description is None or description.upper() == "MAXVALUE":
+                partitions.append((name, None))
+            else:
+                partitions.append((name, datetime.fromisoformat(description.strip("'"))))
+        return partitions
+
+    def init_statements(self, table: str, now: datetime, granularity: str, ahead: int) -> List[str]:
+        """DDL para convertir la tabla en particionada (vacio si ya lo esta).
+
+        MySQL exige que la columna de particion forme parte de toda clave unica
+        y no admite claves foraneas en tablas particionadas: se eliminan las FKs
+        y la PK pasa a ser (id, timestamp). Sin FKs no hay ON DELETE CASCADE;
+        al borrar un dispositivo u hogar sus filas las elimina `_delete_owned_rows`.
+        """
+
+        if self.list_partitions(table):
+            return []
+        statements = [
+            f"ALTER TABLE `{table}` DROP FOREIGN KEY `{name}`"
+            for (name,) in db.session.execute(
+                text(
+                    "SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS"
+                    " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND CONSTRAINT_TYPE = 'FOREIGN KEY'"
+                ),
+                {"table": table},
+            )
+        ]
+        unique = [
+            name
+            for (name,) in db.session.execute(
+                text(
+                    "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS"
+                    " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+                    " AND NON_UNIQUE = 0 AND INDEX_NAME <> 'PRIMARY'"
+                ),
+                {"table": table},
+            )
+        ]
+        drops = "".join(f"DROP INDEX `{name}`, " for name in unique)
+        statements.append(f"ALTER TABLE `{table}` {drops}DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `timestamp`)")
+
+        model = PARTITIONED_TABLES[table]
+        oldest = db.session.execute(select(func.min(model.timestamp))).scalar()
+        start = period_start(oldest or now, granularity)
+        last = period_start(now, granularity)
+        for _ in range(ahead):
+            last = next_period(last, granularity)
+        defs = []
+        while start <= last:
+            defs.append(_partition_def(start, granularity))
+            start = next_period(start, granularity)
+        defs.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+        statements.append(f"ALTER TABLE `{table}` PARTITION BY RANGE COLUMNS(`timestamp`) ({', '.join(defs)})")
+        return statements
+
+    def future_statements(self, table: str, now: datetime, granularity: str, ahead: int) -> List[str]:
+        """Parte `pmax` para que existan particiones hasta `ahead` periodos por delante."""
+
+        partitions = self.list_partitions(table)
+        bounded = [upper for _, upper in partitions if upper is not None]
+        if not partitions or not bounded or partitions[-1][1] is not None:
+            return []
+        target = period_start(now, granularity)
+        for _ in range(ahead + 1):
+            target = next_period(target, granularity)
+        start = bounded[-1]
+        defs = []
+        while start < target:
+            defs.append(_partition_def(start, granularity))
+            start = next_period(start, granularity)
+        if not defs:
+            return []
+        defs.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+        return [f"ALTER TABLE `{table}` REORGANIZE PARTITION pmax INTO ({', '.join(defs)})"]
+
+    def drop_partition(self, table: str, name: str):
+        db.session.execute(text(f"ALTER TABLE `{table}` DROP PARTITION `{name}`"))
+
+    def execute(self, statement: str):
+        db.session.execute(text(statement))
+
+
+@event.listens_for(Device, "before_delete")
+@event.listens_for(Home, "before_delete")
+def _delete_owned_rows(mapper, connection, target):
+    """Borra las filas de las tablas particionables del dispositivo/hogar eliminado.
+
+    Reemplaza el ON DELETE CASCADE que se pierde al particionar (y en MySQL sin
+    particiones no hace dano: las filas ya no estan cuando llega la cascada).
+    """
+
+    column = "device_id" if isinstance(target, Device) else "home_id"
+    for model in PARTITIONED_TABLES.values():
+        table = model.__table__
+        connection.execute(delete(table).where(table.c[column] == target.id))
@@ -1,7 +1,84 @@
+import atexit
 from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple
 
-from app.models import MeasureType, Reading
+from flask import current_app
+from sqlalchemy import func, insert, select
+
+from app import db
+from app.models import MeasureType, Reading, TelemetrySample
 from .base import BaseRepository
+from .device_latest_repository import DeviceLatestRepository
+from .rollup_repository import RollupRepository
+from .write_behind import WriteBehindBuffer
+
+# Medidas que viajan en cada muestra del firmware: (clave, medida, unidad)
+SAMPLE_MEASURES = (
+    ("temp", MeasureType.TEMPERATURE, "C"),
+    ("hum", MeasureType.HUMIDITY, "%"),
+    ("motion", MeasureType.MOTION, "bool"),
+)
+
+# Columna de telemetry_samples de cada medida (TELEMETRY_STORAGE=samples)
+SAMPLE_COLUMNS = {
+    MeasureType.TEMPERATURE: TelemetrySample.temp,
+    MeasureType.HUMIDITY: TelemetrySample.hum,
+    MeasureType.MOTION: TelemetrySample.motion,
+}
+SAMPLE_FIELDS = ("temp", "hum", "motion", "door_open", "door_angle")
+
+
+class ReadingView(NamedTuple):
+    """Lectura reconstruida desde telemetry_samples, con los atributos de Reading que se leen."""
+
+    id: int
+    device_id: int
+    home_id: int
+    measure: MeasureType
+    value: float
+    unit: str
+    timestamp: datetime
+
+
+# Buffer write-behind opcional (READINGS_WRITE_BEHIND); uno por proceso/worker
+_write_buffer: WriteBehindBuffer | None = None
+
+
+def init_write_behind(app):
+    """Arranca el buffer write-behind de lecturas si la config lo habilita."""
+
+    global _write_buffer
+    if _write_buffer is not None:
+        _write_buffer.stop()
+        _write_buffer = None
+    if not app.config.get("READINGS_WRITE_BEHIND"):
+        return None
+
+    def _flush(samples):
+        with app.app_context():
+            try:
+                ReadingRepository().write_samples(samples)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    _write_buffer = WriteBehindBuffer(
+        "readings",
+        _flush,
+        max_rows=app.config.get("READINGS_FLUSH_ROWS", 500),
+        interval=app.config.get("READINGS_FLUSH_INTERVAL_MS", 250) / 1000.0,
+        capacity=app.config.get("READINGS_BUFFER_CAPACITY", 50000),
+        # Limites en lecturas (filas de readings), no en muestras
+        row_count=lambda sample: sum(sample.get(key) is not None for key, _, _ in SAMPLE_MEASURES) or 1,
+    )
+    _write_buffer.start()
+    atexit.register(_write_buffer.stop)
+    return _write_buffer
+
+
+def get_write_buffer() -> WriteBehindBuffer | None:
+    return _write_buffer
 
 
 class ReadingRepository(BaseRepository):
@@ -17,7 +94,142 @@ class ReadingRepository(BaseRepository):
         self.add(reading)
         return reading
 
+    @staticmethod
+    def expand_samples(samples: Iterable[Dict[str, Any]], stored_only: bool = False) -> List[Dict[str, Any]]:
+        """Convierte muestras {device_id, home_id, timestamp, temp, hum, motion} en filas de readings.
+
+        Con `stored_only` se omiten los campos que la compresion descarto
+        (los que no estan en `sample["persist"]`).
+        """
+
+        rows: List[Dict[str, Any]] = []
+        for sample in samples:
+            persist = sample.get("persist") if stored_only else None
+            for key, measure, unit in SAMPLE_MEASURES:
+                value = sample.get(key)
+                if value is None or (persist is not None and key not in persist):
+                    continue
+                rows.append(
+                    {
+                        "device_id": sample["device_id"],
+                        "home_id": sample["home_id"],
+                        "measure": measure,
+                        "value": float(value),
+                        "unit": unit,
+                        "timestamp": sample["timestamp"],
+                    }
+                )
+        return rows
+
+    @staticmethod
+    def sample_rows(samples: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Convierte muestras en filas de telemetry_samples (una por muestra con algun valor)."""
+
+        rows: List[Dict[str, Any]] = []
+        for sample in samples:
+            persist = sample.get("persist")
+            values = {key: sample.get(key) if persist is None or key in persist else None for key in SAMPLE_FIELDS}
+            if all(value is None for value in values.values()):
+                continue
+            for key in ("motion", "door_open"):
+                if values[key] is not None:
+                    values[key] = bool(values[key])
+            if values["door_angle"] is not None:
+                values["door_angle"] = int(values["door_angle"])
+            rows.append(
+                {
+                    "device_id": sample["device_id"],
+                    "home_id": sample["home_id"],
+                    "timestamp": sample["timestamp"],
+                    **values,
+                }
+            )
+        return rows
+
+    @staticmethod
+    def _views(sample) -> List[ReadingView]:
+        views = []
+        for key, measure, unit in SAMPLE_MEASURES:
+            value = getattr(sample, key)
+            if value is not None:
+                views.append(
+                    ReadingView(sample.id, sample.device_id, sample.home_id, measure, float(value), unit, sample.timestamp)
+                )
+        return views
+
+    @property
+    def storage(self) -> str:
+        """"readings" (una fila por medida) o "samples" (una fila por payload en telemetry_samples)."""
+
+        return current_app.config.get("TELEMETRY_STORAGE", "readings")
+
+    @property
+    def write_behind(self) -> bool:
+        """True si las lecturas se encolan y se escriben fuera de la transaccion del request."""
+
+        return _write_buffer is not None
+
+    def add_samples(self, samples: Iterable[Dict[str, Any]]) -> int:
+        """Persiste las muestras con un solo executemany; devuelve cuantas lecturas se guardan.
+
+        No hace commit: el llamador decide el limite de la transaccion. En modo
+        write-behind las muestras se encolan y las escribe el hilo del buffer.
+        """
+
+        samples = list(samples)
+        if not samples:
+            return 0
+        if _write_buffer is not None:
+            _write_buffer.append(samples)
+        else:
+            self.write_samples(samples)
+        return len(self.expand_samples(samples, stored_only=True))
+
+    def write_samples(self, samples: List[Dict[str, Any]]):
+        if self.storage == "samples":
+            sample_rows = self.sample_rows(samples)
+            if sample_rows:
+                db.session.execute(insert(TelemetrySample), sample_rows)
+        else:
+            rows = self.expand_samples(samples, stored_only=True)
+            if rows:
+                db.session.execute(insert(Reading), rows)
+        # Rollups 1m/1h/1d y device_latest en la misma transaccion, con todas las
+        # muestras recibidas (las reemitidas por la compresion ya se contaron al llegar)
+        received = self.expand_samples(s for s in samples if s.get("rollup", True))
+        if not received:
+            return
+        DeviceLatestRepository().apply(received)
+        if current_app.config.get("ROLLUPS_ENABLED", True):
+            RollupRepository().apply(received)
+
+    def iter_reading_rows(self, home_id: int, since: datetime | None = None, chunk_size: int = 5000) -> Iterator[List[Dict[str, Any]]]:
+        """Paginas de filas con forma de readings del hogar (keyset por id), en cualquier modo."""
+
+        model = TelemetrySample if self.storage == "samples" else Reading
+        stmt = select(model.__table__).where(model.home_id == home_id)
+        if since is not None:
+            stmt = stmt.where(model.timestamp >= since)
+        last_id = 0
+        while True:
+            page = db.session.execute(stmt.where(model.id > last_id).order_by(model.id.asc()).limit(chunk_size)).all()
+            if not page:
+                return
+            last_id = page[-1].id
+            if model is Reading:
+                yield [row._asdict() for row in page]
+            else:
+                yield self.expand_samples(row._asdict() for row in page)
+
     def latest_by_device(self, device_id: int):
+        if self.storage == "samples":
+            sample = (
+                TelemetrySample.query.filter_by(device_id=device_id)
+                .order_by(TelemetrySample.timestamp.desc())
+                .first()
+            )
+            views = self._views(sample) if sample else []
+            return views[0] if views else None
         return (
             Reading.query.filter_by(device_id=device_id)
             .order_by(Reading.timestamp.desc())
@@ -25,9 +237,87 @@ class ReadingRepository(BaseRepository):
         )
 
     def latest_by_home(self, home_id: int, limit: int = 50):
+        if self.storage == "samples":
+            samples = (
+                TelemetrySample.query.filter_by(home_id=home_id)
+                .order_by(TelemetrySample.timestamp.desc())
+                .limit(limit)
+                .all()
+            )
+            return [view for sample in samples for view in self._views(sample)][:limit]
         return (
             Reading.query.filter_by(home_id=home_id)
             .order_by(Reading.timestamp.desc())
             .limit(limit)
             .all()
         )
+
+    def newest_by_home(self, home_id: int):
+        """(id, timestamp) de la lectura mas reciente del hogar (usa el indice home_id, timestamp)."""
+
+        model = TelemetrySample if self.storage == "samples" else Reading
+        return db.session.execute(
+            select(model.id, model.timestamp)
+            .where(model.home_id == home_id)
+            .order_by(model.timestamp.desc(), model.id.desc())
+            .limit(1)
+        ).first()
+
+    def count_by_home(self) -> Dict[int, int]:
+        """Lecturas guardadas por hogar (en modo samples, valores no nulos de temp/hum/motion)."""
+
+        if self.storage == "samples":
+            total = sum(func.count(column) for column in SAMPLE_COLUMNS.values())
+            stmt = select(TelemetrySample.home_id, total).group_by(TelemetrySample.home_id)
+        else:
+            stmt = select(Reading.home_id, func.count()).group_by(Reading.home_id)
+        return {home_id: int(count) for home_id, count in db.session.execute(stmt)}
+
+    def latest_per_measure(self, home_id: int) -> Dict[MeasureType, tuple]:
+        """{medida: (valor, timestamp)} de la lectura mas reciente de cada medida del hogar."""
+
+        latest: Dict[MeasureType, tuple] = {}
+        for measure, column in SAMPLE_COLUMNS.items():
+            if self.storage == "samples":
+                stmt = select(column, TelemetrySample.timestamp).where(
+                    TelemetrySample.home_id == home_id, column.is_not(None)
+                )
+                stmt = stmt.order_by(TelemetrySample.timestamp.desc())
+            else:
+                stmt = select(Reading.value, Reading.timestamp).where(
+                    Reading.home_id == home_id, Reading.measure == measure
+                )
+                stmt = stmt.order_by(Reading.timestamp.desc())
+            row = db.session.execute(stmt.limit(1)).first()
+            if row is not None:
+                latest[measure] = (float(row[0]), row[1])
+        return latest
+
+    def series(
+        self,
+        home_id: int,
+        measure: MeasureType,
+        start: datetime,
+        end: datetime,
+        device_id: int | None = None,
+        limit: int | None = None,
+    ):
+        """Filas (timestamp, value) de [start, end) ordenadas por tiempo, sin cargar objetos ORM."""
+
+        if self.storage == "samples":
+            column = SAMPLE_COLUMNS[measure]
+            model, value, filters = TelemetrySample, column, [column.is_not(None)]
+        else:
+            model, value, filters = Reading, Reading.value, [Reading.measure == measure]
+        stmt = select(model.timestamp, value).where(
+            model.home_id == home_id,
+            model.timestamp >= start,
+            model.timestamp < end,
+            *filters,
+        )
+        if device_id is not None:
+            stmt = stmt.where(model.device_id == device_id)
+        stmt = stmt.order_by(model.timestamp.asc())
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        return db.session.execute(stmt).all()
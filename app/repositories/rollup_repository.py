@@ -0,0 +1,171 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from flask import current_app
+from sqlalchemy import case, func, select
+
+from app import db
+from app.models import Home, MeasureType, ReadingRollupDay, ReadingRollupHour, ReadingRollupMinute
+from .base import BaseRepository
+
+# Resolucion -> modelo de la tabla de rollup
+ROLLUP_MODELS = {
+    "1m": ReadingRollupMinute,
+    "1h": ReadingRollupHour,
+    "1d": ReadingRollupDay,
+}
+
+# Cache home_id -> ZoneInfo (los hogares casi nunca cambian de zona horaria)
+_home_zones: Dict[int, ZoneInfo] = {}
+
+
+def _merge(table, incoming, least, greatest):
+    # last_value antes que last_timestamp: MySQL aplica las asignaciones en orden
+    newer = incoming.last_timestamp >= table.c.last_timestamp
+    return {
+        "min_value": least(table.c.min_value, incoming.min_value),
+        "max_value": greatest(table.c.max_value, incoming.max_value),
+        "sum_value": table.c.sum_value + incoming.sum_value,
+        "count": table.c.count + incoming.count,
+        "last_value": case((newer, incoming.last_value), else_=table.c.last_value),
+        "last_timestamp": greatest(table.c.last_timestamp, incoming.last_timestamp),
+    }
+
+
+class RollupRepository(BaseRepository):
+    def home_zone(self, home_id: int) -> ZoneInfo:
+        zone = _home_zones.get(home_id)
+        if zone is None:
+            name = db.session.execute(select(Home.timezone).where(Home.id == home_id)).scalar()
+            try:
+                zone = ZoneInfo(name or current_app.config.get("DEFAULT_HOME_TZ", "UTC"))
+            except (ZoneInfoNotFoundError, ValueError):
+                zone = ZoneInfo("UTC")
+            _home_zones[home_id] = zone
+        return zone
+
+    @staticmethod
+    def bucket_start(ts: datetime, resolution: str, zone: ZoneInfo) -> datetime:
+        """Inicio del bucket (UTC naive) que contiene `ts` (UTC naive)."""
+
+        if resolution == "1m":
+            return ts.replace(second=0, microsecond=0)
+        local = ts.replace(tzinfo=timezone.utc).astimezone(zone)
+        if resolution == "1h":
+            local = local.replace(minute=0, second=0, microsecond=0)
+        else:
+            local = datetime(local.year, local.month, local.day, tzinfo=zone)
+        return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def aggregate(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Pre-agrega filas de readings por (resolucion, dispositivo, medida, bucket)."""
+
+        groups: Dict[str, Dict[Tuple, Dict[str, Any]]] = {res: {} for res in ROLLUP_MODELS}
+        for row in rows:
+            zone = self.home_zone(row["home_id"])
+            ts, value = row["timestamp"], row["value"]
+            for resolution, bucket in groups.items():
+                start = self.bucket_start(ts, resolution, zone)
+                key = (row["device_id"], row["measure"], start)
+                agg = bucket.get(key)
+                if agg is None:
+                    bucket[key] = {
+                        "device_id": row["device_id"],
+                        "home_id": row["home_id"],
+                        "measure": row["measure"],
+                        "bucket_start": start,
+                        "min_value": value,
+                        "max_value": value,
+                        "sum_value": value,
+                        "count": 1,
+                        "last_value": value,
+                        "last_timestamp": ts,
+                    }
+                    continue
+                agg["min_value"] = min(agg["min_value"], value)
+                agg["max_value"] = max(agg["max_value"], value)
+                agg["sum_value"] += value
+                agg["count"] += 1
+                if ts >= agg["last_timestamp"]:
+                    agg["last_value"] = value
+                    agg["last_timestamp"] = ts
+        return {res: list(bucket.values()) for res, bucket in groups.items()}
+
+    def apply(self, rows: List[Dict[str, Any]]):
+        """Fusiona filas de readings en las tres tablas de rollup (sin commit)."""
+
+        if not rows:
+            return
+        for resolution, aggregates in self.aggregate(rows).items():
+            self.upsert(ROLLUP_MODELS[resolution], aggregates, _merge)
+
+    def rebuild(self, home_id: int, since: datetime | None = None, chunk_size: int = 5000) -> int:
+        """Recalcula los rollups de un hogar desde `since` (o desde el inicio) a partir de readings.
+
+        `since` se alinea a la medianoche local del hogar para no partir buckets diarios.
+        """
+
+        _home_zones.pop(home_id, None)
+        zone = self.home_zone(home_id)
+        cutoff = None
+        if since is not None:
+            cutoff = self.bucket_start(since, "1d", zone)
+
+        for model in ROLLUP_MODELS.values():
+            query = model.query.filter(model.home_id == home_id)
+            if cutoff is not None:
+                query = query.filter(model.bucket_start >= cutoff)
+            query.delete(synchronize_session=False)
+
+        # Paginacion por id (keyset): cada pagina es una consulta corta y los
+        # upserts pueden ejecutarse en la misma conexion entre paginas.
+        from .reading_repository import ReadingRepository
+
+        total = 0
+        for rows in ReadingRepository().iter_reading_rows(home_id, since=cutoff, chunk_size=chunk_size):
+            self.apply(rows)
+            self.commit()
+            total += len(rows)
+        self.commit()
+        return total
+
+    def series(
+        self,
+        resolution: str,
+        home_id: int,
+        measure: MeasureType,
+        start: datetime,
+        end: datetime,
+        device_id: int | None = None,
+    ):
+        """Filas (bucket_start, min, max, sum, count) de los buckets que se solapan con [start, end).
+
+        Sin dispositivo se combinan los de todo el hogar por bucket.
+        """
+
+        model = ROLLUP_MODELS[resolution]
+        first = self.bucket_start(start, resolution, self.home_zone(home_id))
+        filters = [
+            model.home_id == home_id,
+            model.measure == measure,
+            model.bucket_start >= first,
+            model.bucket_start < end,
+        ]
+        if device_id is not None:
+            stmt = select(
+                model.bucket_start, model.min_value, model.max_value, model.sum_value, model.count
+            ).where(model.device_id == device_id, *filters)
+        else:
+            stmt = (
+                select(
+                    model.bucket_start,
+                    func.min(model.min_value),
+                    func.max(model.max_value),
+                    func.sum(model.sum_value),
+                    func.sum(model.count),
+                )
+                .where(*filters)
+                .group_by(model.bucket_start)
+            )
+        return db.session.execute(stmt.order_by(model.bucket_start.asc())).all()
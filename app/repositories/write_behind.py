@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List
+
+from sqlalchemy import exc as sa_exc
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindUnavailable(RuntimeError):
+    """The buffer cannot take more rows (full and the database keeps failing)."""
+
+
+def is_operational_error(exc: BaseException) -> bool:
+    """True for connection/database-side errors worth retrying, False for bad rows."""
+
+    if isinstance(exc, (sa_exc.OperationalError, sa_exc.InterfaceError, sa_exc.DisconnectionError,
+                        sa_exc.TimeoutError, ConnectionError, TimeoutError)):
+        return True
+    return isinstance(exc, sa_exc.DBAPIError) and exc.connection_invalidated
+
+
+class WriteBehindBuffer:
+    """Bounded in-memory buffer drained by a background thread.
+
+    Items are appended from the request path and handed to `flush_fn` in a
+    single call (one transaction) whenever `max_rows` rows are pending or
+    `interval` seconds have passed since the last flush. `row_count(item)`
+    gives the rows an item becomes (1 by default); `max_rows` and `capacity`
+    are counted in rows.
+
+    Errors are split in two classes. An operational error (connection lost,
+    database locked, timeout: see `is_operational_error`) puts the batch back
+    at the head of the queue and the worker retries it with exponential
+    backoff (up to `max_backoff` seconds); after `max_retries` of those in a
+    row the buffer is `failing` and `append` raises `WriteBehindUnavailable`
+    until the database accepts writes again. Any other error (bad value,
+    foreign key) comes from the rows, so retrying the same batch cannot
+    succeed: the batch is bisected until the offending items are isolated,
+    the good halves are written and each poison item goes to the dead-letter
+    log (logged, counted in `stats()`). When the buffer is full the caller
+    flushes synchronously (backpressure).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush_fn: Callable[[List[Any]], None],
+        max_rows: int = 500,
+        interval: float = 0.25,
+        capacity: int = 50000,
+        row_count: Callable[[Any], int] | None = None,
+        max_retries: int = 5,
+        max_backoff: float = 30.0,
+    ):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.max_rows = max(1, max_rows)
+        self.interval = max(0.01, interval)
+        self.capacity = max(self.max_rows, capacity)
+        self.row_count = row_count or (lambda _item: 1)
+        self.max_retries = max(1, max_retries)
+        self.max_backoff = max(self.interval, max_backoff)
+
+        self._items: deque = deque()
+        self._pending_rows = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self._consecutive_failures = 0
+        self._retry_at = 0.0
+
+        self._enqueued = 0
+        self._flushed_rows = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._bounced_rows = 0
+        self._lost_rows = 0
+        self._dead_rows = 0
+        self._last_dead_letter: str | None = None
+        self._sync_flushes = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run, name=f"write-behind-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stops the worker thread and flushes whatever is still pending."""
+
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+        if not self.flush():
+            with self._cond:
+                self._lost_rows += self._pending_rows
+                lost = self._pending_rows
+            logger.error("write-behind %s: %d rows could not be written before shutdown", self.name, lost)
+
+    @property
+    def failing(self) -> bool:
+        return self._consecutive_failures >= self.max_retries
+
+    def append(self, items: List[Any]):
+        if not items:
+            return
+        rows = sum(self.row_count(item) for item in items)
+        if rows >= self.capacity:
+            # Lote mas grande que el buffer: se escribe directo y el error llega al caller.
+            with self._cond:
+                self._sync_flushes += 1
+            self._write(list(items), requeue=False)
+            return
+        while True:
+            with self._cond:
+                if self.failing:
+                    self._bounced_rows += rows
+                    raise WriteBehindUnavailable(f"write-behind {self.name}: database unavailable")
+                if self._pending_rows + rows <= self.capacity:
+                    self._items.extend(items)
+                    self._pending_rows += rows
+                    self._enqueued += rows
+                    if self._pending_rows >= self.max_rows:
+                        self._cond.notify()
+                    return
+                self._sync_flushes += 1
+            if not self.flush():
+                with self._cond:
+                    self._bounced_rows += rows
+                raise WriteBehindUnavailable(f"write-behind {self.name}: buffer full and flush failed")
+
+    def flush(self) -> bool:
+        """Writes everything pending; False if the write failed (the rows stay queued)."""
+
+        with self._flush_lock:
+            with self._cond:
+                if not self._items:
+                    return True
+                batch = list(self._items)
+                self._items.clear()
+                self._pending_rows = 0
+            return self._write(batch)
+
+    def _write(self, batch: List[Any], requeue: bool = True) -> bool:
+        """Writes `batch` in order; False if an operational error left part of it queued."""
+
+        chunks = deque([batch])
+        while chunks:
+            chunk = chunks.popleft()
+            started = time.perf_counter()
+            try:
+                self.flush_fn(chunk)
+            except Exception as exc:
+                if not is_operational_error(exc):
+                    with self._cond:
+                        self._failed_flushes += 1
+                    if len(chunk) > 1:
+                        # Error de datos: se parte el lote hasta aislar las filas malas
+                        middle = len(chunk) // 2
+                        chunks.appendleft(chunk[middle:])
+                        chunks.appendleft(chunk[:middle])
+                    else:
+                        self._dead_letter(chunk[0], exc)
+                    continue
+                remaining = [item for part in (chunk, *chunks) for item in part]
+                self._failed(remaining, requeue)
+                if not requeue:
+                    raise
+                return False
+            self._flushed(sum(self.row_count(item) for item in chunk), started)
+        return True
+
+    def _failed(self, items: List[Any], requeue: bool):
+        rows = sum(self.row_count(item) for item in items)
+        with self._cond:
+            self._failed_flushes += 1
+            self._consecutive_failures += 1
+            backoff = min(self.max_backoff, self.interval * 2 ** self._consecutive_failures)
+            self._retry_at = time.monotonic() + backoff
+            if requeue:
+                # Vuelve a la cabeza de la cola, en el mismo orden
+                self._items.extendleft(reversed(items))
+                self._pending_rows += rows
+        logger.exception(
+            "write-behind %s: flush of %d rows failed (attempt %d, retry in %.1f s)",
+            self.name, rows, self._consecutive_failures, backoff,
+        )
+
+    def _flushed(self, rows: int, started: float):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._cond:
+            self._consecutive_failures = 0
+            self._retry_at = 0.0
+            self._flushes += 1
+            self._flushed_rows += rows
+            self._last_flush_ms = elapsed_ms
+            self._total_flush_ms += elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+
+    def _dead_letter(self, item: Any, exc: Exception):
+        with self._cond:
+            self._dead_rows += self.row_count(item)
+            self._last_dead_letter = f"{type(exc).__name__}: {exc}"
+        logger.error("write-behind %s: dropped poison item %r: %s", self.name, item, exc)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                backoff = self._retry_at - time.monotonic()
+                if backoff > 0 and not self._stopping:
+                    self._cond.wait(backoff)
+                elif not self._stopping and self._pending_rows < self.max_rows:
+                    self._cond.wait(self.interval)
+                stopping = self._stopping
+                retry_pending = self._retry_at > time.monotonic()
+            if stopping:
+                return
+            if not retry_pending:
+                self.flush()
+
+    @contextmanager
+    def paused(self) -> Iterator[List[Any]]:
+        """Holds back flushes (appends still queue) and yields a copy of the pending items.
+
+        While paused the database and the buffer do not exchange rows, so a
+        count taken inside plus the pending items is exact.
+        """
+
+        with self._flush_lock:
+            with self._cond:
+                items = list(self._items)
+            yield items
+
+    def depth(self) -> int:
+        return self._pending_rows
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "name": self.name,
+                "depth": self._pending_rows,
+                "capacity": self.capacity,
+                "max_rows": self.max_rows,
+                "interval_ms": round(self.interval * 1000, 1),
+                "enqueued_rows": self._enqueued,
+                "flushed_rows": self._flushed_rows,
+                "flushes": self._flushes,
+                "failed_flushes": self._failed_flushes,
+                "consecutive_failures": self._consecutive_failures,
+                "failing": self.failing,
+                "bounced_rows": self._bounced_rows,
+                "lost_rows": self._lost_rows,
+                "dead_letter_rows": self._dead_rows,
+                "last_dead_letter": self._last_dead_letter,
+                "sync_flushes": self._sync_flushes,
+                "last_flush_ms": round(self._last_flush_ms, 3),
+                "max_flush_ms": round(self._max_flush_ms, 3),
+                "avg_flush_ms": round(self._total_flush_ms / self._flushes, 3) if self._flushes else 0.0,
+            }
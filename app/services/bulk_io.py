@@ -0,0 +1,260 @@
+"""Bulk export/import of telemetry tables (`flask readings export|import`).
+
+Rows are read with a streamed query (`yield_per`, a server-side cursor on
+MySQL) and written chunk by chunk, so memory stays flat regardless of table
+size. Imports go through Core multi-row INSERTs in large batches, without
+the ORM identity map. Parquet needs `pyarrow`, imported on first use.
+"""
+
+from __future__ import annotations
+
+import csv
+import enum
+import gzip
+import json
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List
+
+from sqlalchemy import Boolean, DateTime, Enum, Float, Integer, insert, select
+
+from app import db
+from app.models import Reading, TelemetrySample
+
+FORMATS = ("csv", "jsonl", "parquet")
+TABLES = {
+    "readings": Reading,
+    "telemetry_samples": TelemetrySample,
+}
+
+
+def export_value(value: Any):
+    """Valor serializable en CSV: enums por su valor, fechas ISO, None vacio."""
+
+    if value is None:
+        return ""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def _json_value(value: Any):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def detect_format(path: str, fmt: str | None) -> str:
+    if fmt:
+        return fmt
+    name = path[:-3] if path.endswith(".gz") else path
+    for candidate in FORMATS:
+        if name.endswith(f".{candidate}"):
+            return candidate
+    if name.endswith(".json") or name.endswith(".ndjson"):
+        return "jsonl"
+    raise ValueError(f"no se puede deducir el formato de {path!r}; use --format")
+
+
+@contextmanager
+def _open_text(path: str, mode: str):
+    """Archivo de texto (gzip si termina en .gz); "-" es stdin/stdout."""
+
+    if path == "-":
+        yield sys.stdout if mode == "w" else sys.stdin
+        return
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, f"{mode}t", newline="", encoding="utf-8") as fh:
+        yield fh
+
+
+def _converter(column) -> Callable[[Any], Any]:
+    """Convierte el valor leido (texto en CSV, JSON nativo o Arrow) al tipo de la columna."""
+
+    kind = column.type
+    if isinstance(kind, Enum) and kind.enum_class is not None:
+        enum_class = kind.enum_class
+        return lambda v: v if isinstance(v, enum_class) else enum_class(v)
+    if isinstance(kind, DateTime):
+        return lambda v: v if isinstance(v, datetime) else datetime.fromisoformat(v)
+    if isinstance(kind, Boolean):
+        return lambda v: v if isinstance(v, bool) else str(v).strip().lower() in ("1", "true", "t", "yes")
+    if isinstance(kind, Integer):
+        return lambda v: v if isinstance(v, int) else int(float(v))
+    if isinstance(kind, Float):
+        return float
+    return lambda v: v
+
+
+class BulkTransfer:
+    """Streaming export/import of one telemetry table."""
+
+    def __init__(self, table: str = "readings"):
+        if table not in TABLES:
+            raise ValueError(f"tabla no soportada: {table} (opciones: {', '.join(TABLES)})")
+        self.name = table
+        self.model = TABLES[table]
+        self.table = self.model.__table__
+
+    # ---- export -------------------------------------------------------------
+
+    def iter_chunks(
+        self,
+        home_id: int | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        chunk_size: int = 10000,
+    ) -> Iterator[List[tuple]]:
+        """Filas en bloques de `chunk_size` desde un cursor del servidor."""
+
+        stmt = select(self.table)
+        if home_id is not None:
+            stmt = stmt.where(self.model.home_id == home_id)
+        if since is not None:
+            stmt = stmt.where(self.model.timestamp >= since)
+        if until is not None:
+            stmt = stmt.where(self.model.timestamp < until)
+        stmt = stmt.order_by(self.model.id.asc()).execution_options(yield_per=chunk_size)
+        result = db.session.execute(stmt)
+        try:
+            for chunk in result.partitions():
+                yield [tuple(row) for row in chunk]
+        finally:
+            result.close()
+
+    def export(self, path: str, fmt: str | None = None, chunk_size: int = 10000, **filters) -> int:
+        fmt = detect_format(path, fmt)
+        columns = [column.name for column in self.table.columns]
+        chunks = self.iter_chunks(chunk_size=chunk_size, **filters)
+        if fmt == "parquet":
+            return self._export_parquet(path, columns, chunks)
+
+        rows = 0
+        with _open_text(path, "w") as fh:
+            if fmt == "csv":
+                writer = csv.writer(fh)
+                writer.writerow(columns)
+                for chunk in chunks:
+                    writer.writerows([export_value(v) for v in row] for row in chunk)
+                    rows += len(chunk)
+            else:
+                for chunk in chunks:
+                    fh.write(
+                        "".join(
+                            json.dumps(dict(zip(columns, map(_json_value, row))), separators=(",", ":")) + "\n"
+                            for row in chunk
+                        )
+                    )
+                    rows += len(chunk)
+        return rows
+
+    def _arrow_schema(self, pa):
+        fields = []
+        for column in self.table.columns:
+            kind = column.type
+            if isinstance(kind, Enum):
+                arrow_type = pa.string()
+            elif isinstance(kind, DateTime):
+                arrow_type = pa.timestamp("us")
+            elif isinstance(kind, Boolean):
+                arrow_type = pa.bool_()
+            elif isinstance(kind, Integer):
+                arrow_type = pa.int64()
+            elif isinstance(kind, Float):
+                arrow_type = pa.float64()
+            else:
+                arrow_type = pa.string()
+            fields.append(pa.field(column.name, arrow_type, nullable=column.nullable))
+        return pa.schema(fields)
+
+    def _export_parquet(self, path: str, columns: List[str], chunks: Iterator[List[tuple]]) -> int:
+        pa, pq = _pyarrow()
+        schema = self._arrow_schema(pa)
+        rows = 0
+        # Un row group por bloque: el archivo se escribe sin tenerlo entero en memoria
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for chunk in chunks:
+                data = {
+                    name: [v.value if isinstance(v, enum.Enum) else v for v in values]
+                    for name, values in zip(columns, zip(*chunk))
+                }
+                writer.write_table(pa.table(data, schema=schema))
+                rows += len(chunk)
+        return rows
+
+    # ---- import -------------------------------------------------------------
+
+    def _read_records(self, path: str, fmt: str, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        if fmt == "parquet":
+            _pa, pq = _pyarrow()
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+                yield batch.to_pylist()
+            return
+        with _open_text(path, "r") as fh:
+            if fmt == "csv":
+                reader = csv.DictReader(fh)
+            else:
+                reader = (json.loads(line) for line in fh if line.strip())
+            batch: List[Dict[str, Any]] = []
+            for record in reader:
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    def import_(self, path: str, fmt: str | None = None, batch_size: int = 5000, keep_ids: bool = False) -> int:
+        """Inserta el archivo por lotes (un commit por lote); devuelve las filas insertadas.
+
+        Sin `keep_ids` la columna id se descarta y la base asigna ids nuevos, lo
+        que permite importar sobre una tabla con datos. device_latest se
+        actualiza en la misma transaccion de cada lote (el upsert conserva el
+        valor mas nuevo, asi que el orden del archivo no importa).
+        """
+
+        fmt = detect_format(path, fmt)
+        converters = {
+            column.name: _converter(column)
+            for column in self.table.columns
+            if keep_ids or column.name != "id"
+        }
+        stmt = insert(self.table)
+        rows = 0
+        with db.session.no_autoflush:
+            for records in self._read_records(path, fmt, batch_size):
+                batch = []
+                for record in records:
+                    row = {}
+                    for name, convert in converters.items():
+                        value = record.get(name)
+                        row[name] = None if value is None or value == "" else convert(value)
+                    batch.append(row)
+                db.session.execute(stmt, batch)
+                self._update_latest(batch)
+                db.session.commit()
+                rows += len(batch)
+        return rows
+
+    def _update_latest(self, batch: List[Dict[str, Any]]):
+        from app.repositories import DeviceLatestRepository, ReadingRepository
+
+        rows = batch if self.model is Reading else ReadingRepository.expand_samples(batch)
+        DeviceLatestRepository().apply(rows)
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:  # pragma: no cover - dependencia opcional
+        raise RuntimeError("El formato parquet requiere pyarrow (pip install pyarrow)") from exc
+    return pa, pq
+
+
+__all__ = ["BulkTransfer", "FORMATS", "TABLES", "detect_format", "export_value"]
@@ -0,0 +1,203 @@
+"""Chart backends for /api/metrics/chart.png.
+
+`render_svg` is pure Python (no imports beyond the stdlib); `render_png`
+imports matplotlib on first use, so workers that only serve SVG never pay
+for it at boot or in memory.
+"""
+
+from __future__ import annotations
+
+import math
+from datetime import datetime
+from io import BytesIO
+from typing import Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+from app.models import MeasureType
+
+BACKGROUND = "#0c1423"
+GRID = "#1b2538"
+TEXT = "#9fb1cc"
+LEGEND_BG = "#11182a"
+LEGEND_TEXT = "#f3f6fb"
+EMPTY_TEXT = "Sin datos disponibles"
+
+# (clave, color, etiqueta) de las series de linea
+LINE_SERIES = (
+    ("temp", "#5dd5ff", "Temp (C)"),
+    ("hum", "#7ef3c3", "Hum (%)"),
+)
+MOTION_COLOR = "#ffb347"
+
+Point = Tuple[datetime, float]
+
+
+def split_series(readings) -> Dict[str, List[Point]]:
+    """Separa las lecturas por medida y las ordena por tiempo (motion se escala a 0-100)."""
+
+    series: Dict[str, List[Point]] = {"temp": [], "hum": [], "motion": []}
+    for r in readings:
+        ts = r.timestamp
+        if not isinstance(ts, datetime):
+            ts = datetime.utcnow()
+        if r.measure is MeasureType.TEMPERATURE:
+            series["temp"].append((ts, r.value))
+        elif r.measure is MeasureType.HUMIDITY:
+            series["hum"].append((ts, r.value))
+        elif r.measure is MeasureType.MOTION:
+            series["motion"].append((ts, r.value * 100))
+    for points in series.values():
+        points.sort(key=lambda x: x[0])
+    return series
+
+
+def render_png(readings) -> bytes:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(7, 3))
+    fig.patch.set_facecolor(BACKGROUND)
+    ax.set_facecolor(BACKGROUND)
+
+    if not readings:
+        ax.text(0.5, 0.5, EMPTY_TEXT, ha="center", va="center", color=TEXT, fontsize=12)
+        ax.axis("off")
+    else:
+        series = split_series(readings)
+        for key, color, label in LINE_SERIES:
+            points = series[key]
+            if points:
+                xs = [x[0] for x in points]
+                ys = [x[1] for x in points]
+                ax.plot(xs, ys, color=color, linewidth=2, label=label)
+                ax.fill_between(xs, ys, alpha=0.08, color=color)
+
+        motions = series["motion"]
+        if motions:
+            ax.scatter(
+                [x[0] for x in motions],
+                [x[1] for x in motions],
+                color=MOTION_COLOR,
+                label="Motion",
+                s=18,
+                alpha=0.8,
+            )
+
+        ax.legend(facecolor=LEGEND_BG, edgecolor=GRID, labelcolor=LEGEND_TEXT)
+        ax.grid(color=GRID, linestyle="--", linewidth=0.6, alpha=0.6)
+        ax.set_xlabel("Tiempo", color=TEXT)
+        ax.set_ylabel("Lecturas", color=TEXT)
+        ax.tick_params(colors=TEXT)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
+
+    buf = BytesIO()
+    fig.tight_layout()
+    fig.savefig(buf, format="png", dpi=120, facecolor=fig.get_facecolor())
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def _nice_ticks(lo: float, hi: float, count: int = 5) -> List[float]:
+    """Marcas "redondas" (1, 2, 5 x 10^n) que cubren [lo, hi]."""
+
+    if hi <= lo:
+        hi = lo + 1.0
+    raw = (hi - lo) / max(count - 1, 1)
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw)
+    first = math.floor(lo / step) * step
+    ticks = []
+    value = first
+    while value <= hi + step * 0.5:
+        ticks.append(round(value, 10))
+        value += step
+    return ticks
+
+
+def render_svg(readings, width: int = 840, height: int = 360) -> bytes:
+    """Mismo grafico que render_png como SVG compacto generado a mano."""
+
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="DejaVu Sans,Arial,sans-serif" font-size="11">',
+        f'<rect width="{width}" height="{height}" fill="{BACKGROUND}"/>',
+    ]
+    if not readings:
+        out.append(
+            f'<text x="{width / 2:.0f}" y="{height / 2:.0f}" fill="{TEXT}" font-size="14" '
+            f'text-anchor="middle" dominant-baseline="middle">{escape(EMPTY_TEXT)}</text></svg>'
+        )
+        return "".join(out).encode()
+
+    series = split_series(readings)
+    plotted = [p for points in series.values() for p in points]
+    t0 = min(p[0] for p in plotted)
+    t1 = max(p[0] for p in plotted)
+    span = (t1 - t0).total_seconds() or 1.0
+    # Como fill_between de matplotlib, el area rellena llega hasta 0
+    y_ticks = _nice_ticks(min(0.0, min(p[1] for p in plotted)), max(0.0, max(p[1] for p in plotted)))
+    y_lo, y_hi = y_ticks[0], y_ticks[-1]
+
+    left, right, top, bottom = 56, width - 16, 14, height - 42
+    plot_w, plot_h = right - left, bottom - top
+
+    def px(ts: datetime) -> float:
+        return left + (ts - t0).total_seconds() / span * plot_w
+
+    def py(value: float) -> float:
+        return bottom - (value - y_lo) / ((y_hi - y_lo) or 1.0) * plot_h
+
+    grid = f'stroke="{GRID}" stroke-width="0.6" stroke-dasharray="4 3" opacity="0.6"'
+    for value in y_ticks:
+        y = py(value)
+        out.append(f'<line x1="{left}" y1="{y:.1f}" x2="{right}" y2="{y:.1f}" {grid}/>')
+        out.append(f'<text x="{left - 6}" y="{y + 4:.1f}" fill="{TEXT}" text-anchor="end">{value:g}</text>')
+    for i in range(6):
+        ts = t0 + (t1 - t0) * (i / 5)
+        x = px(ts)
+        out.append(f'<line x1="{x:.1f}" y1="{top}" x2="{x:.1f}" y2="{bottom}" {grid}/>')
+        out.append(f'<text x="{x:.1f}" y="{bottom + 16}" fill="{TEXT}" text-anchor="middle">{ts:%H:%M}</text>')
+    out.append(f'<text x="{(left + right) / 2:.0f}" y="{height - 6}" fill="{TEXT}" text-anchor="middle">Tiempo</text>')
+    out.append(
+        f'<text x="14" y="{(top + bottom) / 2:.0f}" fill="{TEXT}" text-anchor="middle" '
+        f'transform="rotate(-90 14 {(top + bottom) / 2:.0f})">Lecturas</text>'
+    )
+
+    legend = []
+    for key, color, label in LINE_SERIES:
+        points = series[key]
+        if not points:
+            continue
+        coords = " ".join(f"{px(t):.1f},{py(v):.1f}" for t, v in points)
+        base = py(max(y_lo, 0.0))
+        out.append(
+            f'<polygon points="{px(points[0][0]):.1f},{base:.1f} {coords} {px(points[-1][0]):.1f},{base:.1f}" '
+            f'fill="{color}" opacity="0.08"/>'
+        )
+        out.append(f'<polyline points="{coords}" fill="none" stroke="{color}" stroke-width="2"/>')
+        legend.append((color, label, "line"))
+    if series["motion"]:
+        out.append(f'<g fill="{MOTION_COLOR}" opacity="0.8">')
+        out.extend(f'<circle cx="{px(t):.1f}" cy="{py(v):.1f}" r="2.5"/>' for t, v in series["motion"])
+        out.append("</g>")
+        legend.append((MOTION_COLOR, "Motion", "dot"))
+
+    if legend:
+        box_w, box_h = 96, 10 + 18 * len(legend)
+        x0, y0 = right - box_w - 8, top + 8
+        out.append(
+            f'<rect x="{x0}" y="{y0}" width="{box_w}" height="{box_h}" rx="3" fill="{LEGEND_BG}" stroke="{GRID}"/>'
+        )
+        for i, (color, label, kind) in enumerate(legend):
+            y = y0 + 14 + 18 * i
+            if kind == "line":
+                out.append(f'<line x1="{x0 + 8}" y1="{y}" x2="{x0 + 28}" y2="{y}" stroke="{color}" stroke-width="2"/>')
+            else:
+                out.append(f'<circle cx="{x0 + 18}" cy="{y}" r="3" fill="{color}"/>')
+            out.append(f'<text x="{x0 + 36}" y="{y + 4}" fill="{LEGEND_TEXT}">{escape(label)}</text>')
+
+    out.append("</svg>")
+    return "".join(out).encode()
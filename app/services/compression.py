@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from app.repositories.reading_repository import SAMPLE_FIELDS, SAMPLE_MEASURES
+
+# Punto de una medida: (timestamp UTC, valor)
+Point = Tuple[datetime, float]
+
+# Medidas continuas (modo configurable) y discretas (se guardan cuando cambian)
+ANALOG_FIELDS = ("temp", "hum")
+DISCRETE_FIELDS = ("motion", "door_open", "door_angle")
+
+
+class DeadbandFilter:
+    """Keeps a point when it moves more than `tolerance` from the last kept
+    value, or when `max_interval` seconds have passed since it."""
+
+    __slots__ = ("tolerance", "max_interval", "last")
+
+    def __init__(self, tolerance: float, max_interval: float):
+        self.tolerance = tolerance
+        self.max_interval = max_interval
+        self.last: Point | None = None
+
+    def offer(self, t: datetime, v: float) -> List[Point]:
+        last = self.last
+        if last is not None and t > last[0]:
+            if abs(v - last[1]) <= self.tolerance and (t - last[0]).total_seconds() < self.max_interval:
+                return []
+        if last is None or t > last[0]:
+            self.last = (t, v)
+        return [(t, v)]
+
+
+class SwingingDoorFilter:
+    """Swinging-door trending: the stored points, joined by straight lines,
+    stay within `tolerance` of every received point.
+
+    The last received point is held back until the "door" closes; at that
+    moment the held point is emitted (possibly in a later request than the
+    one that delivered it) and becomes the new pivot. Its value is moved
+    onto the door, never more than `tolerance` away from the received one:
+    the raw value is not always reachable by a line that fits every point
+    in between.
+    """
+
+    __slots__ = ("tolerance", "max_interval", "pivot", "held", "max_low", "min_up")
+
+    def __init__(self, tolerance: float, max_interval: float):
+        self.tolerance = tolerance
+        self.max_interval = max_interval
+        self.pivot: Point | None = None
+        self.held: Point | None = None
+        self.max_low = float("-inf")
+        self.min_up = float("inf")
+
+    def _slopes(self, t: datetime, v: float) -> Tuple[float, float]:
+        dt = (t - self.pivot[0]).total_seconds()
+        return (v - self.tolerance - self.pivot[1]) / dt, (v + self.tolerance - self.pivot[1]) / dt
+
+    def _fitted_held(self) -> Point:
+        """El punto retenido ajustado a la pendiente admisible mas cercana."""
+
+        t, v = self.held
+        dt = (t - self.pivot[0]).total_seconds()
+        slope = min(max((v - self.pivot[1]) / dt, self.max_low), self.min_up)
+        return t, self.pivot[1] + slope * dt
+
+    def _restart(self, point: Point):
+        self.pivot, self.held = point, None
+        self.max_low, self.min_up = float("-inf"), float("inf")
+
+    def offer(self, t: datetime, v: float) -> List[Point]:
+        if self.pivot is None:
+            self._restart((t, v))
+            return [(t, v)]
+        if t <= self.pivot[0]:
+            # Fuera de orden: se guarda tal cual sin tocar el estado
+            return [(t, v)]
+
+        if (t - self.pivot[0]).total_seconds() >= self.max_interval:
+            emitted = [self._fitted_held()] if self.held else []
+            self._restart((t, v))
+            return emitted + [(t, v)]
+
+        low, up = self._slopes(t, v)
+        max_low, min_up = max(self.max_low, low), min(self.min_up, up)
+        if max_low <= min_up or self.held is None:
+            self.max_low, self.min_up = max_low, min_up
+            self.held = (t, v)
+            return []
+
+        # La puerta se cerro: el punto retenido pasa a ser el nuevo pivote
+        emitted = self._fitted_held()
+        self._restart(emitted)
+        self.max_low, self.min_up = self._slopes(t, v)
+        self.held = (t, v)
+        return [emitted]
+
+
+class SampleCompressor:
+    """Per-device, per-field compression of ingest samples (in-process state).
+
+    `compress` marks on every sample the fields that must be stored
+    (`sample["persist"]`) and appends extra samples for points held back by
+    the swinging door (`sample["rollup"] = False`, they were already counted).
+    Rollups and the live views still receive every sample. Only `fields`
+    (the ones the active storage persists) are compressed and counted.
+    """
+
+    def __init__(
+        self,
+        mode: str = "off",
+        tolerances: Dict[str, float] | None = None,
+        max_interval: float = 300.0,
+        fields: Tuple[str, ...] = ANALOG_FIELDS + DISCRETE_FIELDS,
+    ):
+        self.mode = mode
+        self.tolerances = tolerances or {}
+        self.max_interval = max_interval
+        self.fields = fields
+        self._filters: Dict[Tuple[int, str], Any] = {}
+        self._lock = threading.Lock()
+        self.received = 0
+        self.persisted = 0
+
+    def init_app(self, app):
+        self.mode = app.config.get("COMPRESSION_MODE", "off")
+        self.tolerances = parse_tolerances(app.config.get("COMPRESSION_TOLERANCES", ""))
+        self.max_interval = app.config.get("COMPRESSION_MAX_INTERVAL", 300.0)
+        self.fields = stored_fields(app.config.get("TELEMETRY_STORAGE", "readings"))
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("deadband", "swinging_door")
+
+    def _filter(self, device_id: int, field: str):
+        key = (device_id, field)
+        flt = self._filters.get(key)
+        if flt is None:
+            tolerance = self.tolerances.get(field, 0.0)
+            if field in ANALOG_FIELDS and self.mode == "swinging_door":
+                flt = SwingingDoorFilter(tolerance, self.max_interval)
+            else:
+                flt = DeadbandFilter(tolerance, self.max_interval)
+            self._filters[key] = flt
+        return flt
+
+    def compress(self, samples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not self.enabled:
+            return samples
+        extra: List[Dict[str, Any]] = []
+        with self._lock:
+            for sample in sorted(samples, key=lambda s: s["timestamp"]):
+                kept = set()
+                for field in self.fields:
+                    value = sample.get(field)
+                    if value is None:
+                        continue
+                    self.received += 1
+                    for t, v in self._filter(sample["device_id"], field).offer(sample["timestamp"], float(value)):
+                        self.persisted += 1
+                        if t == sample["timestamp"]:
+                            kept.add(field)
+                        else:
+                            extra.append(
+                                {
+                                    "device_id": sample["device_id"],
+                                    "home_id": sample["home_id"],
+                                    "timestamp": t,
+                                    field: v,
+                                    "persist": {field},
+                                    "rollup": False,
+                                }
+                            )
+                sample["persist"] = kept
+        return samples + extra
+
+    def reset(self):
+        with self._lock:
+            self._filters.clear()
+            self.received = 0
+            self.persisted = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "received": self.received,
+            "persisted": self.persisted,
+            "ratio": round(self.persisted / self.received, 4) if self.received else None,
+            "series": len(self._filters),
+        }
+
+
+def stored_fields(storage: str) -> Tuple[str, ...]:
+    """Campos que guarda cada TELEMETRY_STORAGE: readings solo tiene temp/hum/motion."""
+
+    if storage == "samples":
+        return SAMPLE_FIELDS
+    return tuple(key for key, _, _ in SAMPLE_MEASURES)
+
+
+def parse_tolerances(raw: str) -> Dict[str, float]:
+    """"temp=0.3,hum=1" -> {"temp": 0.3, "hum": 1.0}."""
+
+    tolerances: Dict[str, float] = {}
+    for item in (raw or "").split(","):
+        if "=" in item:
+            key, value = item.split("=", 1)
+            tolerances[key.strip()] = float(value)
+    return tolerances
+
+
+sample_compressor = SampleCompressor()
@@ -1,16 +1,25 @@
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
+
+from .state_store import StateStore, get_state_store
 
 
 class ControlService:
-    """In-memory control queue for IoT devices.
+    """Control queue for IoT devices.
 
     Keeps the latest desired state; devices poll and apply.
     ESP32 polls GET /api/control?device=esp32-1 and expects an array of controls.
+    State lives in a StateStore (STATE_BACKEND) so every worker sees the same commands.
     """
 
-    def __init__(self):
-        self._state: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, store: StateStore | None = None):
+        self._store = store
+
+    @property
+    def store(self) -> StateStore:
+        if self._store is None:
+            self._store = get_state_store("control")
+        return self._store
 
     def _default_state(self) -> Dict[str, Any]:
         """Default state structure (internal representation)"""
@@ -26,14 +35,18 @@ class ControlService:
 
     def set_controls(self, device: str, payload: Dict[str, Any]):
         """Store controls from frontend and return full state for response"""
-        state = self._state.get(device) or self._default_state()
-        for key in ["led1", "led2", "door_open", "door_angle"]:
-            if key in payload:
-                for item in state["controls"]:
-                    if item["control"] == key:
-                        item["value"] = payload[key]
-        state["updated_at"] = datetime.utcnow().isoformat()
-        self._state[device] = state
+
+        def _apply(state):
+            state = state or self._default_state()
+            for key in ["led1", "led2", "door_open", "door_angle"]:
+                if key in payload:
+                    for item in state["controls"]:
+                        if item["control"] == key:
+                            item["value"] = payload[key]
+            state["updated_at"] = datetime.utcnow().isoformat()
+            return state
+
+        state, _version = self.store.update(device, _apply)
         return state
 
     def get_controls(self, device: str) -> List[Dict[str, Any]]:
@@ -50,9 +63,23 @@ class ControlService:
         Returns:
             List: Empty list if device not yet initialized, array of controls otherwise.
         """
-        state = self._state.get(device)
+        state = self.store.get(device)
         if not state:
             # First time device polls - return empty array
             return []
         # Return only the controls array (ESP32 will iterate and parse)
         return state.get("controls", [])
+
+    def get_controls_versioned(self, device: str) -> Tuple[List[Dict[str, Any]], int]:
+        """Controls plus the per-device version (bumped on every set_controls)."""
+
+        version = self.store.version(device)
+        return self.get_controls(device), version
+
+    def etag(self, device: str, version: int) -> str:
+        return f"{self.store.epoch}-{device}-{version}"
+
+    def wait_for_change(self, device: str, version: int, timeout: float) -> int:
+        """Long-poll: blocks until the device's controls change or `timeout` seconds pass."""
+
+        return self.store.wait(device, version, timeout)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Tuple
+
+from sqlalchemy import event, inspect
+
+from app.models import Device
+
+
+class DeviceIdentity(NamedTuple):
+    """Datos inmutables del dispositivo; el estado no se cachea (lo compara la base)."""
+
+    device_id: int
+    home_id: int
+    controller_id: int
+
+
+class DeviceRegistry:
+    """Bounded LRU + TTL cache of device name -> identity for the ingest path.
+
+    Entries are invalidated when a Device row is inserted, updated or deleted
+    through the ORM in this process; the TTL bounds staleness for changes
+    made by other workers.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, DeviceIdentity]]" = OrderedDict()
+        self._default_graph: Tuple[float, Tuple[int, int]] | None = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.max_size = app.config.get("DEVICE_CACHE_SIZE", self.max_size)
+        self.ttl = app.config.get("DEVICE_CACHE_TTL", self.ttl)
+        self.clear()
+
+    def get(self, name: str) -> DeviceIdentity | None:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[name]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(name)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, name: str, identity: DeviceIdentity):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[name] = (time.monotonic() + self.ttl, identity)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name: str):
+        with self._lock:
+            self._entries.pop(name, None)
+
+    def get_default_graph(self) -> Tuple[int, int] | None:
+        """(home_id, controller_id) used to auto-register unknown devices."""
+
+        entry = self._default_graph
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put_default_graph(self, home_id: int, controller_id: int):
+        self._default_graph = (time.monotonic() + self.ttl, (home_id, controller_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._default_graph = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+device_registry = DeviceRegistry()
+
+
+@event.listens_for(Device, "after_insert")
+@event.listens_for(Device, "after_update")
+@event.listens_for(Device, "after_delete")
+def _invalidate_device(mapper, connection, target):
+    device_registry.invalidate(target.name)
+    # Si se renombro, tambien se descarta el nombre anterior
+    for old_name in inspect(target).attrs.name.history.deleted or ():
+        device_registry.invalidate(old_name)
@@ -1,5 +1,6 @@
 from app.models import DeviceState, DeviceType
 from app.repositories import ControllerRepository, DeviceRepository, HomeRepository
+from .device_registry import DeviceIdentity, DeviceRegistry, device_registry
 
 
 class DeviceService:
@@ -8,22 +9,19 @@ class DeviceService:
         device_repo: DeviceRepository | None = None,
         home_repo: HomeRepository | None = None,
         controller_repo: ControllerRepository | None = None,
+        registry: DeviceRegistry | None = None,
     ):
         self.device_repo = device_repo or DeviceRepository()
         self.home_repo = home_repo or HomeRepository()
         self.controller_repo = controller_repo or ControllerRepository()
+        self.registry = registry or device_registry
 
-    def ensure_device(
-        self,
-        name: str,
-        description: str,
-        model: str,
-        pin: int = 0,
-        type_: DeviceType = DeviceType.HYBRID,
-    ):
-        device = self.device_repo.get_by_name(name)
-        if device:
-            return device
+    def _default_graph(self):
+        """(home_id, controller_id) donde se auto-registran dispositivos nuevos."""
+
+        cached = self.registry.get_default_graph()
+        if cached:
+            return cached
         home = self.home_repo.get_first() or self.home_repo.create_home(
             name="Demo Home", timezone="UTC"
         )
@@ -35,16 +33,74 @@ class DeviceService:
                 hardware_id="esp32-gw",
                 description="Auto-registrado",
             )
-        return self.device_repo.create_device(
-            home_id=home.id,
-            controller_id=controller.id,
+        self.registry.put_default_graph(home.id, controller.id)
+        return home.id, controller.id
+
+    def ensure_identity(
+        self,
+        name: str,
+        description: str,
+        model: str,
+        pin: int = 0,
+        type_: DeviceType = DeviceType.HYBRID,
+        state: DeviceState | None = DeviceState.OFF,
+    ) -> DeviceIdentity:
+        """Resuelve (o auto-registra) un dispositivo pasando primero por el registry cache."""
+
+        identity = self.get_identity(name)
+        if identity:
+            return identity
+        home_id, controller_id = self._default_graph()
+        device = self.device_repo.create_device(
+            home_id=home_id,
+            controller_id=controller_id,
             name=name,
             description=description,
             model=model,
             pin=pin,
             type_=type_,
-            state=DeviceState.OFF,
+            state=state,
         )
+        return self._remember(name, device)
+
+    def get_identity(self, name: str) -> DeviceIdentity | None:
+        """Identidad del dispositivo (registry o base, siempre DeviceIdentity); None si no existe."""
+
+        identity = self.registry.get(name)
+        if identity:
+            return identity
+        device = self.device_repo.get_by_name(name)
+        return self._remember(name, device) if device else None
+
+    def _remember(self, name: str, device) -> DeviceIdentity:
+        identity = DeviceIdentity(device.id, device.home_id, device.controller_id)
+        self.registry.put(name, identity)
+        return identity
+
+    def ensure_device(
+        self,
+        name: str,
+        description: str,
+        model: str,
+        pin: int = 0,
+        type_: DeviceType = DeviceType.HYBRID,
+    ):
+        identity = self.ensure_identity(name, description, model, pin=pin, type_=type_)
+        return self.device_repo.get_by_id(identity.device_id)
+
+    def set_state(self, name: str, identity: DeviceIdentity, state: DeviceState | None) -> bool:
+        """Persiste el estado si difiere del guardado (sin commit); True si hubo UPDATE.
+
+        El UPDATE masivo no dispara los listeners del ORM, asi que el registry
+        se invalida aqui.
+        """
+
+        if state is None:
+            return False
+        changed = self.device_repo.set_state(identity.device_id, state)
+        if changed:
+            self.registry.invalidate(name)
+        return changed
 
     def list_devices(self):
         return self.device_repo.list_devices()
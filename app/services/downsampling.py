@@ -0,0 +1,77 @@
+"""Downsampling of time series to a bounded number of points (NumPy).
+
+Inputs are parallel arrays sorted by time: `x` in epoch seconds and the
+values. Both algorithms return indices into the input, so callers keep the
+original (timestamp, value) pairs instead of interpolated ones.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of at most `threshold` points.
+
+    The per-bucket work (averages of the next bucket, triangle areas) is
+    vectorised; only the choice of one point per bucket stays a Python loop,
+    because each choice depends on the previous one.
+    """
+
+    n = len(x)
+    if threshold >= n or n <= 2:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1])
+
+    # Limites de los threshold-2 buckets interiores (el primero y el ultimo punto se fijan)
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    starts, ends = edges[:-1], edges[1:]
+
+    sizes = ends - starts
+    avg_x = np.add.reduceat(x[: n - 1], starts) / sizes
+    avg_y = np.add.reduceat(y[: n - 1], starts) / sizes
+    # El "siguiente bucket" del ultimo interior es el punto final
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = starts[i], ends[i]
+        bx = x[lo:hi]
+        by = y[lo:hi]
+        area = np.abs((x[a] - next_x[i]) * (by - y[a]) - (x[a] - bx) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(x: np.ndarray, y_min: np.ndarray, y_max: np.ndarray, threshold: int):
+    """Min/max per time bucket: `threshold // 2` equal-width buckets over the span.
+
+    Returns `(min_idx, max_idx)`, one pair per non-empty bucket. For raw
+    readings pass the same array as `y_min` and `y_max`; for rollups pass
+    the bucket minima and maxima.
+    """
+
+    n = len(x)
+    if n == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty
+    buckets = max(1, threshold // 2)
+    span = float(x[-1] - x[0])
+    if span <= 0:
+        ids = np.zeros(n, dtype=np.int64)
+    else:
+        ids = np.minimum(((x - x[0]) * (buckets / span)).astype(np.int64), buckets - 1)
+
+    # x esta ordenado, asi que los ids son no decrecientes: cada grupo es un tramo contiguo
+    group_starts = np.flatnonzero(np.diff(ids, prepend=-1))
+    group_ends = np.append(group_starts[1:], n)
+    by_min = np.lexsort((y_min, ids))
+    by_max = np.lexsort((y_max, ids))
+    return by_min[group_starts], by_max[group_ends - 1]
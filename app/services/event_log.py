@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import atexit
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app import db
+from app.models import EventOrigin, EventType
+from app.repositories import EventRepository
+from app.repositories.write_behind import WriteBehindBuffer
+from app.services.state_store import StateStore, get_state_store
+
+# Estados del payload que generan eventos al cambiar
+TRACKED_STATES = ("led1", "led2", "door_open")
+STATE_LABELS = {
+    "led1": ("off", "on"),
+    "led2": ("off", "on"),
+    "door_open": ("closed", "open"),
+}
+
+
+class EventLog:
+    """Audit trail of device state transitions, written off the request path.
+
+    The last known value of each tracked key lives in a `StateStore`
+    ("device_states", keyed by device id). `observe` compares each payload
+    with it and replaces it in one atomic `update`, so with
+    STATE_BACKEND=sqlite every worker on the host sees the same previous
+    value and a transition is logged exactly once (and survives restarts).
+    A row is queued only when a key had a stored value and it changed; the
+    first value ever seen for a key just becomes the reference. Rows go
+    through a `WriteBehindBuffer`, so a telemetry POST never pays for an
+    INSERT; a background thread writes them in batches.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._store: StateStore | None = None
+        self._buffer: WriteBehindBuffer | None = None
+        self.transitions = 0
+
+    def init_app(self, app):
+        if self._buffer is not None:
+            self._buffer.stop()
+            self._buffer = None
+        self._store = None
+        self.transitions = 0
+        self.enabled = app.config.get("EVENT_LOG_ENABLED", True)
+        if not self.enabled:
+            return
+
+        def _flush(rows):
+            with app.app_context():
+                try:
+                    EventRepository().add_rows(rows)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+
+        self._buffer = WriteBehindBuffer(
+            "events",
+            _flush,
+            max_rows=app.config.get("EVENTS_FLUSH_ROWS", 200),
+            interval=app.config.get("EVENTS_FLUSH_INTERVAL_MS", 1000) / 1000.0,
+            capacity=app.config.get("EVENTS_BUFFER_CAPACITY", 20000),
+        )
+        self._buffer.start()
+        atexit.register(self._buffer.stop)
+
+    @property
+    def store(self) -> StateStore:
+        """Ultimo estado de led1/led2/door_open por dispositivo, segun STATE_BACKEND."""
+
+        if self._store is None:
+            self._store = get_state_store("device_states")
+        return self._store
+
+    def observe(self, device_id: int, home_id: int, payload: Dict[str, Any], timestamp: datetime):
+        """Detecta transiciones de led1/led2/door_open del dispositivo y las encola."""
+
+        self.observe_many([(timestamp, device_id, home_id, payload)])
+
+    def observe_many(self, observations: Iterable[Tuple[datetime, int, int, Dict[str, Any]]]):
+        """Como `observe` para varias muestras (timestamp, device_id, home_id, payload).
+
+        Una sola actualizacion del store por dispositivo; las muestras de cada
+        dispositivo se aplican en orden de timestamp.
+        """
+
+        if not self.enabled:
+            return
+        by_device: Dict[int, List[Tuple[datetime, int, Dict[str, bool]]]] = {}
+        for timestamp, device_id, home_id, payload in observations:
+            reported = {key: bool(payload[key]) for key in TRACKED_STATES if payload.get(key) is not None}
+            if reported:
+                by_device.setdefault(device_id, []).append((timestamp, home_id, reported))
+
+        rows: List[Dict[str, Any]] = []
+        for device_id, samples in by_device.items():
+            samples.sort(key=lambda item: item[0])
+            key = str(device_id)
+            current = self.store.get(key)
+            if current is not None and all(
+                current.get(name) == value for _ts, _home, reported in samples for name, value in reported.items()
+            ):
+                # Nada cambia: se evita la escritura en el store
+                continue
+            found: List[Dict[str, Any]] = []
+
+            def apply(state, device_id=device_id, samples=samples, found=found):
+                state = state or {}
+                seen_at = datetime.fromisoformat(state["ts"]) if state.get("ts") else None
+                for timestamp, home_id, reported in samples:
+                    if seen_at is not None and timestamp < seen_at:
+                        # Muestra atrasada (lote offline): no reescribe el estado actual
+                        continue
+                    for name, value in reported.items():
+                        previous = state.get(name)
+                        if previous is not None and previous != value:
+                            found.append(self._row(device_id, home_id, name, previous, value, timestamp))
+                        state[name] = value
+                    state["ts"] = timestamp.isoformat()
+                    seen_at = timestamp
+                return state
+
+            self.store.update(key, apply)
+            rows.extend(found)
+
+        if rows:
+            self.transitions += len(rows)
+            if self._buffer is not None:
+                self._buffer.append(rows)
+
+    @staticmethod
+    def _row(device_id: int, home_id: int, name: str, previous: bool, value: bool, timestamp: datetime):
+        labels = STATE_LABELS[name]
+        return {
+            "device_id": device_id,
+            "home_id": home_id,
+            "type": EventType.TRIGGER,
+            "origin": EventOrigin.SYSTEM,
+            "detail": f"{name}: {labels[previous]} -> {labels[value]}",
+            "prev_value": float(previous),
+            "next_value": float(value),
+            "timestamp": timestamp,
+        }
+
+    def append(self, rows: List[Dict[str, Any]]) -> bool:
+        """Encola filas de `events` ya armadas (p. ej. las de las reglas).
+
+        Con EVENT_LOG_ENABLED=0 las agrega a la sesion actual y devuelve False:
+        el caller debe hacer commit.
+        """
+
+        if not rows:
+            return True
+        if self._buffer is None:
+            EventRepository().add_rows(rows)
+            return False
+        self._buffer.append(rows)
+        return True
+
+    def flush(self):
+        if self._buffer is not None:
+            self._buffer.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "enabled": self.enabled,
+            "transitions": self.transitions,
+        }
+        if self._buffer is not None:
+            stats["buffer"] = self._buffer.stats()
+        return stats
+
+
+event_log = EventLog()
@@ -0,0 +1,268 @@
+"""Request/DB/upstream instrumentation exposed at `/metrics` (Prometheus text format).
+
+Counters and histograms are written to a per-thread shard, so the hot path
+(one request, one query, one upstream call) never takes a lock: each thread
+only touches its own dicts. A scrape merges the shards; shards of threads
+that have exited are folded into a base shard so thread churn (one thread
+per request in the dev server) does not grow the list.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+from flask import Flask, request
+from sqlalchemy import event
+
+# Latencias de requests y llamadas al remoto (segundos)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Consultas SQL por request
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Tiempo total en la base por request (segundos)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# nombre -> (tipo, ayuda, etiquetas, buckets)
+METRICS: Dict[str, Tuple[str, str, Tuple[str, ...], Tuple[float, ...] | None]] = {
+    "smarthome_http_requests_total": (
+        "counter", "HTTP requests handled.", ("blueprint", "endpoint", "method", "status"), None,
+    ),
+    "smarthome_http_request_duration_seconds": (
+        "histogram", "HTTP request latency.", ("blueprint", "endpoint"), LATENCY_BUCKETS,
+    ),
+    "smarthome_http_requests_in_flight": (
+        "gauge", "HTTP requests being handled.", (), None,
+    ),
+    "smarthome_db_queries_total": (
+        "counter", "SQL statements executed (endpoint=\"\" outside requests).", ("endpoint",), None,
+    ),
+    "smarthome_db_query_seconds_total": (
+        "counter", "Time spent executing SQL statements.", ("endpoint",), None,
+    ),
+    "smarthome_db_queries_per_request": (
+        "histogram", "SQL statements per HTTP request.", ("endpoint",), QUERY_COUNT_BUCKETS,
+    ),
+    "smarthome_db_seconds_per_request": (
+        "histogram", "Time spent in SQL per HTTP request.", ("endpoint",), DB_TIME_BUCKETS,
+    ),
+    "smarthome_upstream_request_duration_seconds": (
+        "histogram", "Latency of calls to REMOTE_API_ROOT.", ("method", "path", "status"), LATENCY_BUCKETS,
+    ),
+}
+
+Labels = Tuple[str, ...]
+
+
+class _Shard:
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        # (metrica, etiquetas) -> valor
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        # (metrica, etiquetas) -> [conteo por bucket..., +Inf, suma]
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+    def inc(self, name: str, labels: Labels, value: float = 1.0):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: Labels, value: float):
+        key = (name, labels)
+        buckets = METRICS[name][3]
+        slots = self.histograms.get(key)
+        if slots is None:
+            slots = self.histograms[key] = [0.0] * (len(buckets) + 2)
+        slots[bisect_left(buckets, value)] += 1
+        slots[-1] += value
+
+    def merge_into(self, counters: Dict, histograms: Dict):
+        for key, value in dict(self.counters).items():
+            counters[key] = counters.get(key, 0.0) + value
+        for key, slots in dict(self.histograms).items():
+            slots = list(slots)
+            total = histograms.get(key)
+            if total is None:
+                histograms[key] = slots
+            else:
+                for i, value in enumerate(slots):
+                    total[i] += value
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    ]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Instrumentation:
+    """Per-endpoint latency, in-flight requests, SQL per request and upstream latency."""
+
+    def __init__(self):
+        self.enabled = True
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, _Shard]] = []
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask, db=None):
+        self.enabled = app.config.get("METRICS_ENABLED", True)
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if db is not None:
+            with app.app_context():
+                engine = db.engine
+                if not event.contains(engine, "before_cursor_execute", self._before_cursor):
+                    event.listen(engine, "before_cursor_execute", self._before_cursor)
+                    event.listen(engine, "after_cursor_execute", self._after_cursor)
+
+    # ---- shards -------------------------------------------------------------
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._fold_dead()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _fold_dead(self):
+        # Un hilo terminado ya no escribe su shard: se suma al base sin carreras
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                shard.merge_into(self._retired.counters, self._retired.histograms)
+        self._shards = alive
+
+    # ---- hooks de Flask -----------------------------------------------------
+
+    def _before_request(self):
+        shard = self._shard()
+        shard.inc("smarthome_http_requests_in_flight", ())
+        # [inicio, consultas, segundos en la base, ya registrado]
+        self._local.request = [time.perf_counter(), 0, 0.0, False]
+
+    def _after_request(self, response):
+        self._record(response.status_code)
+        return response
+
+    def _teardown_request(self, exc):
+        state = getattr(self._local, "request", None)
+        if state is None:
+            return
+        if not state[3]:
+            self._record(500)
+        self._local.request = None
+        self._shard().inc("smarthome_http_requests_in_flight", (), -1.0)
+
+    def _record(self, status: int):
+        state = getattr(self._local, "request", None)
+        if state is None or state[3]:
+            return
+        state[3] = True
+        elapsed = time.perf_counter() - state[0]
+        req = request._get_current_object()
+        endpoint = req.endpoint or "unmatched"
+        blueprint = req.blueprint or ""
+        shard = self._shard()
+        shard.inc("smarthome_http_requests_total", (blueprint, endpoint, req.method, str(status)))
+        shard.observe("smarthome_http_request_duration_seconds", (blueprint, endpoint), elapsed)
+        shard.observe("smarthome_db_queries_per_request", (endpoint,), state[1])
+        shard.observe("smarthome_db_seconds_per_request", (endpoint,), state[2])
+
+    # ---- SQL ----------------------------------------------------------------
+
+    def _before_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("instrumentation_start", []).append(time.perf_counter())
+
+    def _after_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("instrumentation_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        state = getattr(self._local, "request", None)
+        endpoint = ""
+        if state is not None:
+            state[1] += 1
+            state[2] += elapsed
+            endpoint = request.endpoint or "unmatched"
+        shard = self._shard()
+        shard.inc("smarthome_db_queries_total", (endpoint,))
+        shard.inc("smarthome_db_query_seconds_total", (endpoint,), elapsed)
+
+    # ---- remoto -------------------------------------------------------------
+
+    def observe_upstream(self, method: str, path: str, status: str, seconds: float):
+        if self.enabled:
+            self._shard().observe("smarthome_upstream_request_duration_seconds", (method, path, status), seconds)
+
+    # ---- exposicion ---------------------------------------------------------
+
+    def snapshot(self) -> Tuple[Dict, Dict]:
+        counters: Dict[Tuple[str, Labels], float] = {}
+        histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        with self._lock:
+            self._fold_dead()
+            shards = [self._retired] + [shard for _, shard in self._shards]
+            for shard in shards:
+                shard.merge_into(counters, histograms)
+        return counters, histograms
+
+    def render(self) -> str:
+        counters, histograms = self.snapshot()
+        lines: List[str] = []
+        for name, (kind, help_text, label_names, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind != "histogram":
+                series = sorted((labels, value) for (metric, labels), value in counters.items() if metric == name)
+                if not series and not label_names:
+                    series = [((), 0.0)]
+                for labels, value in series:
+                    lines.append(f"{name}{_format_labels(label_names, labels)} {_format_value(value)}")
+                continue
+            for (metric, labels), slots in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0.0
+                for bound, count in zip(list(buckets) + ["+Inf"], slots[:-1]):
+                    cumulative += count
+                    le = bound if isinstance(bound, str) else _format_value(bound)
+                    lines.append(
+                        f"{name}_bucket{_format_labels(list(label_names) + ['le'], list(labels) + [le])} "
+                        f"{_format_value(cumulative)}"
+                    )
+                label_text = _format_labels(label_names, labels)
+                lines.append(f"{name}_sum{label_text} {_format_value(slots[-1])}")
+                lines.append(f"{name}_count{label_text} {_format_value(cumulative)}")
+        return "\n".join(lines) + "\n"
+
+
+def cache_lines(caches: Dict[str, Tuple[float, float]]) -> List[str]:
+    """Contadores hit/miss por cache en formato Prometheus."""
+
+    name = "smarthome_cache_requests_total"
+    lines = [f"# HELP {name} Cache lookups by result.", f"# TYPE {name} counter"]
+    for cache, (hits, misses) in sorted(caches.items()):
+        lines.append(f'{name}{{cache="{cache}",result="hit"}} {_format_value(hits)}')
+        lines.append(f'{name}{{cache="{cache}",result="miss"}} {_format_value(misses)}')
+    return lines
+
+
+instrumentation = Instrumentation()
+
+
+__all__ = ["Instrumentation", "cache_lines", "instrumentation"]
@@ -1,45 +1,147 @@
 from datetime import datetime
+from typing import Any, Dict
 
-from app.repositories import HomeRepository, ReadingRepository
+import numpy as np
+from flask import current_app
+
+from app.models import MeasureType
+from app.repositories import DeviceRepository, HomeRepository, ReadingRepository, RollupRepository
+from app.services.downsampling import lttb, minmax
+from app.services.summary_counters import summary_counters
+
+# Ancho de bucket (s) de cada tabla de rollup, de la mas fina a la mas gruesa
+ROLLUP_WIDTHS = (("1m", 60), ("1h", 3600), ("1d", 86400))
 
 
 class MetricsService:
-    def __init__(self, reading_repo: ReadingRepository | None = None, home_repo: HomeRepository | None = None):
+    def __init__(
+        self,
+        reading_repo: ReadingRepository | None = None,
+        home_repo: HomeRepository | None = None,
+        rollup_repo: RollupRepository | None = None,
+        device_repo: DeviceRepository | None = None,
+    ):
         self.reading_repo = reading_repo or ReadingRepository()
         self.home_repo = home_repo or HomeRepository()
+        self.rollup_repo = rollup_repo or RollupRepository()
+        self.device_repo = device_repo or DeviceRepository()
 
-    def get_home_and_readings(self, home_id: int | None = None, limit: int = 50):
+    def _resolve_home(self, home_id: int | None = None):
         home = None
         if home_id:
             home = self.home_repo.get_by_id(home_id)
         if not home:
             home = self.home_repo.get_first()
+        return home
+
+    def get_home_and_readings(self, home_id: int | None = None, limit: int = 50):
+        home = self._resolve_home(home_id)
         if not home:
             return None, []
         readings = self.reading_repo.latest_by_home(home.id, limit=limit)
         return home, readings
 
-    def summary(self):
-        home = self.home_repo.get_first()
+    def chart_version(self, home_id: int | None = None):
+        """(home, version) del grafico: cambia solo cuando llega una lectura mas nueva."""
+
+        home = self._resolve_home(home_id)
         if not home:
-            return {
-                "home": None,
-                "counts": {"homes": 0, "readings": 0},
-                "last": None,
-            }
-        readings = self.reading_repo.latest_by_home(home.id, limit=20)
-        counts = len(readings)
-        last = readings[0] if readings else None
-        return {
-            "home": {
-                "id": home.id,
-                "name": home.name,
-            },
-            "counts": {"homes": 1, "readings": counts},
-            "last": {
-                "measure": last.measure.value if last else None,
-                "value": last.value if last else None,
-                "timestamp": last.timestamp.isoformat() if last else None,
-            },
-            "timestamp": datetime.utcnow().isoformat(),
+            return None, "empty"
+        newest = self.reading_repo.newest_by_home(home.id)
+        if newest is None:
+            return home, f"{home.id}-empty"
+        return home, f"{home.id}-{newest.id}-{newest.timestamp:%Y%m%d%H%M%S}"
+
+    @staticmethod
+    def pick_source(span_seconds: float, points: int) -> str:
+        """Tabla mas gruesa cuyo bucket no supera el tiempo que cubre cada punto pedido."""
+
+        if not current_app.config.get("ROLLUPS_ENABLED", True):
+            return "raw"
+        per_point = span_seconds / max(points, 1)
+        source = "raw"
+        for resolution, width in ROLLUP_WIDTHS:
+            if width <= per_point:
+                source = resolution
+        return source
+
+    def series(
+        self,
+        measure: MeasureType,
+        start: datetime,
+        end: datetime,
+        points: int,
+        home_id: int | None = None,
+        device_name: str | None = None,
+        mode: str = "lttb",
+    ) -> Dict[str, Any] | None:
+        """Serie [start, end) de una medida reducida a lo sumo a `points` puntos.
+
+        Devuelve None si el hogar o el dispositivo no existen.
+        """
+
+        home = self._resolve_home(home_id)
+        if not home:
+            return None
+        device_id = None
+        if device_name:
+            device = self.device_repo.get_by_name(device_name)
+            if not device or device.home_id != home.id:
+                return None
+            device_id = device.id
+
+        source = self.pick_source((end - start).total_seconds(), points)
+        truncated = False
+        if source == "raw":
+            max_rows = current_app.config.get("SERIES_RAW_MAX_ROWS", 50000)
+            rows = self.reading_repo.series(home.id, measure, start, end, device_id=device_id, limit=max_rows + 1)
+            if len(rows) > max_rows:
+                if current_app.config.get("ROLLUPS_ENABLED", True):
+                    source = "1m"
+                else:
+                    rows, truncated = rows[:max_rows], True
+        if source == "raw":
+            stamps = [r[0] for r in rows]
+            y_min = y_max = y_avg = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+        else:
+            rows = self.rollup_repo.series(source, home.id, measure, start, end, device_id=device_id)
+            stamps = [r[0] for r in rows]
+            cols = np.array([r[1:] for r in rows], dtype=np.float64).reshape(-1, 4)
+            y_min, y_max = cols[:, 0], cols[:, 1]
+            y_avg = cols[:, 2] / cols[:, 3]
+
+        x = np.array(stamps, dtype="datetime64[us]").astype(np.int64) / 1e6
+        if mode == "minmax":
+            lo, hi = minmax(x, y_min, y_max, points)
+            idx = np.concatenate([lo, hi])
+            values = np.concatenate([y_min[lo], y_max[hi]])
+            order = np.lexsort((values, idx))
+            idx, values = idx[order], values[order]
+            # En lecturas crudas un bucket de un solo punto daria el mismo par dos veces
+            keep = np.ones(len(idx), dtype=bool)
+            keep[1:] = (idx[1:] != idx[:-1]) | (values[1:] != values[:-1])
+            idx, values = idx[keep], values[keep]
+        else:
+            idx = lttb(x, y_avg, points)
+            values = y_avg[idx]
+
+        times = np.datetime_as_string((x[idx] * 1e6).astype("datetime64[us]"), unit="s")
+        result = {
+            "home_id": home.id,
+            "device": device_name,
+            "measure": measure.value,
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "source": source,
+            "mode": mode,
+            "input_points": len(stamps),
+            "points": [[str(t), round(float(v), 4)] for t, v in zip(times, values)],
         }
+        if truncated:
+            result["truncated"] = True
+        return result
+
+    def summary(self, home_id: int | None = None):
+        """Resumen servido desde los contadores en memoria (reconciliados con la base)."""
+
+        return summary_counters.snapshot(home_id)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Resultado de _proxy_sensor: (payload normalizado, status HTTP, error)
+Result = Tuple[Any, int, Any]
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; after
+    `reset_timeout` seconds a single trial call is let through (half-open)."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class ProxyCache:
+    """Short-TTL cache for proxied upstream reads.
+
+    - fresh (< ttl): served from memory;
+    - stale (< stale_ttl): served immediately while one background refresh runs;
+    - miss: concurrent callers for the same key share a single upstream call;
+    - upstream failing or breaker open: the last good value is served (any age).
+    Only 200 responses are cached.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 2.0,
+        stale_ttl: float = 60.0,
+        max_entries: int = 1024,
+        breaker: CircuitBreaker | None = None,
+        submit: Callable[[Callable[[], Any]], Any] | None = None,
+        wait_timeout: float = 10.0,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = max(ttl, stale_ttl)
+        self.max_entries = max_entries
+        self.wait_timeout = wait_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._submit = submit or (lambda fn: threading.Thread(target=fn, daemon=True).start())
+        self._entries: "OrderedDict[Hashable, Tuple[float, Result]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "fallbacks": 0,
+            "upstream_errors": 0,
+        }
+
+    def get(self, key: Hashable, fetch: Callable[[], Result]) -> Result:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                age = now - entry[0]
+                if age < self.ttl:
+                    self.counters["hits"] += 1
+                    return entry[1]
+                if age < self.stale_ttl:
+                    self.counters["stale_hits"] += 1
+                    if key not in self._inflight and self.breaker.state != "open":
+                        self._inflight[key] = Future()
+                        self._submit(lambda: self._refresh(key, fetch))
+                    return entry[1]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.counters["misses"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            try:
+                return future.result(timeout=self.wait_timeout)
+            except FutureTimeout:
+                return self._fallback(key, (None, 504, {"error": "remote_timeout"}))
+        return self._refresh(key, fetch)
+
+    def _refresh(self, key: Hashable, fetch: Callable[[], Result]) -> Result:
+        try:
+            result = self._fetch(key, fetch)
+        except Exception as exc:  # pragma: no cover - defensivo
+            result = (None, 502, {"error": "remote_error", "detail": str(exc)})
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_result(result)
+        return result
+
+    def _fetch(self, key: Hashable, fetch: Callable[[], Result]) -> Result:
+        if not self.breaker.allow():
+            return self._fallback(key, (None, 503, {"error": "remote_unavailable", "detail": "circuit_open"}))
+
+        try:
+            result = fetch()
+        except Exception as exc:
+            # Cuenta como fallo: si era la prueba half-open, libera el breaker
+            result = (None, 502, {"error": "remote_error", "detail": str(exc)})
+        status = result[1]
+        if status >= 500:
+            self.breaker.record_failure()
+            self.counters["upstream_errors"] += 1
+            return self._fallback(key, result)
+
+        self.breaker.record_success()
+        if status == 200:
+            with self._lock:
+                self._entries[key] = (time.monotonic(), result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def _fallback(self, key: Hashable, error: Result) -> Result:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return error
+        self.counters["fallbacks"] += 1
+        return entry[1]
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "entries": len(self._entries), "breaker": self.breaker.state}
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from flask import current_app
+from sqlalchemy import delete, func, select
+
+from app import db
+from app.repositories import HomeRepository, PartitionRepository
+from app.repositories.partition_repository import PARTITIONED_TABLES
+from .bulk_io import export_value as _csv_value
+
+
+class RetentionService:
+    """Retencion por hogar de readings/events con archivo previo en CSV gzip.
+
+    Con tablas particionadas (MySQL) las particiones que ya vencieron para
+    todos los hogares se archivan y se eliminan con DROP PARTITION, sin
+    bloquear la tabla. Los hogares con una retencion menor (o cualquier hogar
+    si la tabla no esta particionada) se recortan con DELETE por lotes cortos.
+    """
+
+    def __init__(self, home_repo: HomeRepository | None = None, partition_repo: PartitionRepository | None = None):
+        self.home_repo = home_repo or HomeRepository()
+        self.partition_repo = partition_repo or PartitionRepository()
+
+    @property
+    def granularity(self) -> str:
+        return current_app.config.get("PARTITION_GRANULARITY", "month")
+
+    @property
+    def ahead(self) -> int:
+        return current_app.config.get("PARTITION_AHEAD", 3)
+
+    def retention_days(self, home) -> int:
+        """Dias a conservar del hogar; 0 = sin limite."""
+
+        if home.retention_days is not None:
+            return max(home.retention_days, 0)
+        return current_app.config.get("RETENTION_DAYS", 0)
+
+    def is_partitioned(self, table: str) -> bool:
+        return self.partition_repo.supported and bool(self.partition_repo.list_partitions(table))
+
+    def init_partitions(self, now: datetime | None = None, dry_run: bool = False) -> List[str]:
+        if not self.partition_repo.supported:
+            raise RuntimeError("El particionado solo esta soportado en MySQL/MariaDB")
+        now = now or datetime.utcnow()
+        statements: List[str] = []
+        for table in PARTITIONED_TABLES:
+            statements.extend(self.partition_repo.init_statements(table, now, self.granularity, self.ahead))
+        if not dry_run:
+            for statement in statements:
+                self.partition_repo.execute(statement)
+        return statements
+
+    def maintain(self, now: datetime | None = None, dry_run: bool = False) -> List[str]:
+        """Crea por adelantado las particiones de los proximos PARTITION_AHEAD periodos."""
+
+        if not self.partition_repo.supported:
+            return []
+        now = now or datetime.utcnow()
+        statements: List[str] = []
+        for table in PARTITIONED_TABLES:
+            statements.extend(self.partition_repo.future_statements(table, now, self.granularity, self.ahead))
+        if not dry_run:
+            for statement in statements:
+                self.partition_repo.execute(statement)
+        return statements
+
+    def prune(self, now: datetime | None = None, dry_run: bool = False) -> Dict[str, Any]:
+        now = now or datetime.utcnow()
+        report: Dict[str, Any] = {
+            "created": self.maintain(now, dry_run=dry_run),
+            "dropped": [],
+            "deleted": [],
+            "archives": [],
+        }
+        homes = {home.id: self.retention_days(home) for home in self.home_repo.list_homes()}
+        # Una particion solo se puede eliminar cuando vencio para todos los hogares
+        horizon = 0 if not homes or 0 in homes.values() else max(homes.values())
+
+        for table, model in PARTITIONED_TABLES.items():
+            partitioned = self.is_partitioned(table)
+            if partitioned and horizon:
+                self._drop_expired(table, model, now - timedelta(days=horizon), dry_run, report)
+            for home_id, days in homes.items():
+                if days and (not partitioned or days < horizon):
+                    self._delete_home(table, model, home_id, now - timedelta(days=days), dry_run, report)
+        return report
+
+    def _drop_expired(self, table: str, model, cutoff: datetime, dry_run: bool, report: Dict[str, Any]):
+        lower = None
+        for name, upper in self.partition_repo.list_partitions(table):
+            if upper is None or upper > cutoff:
+                break
+            where = [model.timestamp < upper]
+            if lower is not None:
+                where.append(model.timestamp >= lower)
+            lower = upper
+            if dry_run:
+                rows = db.session.execute(select(func.count()).select_from(model).where(*where)).scalar()
+                report["dropped"].append({"table": table, "partition": name, "rows": rows})
+                continue
+
+            rows = 0
+            with self._archive(table, name) as (fh, writer, path):
+                last_id = 0
+                while True:
+                    page = db.session.execute(
+                        select(model.__table__)
+                        .where(*where, model.id > last_id)
+                        .order_by(model.id.asc())
+                        .limit(self._batch_rows())
+                    ).all()
+                    if not page:
+                        break
+                    last_id = page[-1].id
+                    writer.writerows([_csv_value(v) for v in row] for row in page)
+                    rows += len(page)
+            self.partition_repo.drop_partition(table, name)
+            report["dropped"].append({"table": table, "partition": name, "rows": rows})
+            report["archives"].append(path)
+
+    def _delete_home(self, table: str, model, home_id: int, cutoff: datetime, dry_run: bool, report: Dict[str, Any]):
+        where = [model.home_id == home_id, model.timestamp < cutoff]
+        if dry_run:
+            rows = db.session.execute(select(func.count()).select_from(model).where(*where)).scalar()
+            if rows:
+                report["deleted"].append({"table": table, "home_id": home_id, "rows": rows})
+            return
+
+        rows = 0
+        path = None
+        # Lotes cortos por (home_id, timestamp): cada DELETE toca pocas filas y hace commit
+        page = self._expired_page(model, where)
+        if page:
+            with self._archive(table, f"home{home_id}-{datetime.utcnow():%Y%m%dT%H%M%S}") as (fh, writer, path):
+                while page:
+                    writer.writerows([_csv_value(v) for v in row] for row in page)
+                    # El lote queda en disco antes de que su DELETE haga commit
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                    db.session.execute(delete(model).where(model.id.in_([row.id for row in page]), *where))
+                    db.session.commit()
+                    rows += len(page)
+                    page = self._expired_page(model, where)
+        if rows:
+            report["deleted"].append({"table": table, "home_id": home_id, "rows": rows})
+            report["archives"].append(path)
+
+    def _expired_page(self, model, where):
+        return db.session.execute(
+            select(model.__table__).where(*where).order_by(model.timestamp.asc(), model.id.asc()).limit(self._batch_rows())
+        ).all()
+
+    def _batch_rows(self) -> int:
+        return current_app.config.get("RETENTION_BATCH_ROWS", 5000)
+
+    @contextmanager
+    def _archive(self, table: str, suffix: str):
+        """Escribe `<ARCHIVE_DIR>/<table>/<table>-<suffix>.csv.gz`.
+
+        Si el trabajo falla a medias el archivo queda como `.partial`: puede
+        contener filas cuyo DELETE ya hizo commit, asi que nunca se descarta.
+        """
+
+        directory = os.path.join(current_app.config.get("ARCHIVE_DIR", "archive"), table)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{table}-{suffix}.csv.gz")
+        tmp = f"{path}.tmp"
+        completed = False
+        try:
+            with gzip.open(tmp, "wt", newline="", encoding="utf-8") as fh:
+                writer = csv.writer(fh)
+                writer.writerow([column.name for column in PARTITIONED_TABLES[table].__table__.columns])
+                yield fh, writer, path
+            completed = True
+        finally:
+            os.replace(tmp, path if completed else f"{path}.partial")
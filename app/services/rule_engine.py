@@ -0,0 +1,348 @@
+"""Rule engine evaluated on ingest.
+
+`Rule.condition` is a small expression over the sample fields, e.g.
+``temp > 28 and (hum >= 60 or motion == on)``. Each condition is parsed
+once into a closure; active rules are indexed by (home, field), so a sample
+only evaluates the rules that reference one of the fields it carries.
+
+`RuleAction.action_type` is ``<control>=<value>`` (``led1=on``,
+``door_open=false``, ``door_angle=90``) applied to the action's device
+through `ControlService`.
+"""
+
+from __future__ import annotations
+
+import logging
+import operator
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Tuple
+
+from sqlalchemy import event, select
+
+from app import db
+from app.models import Device, EventOrigin, EventType, Rule, RuleAction
+from .control_service import ControlService
+
+logger = logging.getLogger(__name__)
+
+# Campos de la muestra que pueden usar las condiciones
+FIELDS = ("temp", "hum", "motion", "door_open", "door_angle")
+# Controles que pueden cambiar las acciones (mismos que ControlService)
+CONTROLS = ("led1", "led2", "door_open", "door_angle")
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+}
+CONSTANTS = {"true": 1.0, "on": 1.0, "open": 1.0, "false": 0.0, "off": 0.0, "closed": 0.0}
+
+_TOKEN = re.compile(r"\s*(?:(-?\d+(?:\.\d+)?)|(>=|<=|==|!=|>|<|=)|([()])|([A-Za-z_][A-Za-z0-9_]*))")
+
+Context = Dict[str, float]
+Predicate = Callable[[Context], bool]
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _tokenize(text: str) -> List[Tuple[str, Any]]:
+    tokens: List[Tuple[str, Any]] = []
+    pos, end = 0, len(text.rstrip())
+    while pos < end:
+        match = _TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise RuleError(f"caracter inesperado en la posicion {pos}: {text[pos:pos + 10]!r}")
+        number, op, paren, word = match.groups()
+        if number is not None:
+            tokens.append(("num", float(number)))
+        elif op is not None:
+            tokens.append(("op", op))
+        elif paren is not None:
+            tokens.append((paren, paren))
+        else:
+            tokens.append(("word", word.lower()))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """expr := term (or term)* ; term := factor (and factor)* ;
+    factor := not factor | ( expr ) | field op value"""
+
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.fields: set = set()
+
+    def _peek(self) -> Tuple[str, Any] | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _take(self) -> Tuple[str, Any]:
+        token = self._peek()
+        if token is None:
+            raise RuleError("condicion incompleta")
+        self.pos += 1
+        return token
+
+    def parse(self) -> Predicate:
+        predicate = self._expr()
+        if self._peek() is not None:
+            raise RuleError(f"token inesperado: {self._peek()[1]!r}")
+        if not self.fields:
+            raise RuleError("la condicion no usa ningun campo")
+        return predicate
+
+    def _expr(self) -> Predicate:
+        terms = [self._term()]
+        while self._peek() == ("word", "or"):
+            self.pos += 1
+            terms.append(self._term())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda ctx: any(term(ctx) for term in terms)
+
+    def _term(self) -> Predicate:
+        factors = [self._factor()]
+        while self._peek() == ("word", "and"):
+            self.pos += 1
+            factors.append(self._factor())
+        if len(factors) == 1:
+            return factors[0]
+        return lambda ctx: all(factor(ctx) for factor in factors)
+
+    def _factor(self) -> Predicate:
+        kind, value = self._take()
+        if (kind, value) == ("word", "not"):
+            inner = self._factor()
+            return lambda ctx: not inner(ctx)
+        if kind == "(":
+            inner = self._expr()
+            if self._take()[0] != ")":
+                raise RuleError("falta ')'")
+            return inner
+        if kind != "word" or value not in FIELDS:
+            raise RuleError(f"campo desconocido: {value!r} (validos: {', '.join(FIELDS)})")
+        field = value
+        kind, op = self._take()
+        if kind != "op":
+            raise RuleError(f"se esperaba un operador despues de {field!r}")
+        kind, raw = self._take()
+        if kind == "num":
+            constant = raw
+        elif kind == "word" and raw in CONSTANTS:
+            constant = CONSTANTS[raw]
+        else:
+            raise RuleError(f"valor invalido: {raw!r}")
+        self.fields.add(field)
+        compare = OPERATORS[op]
+
+        def predicate(ctx: Context) -> bool:
+            current = ctx.get(field)
+            return current is not None and compare(current, constant)
+
+        return predicate
+
+
+def compile_condition(text: str) -> Tuple[Predicate, FrozenSet[str]]:
+    """Parsea la condicion una sola vez: (predicado, campos que usa)."""
+
+    parser = _Parser(text or "")
+    predicate = parser.parse()
+    return predicate, frozenset(parser.fields)
+
+
+def parse_action(action_type: str) -> Tuple[str, Any]:
+    """"led1=on" -> ("led1", True); "door_angle=90" -> ("door_angle", 90)."""
+
+    key, sep, raw = (action_type or "").partition("=")
+    key, raw = key.strip().lower(), raw.strip().lower()
+    if not sep or key not in CONTROLS:
+        raise RuleError(f"accion invalida: {action_type!r} (formato <control>=<valor>)")
+    if key == "door_angle":
+        try:
+            angle = int(float(raw))
+        except ValueError:
+            raise RuleError(f"angulo invalido: {raw!r}") from None
+        return key, max(0, min(180, angle))
+    if raw in CONSTANTS:
+        return key, bool(CONSTANTS[raw])
+    if raw in ("1", "0"):
+        return key, raw == "1"
+    raise RuleError(f"valor invalido para {key}: {raw!r}")
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    rule_id: int
+    home_id: int
+    condition: str
+    predicate: Predicate
+    fields: FrozenSet[str]
+    # (device_id, nombre del dispositivo, control, valor)
+    actions: Tuple[Tuple[int, str, str, Any], ...]
+
+
+class RuleEngine:
+    """Evaluates active rules against every ingested sample.
+
+    Rules fire on the rising edge (condition goes from false to true), so a
+    sustained condition sends its controls once instead of on every sample.
+    The evaluation context is the last known value of each field in the
+    home, which lets a rule combine fields reported by different devices.
+    Compiled rules are cached per home and reloaded after `refresh` seconds
+    or when a Rule/RuleAction changes in this process.
+    """
+
+    def __init__(self, control_service: ControlService | None = None, refresh: float = 60.0):
+        self.control_service = control_service or ControlService()
+        self.enabled = True
+        self.refresh = refresh
+        self._index: Dict[int, Tuple[float, Dict[str, List[CompiledRule]]]] = {}
+        self._context: Dict[int, Context] = {}
+        self._armed: Dict[int, bool] = {}
+        self._lock = threading.Lock()
+        self.evaluated = 0
+        self.fired = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get("RULES_ENABLED", True)
+        self.refresh = app.config.get("RULES_REFRESH_SECONDS", self.refresh)
+        with self._lock:
+            self._index.clear()
+            self._context.clear()
+            self._armed.clear()
+            self.evaluated = self.fired = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._index.clear()
+
+    def _load(self, home_id: int) -> Dict[str, List[CompiledRule]]:
+        rows = db.session.execute(
+            select(Rule.id, Rule.condition, RuleAction.action_type, Device.id, Device.name)
+            .join(RuleAction, RuleAction.rule_id == Rule.id)
+            .join(Device, Device.id == RuleAction.device_id)
+            .where(Rule.home_id == home_id, Rule.active.is_(True))
+            .order_by(Rule.id.asc(), RuleAction.id.asc())
+        ).all()
+        grouped: Dict[int, Tuple[str, List[Tuple[int, str, str, Any]]]] = {}
+        for rule_id, condition, action_type, device_id, device_name in rows:
+            try:
+                key, value = parse_action(action_type)
+            except RuleError as exc:
+                logger.warning("regla %s: %s", rule_id, exc)
+                continue
+            grouped.setdefault(rule_id, (condition, []))[1].append((device_id, device_name, key, value))
+
+        index: Dict[str, List[CompiledRule]] = {}
+        for rule_id, (condition, actions) in grouped.items():
+            try:
+                predicate, fields = compile_condition(condition)
+            except RuleError as exc:
+                logger.warning("regla %s ignorada: %s", rule_id, exc)
+                continue
+            compiled = CompiledRule(rule_id, home_id, condition, predicate, fields, tuple(actions))
+            for field in fields:
+                index.setdefault(field, []).append(compiled)
+        return index
+
+    def _rules_for(self, home_id: int) -> Dict[str, List[CompiledRule]]:
+        cached = self._index.get(home_id)
+        if cached is not None and time.monotonic() - cached[0] < self.refresh:
+            return cached[1]
+        index = self._load(home_id)
+        with self._lock:
+            self._index[home_id] = (time.monotonic(), index)
+        return index
+
+    def evaluate(self, samples: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Evalua las reglas afectadas por cada muestra y aplica las que se disparan.
+
+        Devuelve las filas de `events` (origin RULE) de los controles enviados, sin escribirlas.
+        """
+
+        if not self.enabled:
+            return []
+        fired: List[Tuple[CompiledRule, datetime]] = []
+        for sample in sorted(samples, key=lambda s: s["timestamp"]):
+            present = [field for field in FIELDS if sample.get(field) is not None]
+            if not present:
+                continue
+            index = self._rules_for(sample["home_id"])
+            with self._lock:
+                context = self._context.setdefault(sample["home_id"], {})
+                for field in present:
+                    context[field] = float(sample[field])
+                if not index:
+                    continue
+                seen = set()
+                for field in present:
+                    for rule in index.get(field, ()):
+                        if rule.rule_id in seen:
+                            continue
+                        seen.add(rule.rule_id)
+                        self.evaluated += 1
+                        matched = rule.predicate(context)
+                        if matched and not self._armed.get(rule.rule_id, False):
+                            fired.append((rule, sample["timestamp"]))
+                        self._armed[rule.rule_id] = matched
+        return [event for rule, timestamp in fired for event in self._fire(rule, timestamp)]
+
+    def _fire(self, rule: CompiledRule, timestamp: datetime) -> List[Dict[str, Any]]:
+        events: List[Dict[str, Any]] = []
+        self.fired += 1
+        for device_id, device_name, key, value in rule.actions:
+            previous = next(
+                (item["value"] for item in self.control_service.get_controls(device_name) if item["control"] == key),
+                None,
+            )
+            if previous == value:
+                # El control ya esta en el valor pedido: no hay cambio que enviar ni registrar
+                continue
+            self.control_service.set_controls(device_name, {key: value})
+            events.append(
+                {
+                    "device_id": device_id,
+                    "home_id": rule.home_id,
+                    "type": EventType.TRIGGER,
+                    "origin": EventOrigin.RULE,
+                    "detail": f"regla {rule.rule_id}: {rule.condition} -> {key}={str(value).lower()}"[:500],
+                    "prev_value": float(previous or 0),
+                    "next_value": float(value),
+                    "timestamp": timestamp,
+                }
+            )
+        return events
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "homes": len(self._index),
+                "rules": sum(len({r.rule_id for rules in idx.values() for r in rules}) for _, idx in self._index.values()),
+                "evaluated": self.evaluated,
+                "fired": self.fired,
+            }
+
+
+rule_engine = RuleEngine()
+
+
+@event.listens_for(Rule, "after_insert")
+@event.listens_for(Rule, "after_update")
+@event.listens_for(Rule, "after_delete")
+@event.listens_for(RuleAction, "after_insert")
+@event.listens_for(RuleAction, "after_update")
+@event.listens_for(RuleAction, "after_delete")
+def _rules_changed(mapper, connection, target):
+    rule_engine.invalidate()
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import List
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+
+from app import db
+
+
+class SchemaService:
+    """Lleva una base existente al esquema de los modelos sin tocar lo que ya esta.
+
+    `db/database.sql` solo usa CREATE TABLE IF NOT EXISTS, asi que en una base
+    desplegada no agrega las tablas ni columnas nuevas. Aqui se comparan los
+    modelos con el catalogo de la base: las tablas que faltan se crean (con sus
+    indices y claves foraneas) y las columnas que faltan se agregan con
+    ALTER TABLE ... ADD COLUMN (siempre nullable o con default). Es idempotente.
+    """
+
+    def upgrade_statements(self) -> List[str]:
+        from app import models  # noqa: F401 - registra las tablas
+
+        engine = db.engine
+        inspector = inspect(engine)
+        existing = set(inspector.get_table_names())
+        statements: List[str] = []
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing:
+                statements.append(str(CreateTable(table).compile(dialect=engine.dialect)).strip())
+                statements.extend(
+                    str(CreateIndex(index).compile(dialect=engine.dialect)).strip() for index in table.indexes
+                )
+                continue
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                ddl = str(CreateColumn(column).compile(dialect=engine.dialect)).strip()
+                statements.append(f"ALTER TABLE {engine.dialect.identifier_preparer.quote(table.name)} ADD COLUMN {ddl}")
+        return statements
+
+    def upgrade(self, dry_run: bool = False) -> List[str]:
+        statements = self.upgrade_statements()
+        if not dry_run and statements:
+            with db.engine.begin() as conn:
+                for statement in statements:
+                    conn.exec_driver_sql(statement)
+        return statements
@@ -0,0 +1,248 @@
+"""Opt-in per-request SQL profiler (SQL_PROFILER_ENABLED=1).
+
+Hooks the engine cursor events and records every statement a request
+issues, with its duration and the line of app code that triggered it.
+At the end of the request the statements are grouped by SQL text: a shape
+repeated `n1_threshold` times or more is flagged as a likely N+1 (a query
+in a loop or a lazy relationship), and any statement slower than `slow_ms`
+is flagged as slow. Reports go to the log and to a bounded in-memory
+history served by `GET /api/metrics/sql`.
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List
+
+from flask import Flask, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_REPO_ROOT = os.path.dirname(_APP_ROOT)
+_THIS_FILE = os.path.abspath(__file__)
+_LIB_PREFIXES = tuple({sys.prefix, sys.base_prefix, sys.exec_prefix, sys.base_exec_prefix})
+# "IN (?, ?, ?)" expandido por SQLAlchemy -> "IN (...)", para agrupar por forma
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    return _IN_LIST.sub("(...)", _SPACES.sub(" ", statement).strip())
+
+
+def _caller(depth: int = 2) -> str:
+    """Primeras `depth` lineas de codigo de la app (fuera del profiler) en la pila actual.
+
+    Si la consulta no pasa por app/ (p. ej. un script), usa el primer frame
+    que no sea de la libreria estandar ni de site-packages.
+    """
+
+    frame = sys._getframe(2)
+    found: List[str] = []
+    fallback = None
+    while frame is not None and len(found) < depth:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_ROOT) and filename != _THIS_FILE:
+            found.append(f"{os.path.relpath(filename, _REPO_ROOT)}:{frame.f_lineno} ({frame.f_code.co_name})")
+        elif fallback is None and not filename.startswith(_LIB_PREFIXES) and not filename.startswith("<"):
+            fallback = f"{filename}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return " <- ".join(found) or fallback or "?"
+
+
+class _RequestTrace:
+    __slots__ = ("started", "statements", "dropped", "sql_ms")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # (sql normalizado, ms, caller, hash de parametros, filas)
+        self.statements: List[tuple] = []
+        self.dropped = 0
+        self.sql_ms = 0.0
+
+
+class SqlProfiler:
+    """Records the statements of each request and flags N+1 patterns and slow queries."""
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_ms = 100.0
+        self.n1_threshold = 5
+        self.max_statements = 500
+        self.log_mode = "issues"
+        self._local = threading.local()
+        self._reports: "deque[Dict[str, Any]]" = deque(maxlen=50)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def init_app(self, app: Flask, db):
+        config = app.config
+        self.enabled = config.get("SQL_PROFILER_ENABLED", False)
+        self.slow_ms = config.get("SQL_PROFILER_SLOW_MS", self.slow_ms)
+        self.n1_threshold = max(2, config.get("SQL_PROFILER_N1_THRESHOLD", self.n1_threshold))
+        self.max_statements = config.get("SQL_PROFILER_MAX_STATEMENTS", self.max_statements)
+        self.log_mode = config.get("SQL_PROFILER_LOG", self.log_mode)
+        with self._lock:
+            self._reports = deque(maxlen=config.get("SQL_PROFILER_HISTORY", 50))
+        if not self.enabled:
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        with app.app_context():
+            engine = db.engine
+            if not event.contains(engine, "before_cursor_execute", self._before_cursor):
+                event.listen(engine, "before_cursor_execute", self._before_cursor)
+                event.listen(engine, "after_cursor_execute", self._after_cursor)
+
+    # ---- eventos del engine -------------------------------------------------
+
+    def _before_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("sql_profiler_start", []).append(time.perf_counter())
+
+    def _after_cursor(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("sql_profiler_start")
+        if not starts:
+            return
+        elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            # Fuera de un request (write-behind, eventos, CLI): solo las lentas
+            if elapsed_ms >= self.slow_ms:
+                logger.warning("SQL lenta (%.1f ms) fuera de request: %s", elapsed_ms, normalize_sql(statement)[:500])
+            return
+        trace.sql_ms += elapsed_ms
+        if len(trace.statements) >= self.max_statements:
+            trace.dropped += 1
+            return
+        rows = len(parameters) if executemany else 1
+        try:
+            params_key = hash(repr(parameters))
+        except Exception:  # pragma: no cover - parametros sin repr
+            params_key = None
+        trace.statements.append((normalize_sql(statement), elapsed_ms, _caller(), params_key, rows))
+
+    # ---- hooks de Flask -----------------------------------------------------
+
+    def _before_request(self):
+        # Las consultas al propio profiler no se registran
+        if request.endpoint not in ("metrics.sql_profiles", "metrics.sql_profile"):
+            self._local.trace = _RequestTrace()
+
+    def _after_request(self, response):
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            return response
+        self._local.trace = None
+        report = self._build_report(trace, response.status_code)
+        with self._lock:
+            self._reports.append(report)
+        response.headers["X-SQL-Queries"] = str(report["queries"])
+        response.headers["X-SQL-Profile"] = str(report["id"])
+        self._log(report)
+        return response
+
+    def _teardown_request(self, exc):
+        # Request abortado antes de after_request: se descarta la traza
+        self._local.trace = None
+
+    # ---- reportes -----------------------------------------------------------
+
+    def _build_report(self, trace: _RequestTrace, status: int) -> Dict[str, Any]:
+        groups: Dict[str, Dict[str, Any]] = {}
+        slow: List[Dict[str, Any]] = []
+        for sql, ms, caller, params_key, rows in trace.statements:
+            group = groups.get(sql)
+            if group is None:
+                group = groups[sql] = {"sql": sql, "count": 0, "total_ms": 0.0, "params": set(), "callers": {}}
+            group["count"] += 1
+            group["total_ms"] += ms
+            group["params"].add(params_key)
+            group["callers"][caller] = group["callers"].get(caller, 0) + 1
+            if ms >= self.slow_ms:
+                slow.append({"sql": sql, "ms": round(ms, 3), "caller": caller, "rows": rows})
+
+        repeated = [
+            {
+                "sql": group["sql"],
+                "count": group["count"],
+                "distinct_params": len(group["params"]),
+                "total_ms": round(group["total_ms"], 3),
+                "callers": group["callers"],
+            }
+            for group in sorted(groups.values(), key=lambda g: -g["count"])
+            if group["count"] >= self.n1_threshold
+        ]
+        return {
+            "id": next(self._ids),
+            "at": datetime.utcnow().isoformat(),
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "status": status,
+            "duration_ms": round((time.perf_counter() - trace.started) * 1000, 3),
+            "queries": len(trace.statements) + trace.dropped,
+            "distinct_queries": len(groups),
+            "sql_ms": round(trace.sql_ms, 3),
+            "n_plus_one": repeated,
+            "slow": slow,
+            "statements": [
+                {"sql": sql, "ms": round(ms, 3), "caller": caller, "rows": rows}
+                for sql, ms, caller, _, rows in trace.statements
+            ],
+            "dropped": trace.dropped,
+        }
+
+    def _log(self, report: Dict[str, Any]):
+        if self.log_mode == "off":
+            return
+        issues = bool(report["n_plus_one"] or report["slow"])
+        if not issues and self.log_mode != "all":
+            return
+        lines = [
+            f"SQL {report['method']} {report['path']} -> {report['status']}: {report['queries']} consultas "
+            f"({report['distinct_queries']} distintas), {report['sql_ms']:.1f} ms en SQL de {report['duration_ms']:.1f} ms "
+            f"[perfil {report['id']}]"
+        ]
+        for group in report["n_plus_one"]:
+            callers = ", ".join(f"{caller} x{count}" for caller, count in group["callers"].items())
+            lines.append(
+                f"  N+1? x{group['count']} ({group['distinct_params']} parametros distintos, {group['total_ms']:.1f} ms) "
+                f"{group['sql'][:300]}  <- {callers}"
+            )
+        for item in report["slow"]:
+            lines.append(f"  lenta {item['ms']:.1f} ms: {item['sql'][:300]}  <- {item['caller']}")
+        if self.log_mode == "all":
+            lines += [f"  {item['ms']:8.3f} ms  {item['sql'][:200]}  <- {item['caller']}" for item in report["statements"]]
+        logger.log(logging.WARNING if issues else logging.INFO, "\n".join(lines))
+
+    def reports(self, issues_only: bool = False) -> List[Dict[str, Any]]:
+        """Resumen de los ultimos requests (mas reciente primero), sin la lista de sentencias."""
+
+        with self._lock:
+            reports = list(self._reports)
+        return [
+            {key: value for key, value in report.items() if key != "statements"}
+            for report in reversed(reports)
+            if not issues_only or report["n_plus_one"] or report["slow"]
+        ]
+
+    def report(self, report_id: int) -> Dict[str, Any] | None:
+        with self._lock:
+            return next((report for report in self._reports if report["id"] == report_id), None)
+
+
+sql_profiler = SqlProfiler()
+
+
+__all__ = ["SqlProfiler", "normalize_sql", "sql_profiler"]
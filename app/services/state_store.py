@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import copy
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Tuple
+
+from flask import current_app
+
+
+class StateStore:
+    """Small versioned key/value store for state shared by the services.
+
+    Every write bumps a per-key version so readers can detect changes
+    cheaply. Values must be JSON-serialisable and returned values must be
+    treated as read-only. `epoch` identifies the lifetime of the versions
+    (a new memory store restarts at version 0 with a different epoch).
+    """
+
+    epoch: str = ""
+    poll_interval = 0.2
+
+    def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    def version(self, key: str) -> int:
+        raise NotImplementedError
+
+    def update(self, key: str, fn: Callable[[Any], Any]) -> Tuple[Any, int]:
+        """Atomically replaces the value with `fn(current)`; returns (value, version)."""
+
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any) -> int:
+        return self.update(key, lambda _current: value)[1]
+
+    def wait(self, key: str, version: int, timeout: float) -> int:
+        """Blocks until the key's version differs from `version` or `timeout` elapses."""
+
+        deadline = time.monotonic() + timeout
+        current = self.version(key)
+        while current == version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(self.poll_interval, remaining))
+            current = self.version(key)
+        return current
+
+
+class MemoryStateStore(StateStore):
+    """Per-process dict; reads are plain dict lookups (no lock)."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[int, Any]] = {}
+        self._cond = threading.Condition()
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        return entry[1] if entry else None
+
+    def version(self, key: str) -> int:
+        entry = self._data.get(key)
+        return entry[0] if entry else 0
+
+    def update(self, key: str, fn: Callable[[Any], Any]) -> Tuple[Any, int]:
+        with self._cond:
+            version, current = self._data.get(key, (0, None))
+            value = fn(copy.deepcopy(current))
+            version += 1
+            self._data[key] = (version, value)
+            self._cond.notify_all()
+        return value, version
+
+    def wait(self, key: str, version: int, timeout: float) -> int:
+        with self._cond:
+            self._cond.wait_for(lambda: self.version(key) != version, timeout)
+            return self.version(key)
+
+
+class SQLiteStateStore(StateStore):
+    """State shared by every worker on the host through a SQLite file in WAL mode.
+
+    Each namespace lives in its own file, so writes to one (e.g. "latest" on
+    every ingest) neither wait on nor invalidate another ("control"). Every
+    write bumps a namespace version in the same transaction; reads are served
+    from an in-process cache tagged with that version, so the common case
+    costs one indexed SELECT and a dict lookup. A value read from the database
+    is only cached if the namespace version it was read at is still the
+    cache's version. Writes use `BEGIN IMMEDIATE` to serialise
+    read-modify-write across processes; `wait` polls the version every
+    `poll_interval` seconds.
+    """
+
+    def __init__(self, path: str, namespace: str):
+        self.path = path
+        self.namespace = namespace
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[int, Any]] = {}
+        self._cache_version = -1
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " version INTEGER NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS namespaces (namespace TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+        )
+        conn.execute("INSERT OR IGNORE INTO namespaces (namespace, version) VALUES (?, 0)", (namespace,))
+        conn.execute(
+            "INSERT OR IGNORE INTO state (namespace, key, value, version, updated_at)"
+            " VALUES ('__meta__', 'epoch', ?, 0, ?)",
+            (json.dumps(uuid.uuid4().hex[:8]), time.time()),
+        )
+        self.epoch = json.loads(
+            conn.execute("SELECT value FROM state WHERE namespace = '__meta__' AND key = 'epoch'").fetchone()[0]
+        )
+        conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _sync(self, ns_version: int):
+        """Descarta el cache si el namespace cambio (commit de otro hilo o worker)."""
+
+        if ns_version > self._cache_version:
+            self._cache.clear()
+            self._cache_version = ns_version
+
+    def _load(self, key: str) -> Tuple[int, Any]:
+        conn = self._conn()
+        ns_version = conn.execute(
+            "SELECT version FROM namespaces WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        with self._lock:
+            self._sync(ns_version)
+            entry = self._cache.get(key)
+        if entry is not None:
+            return entry
+        # Version del namespace y fila en una sola sentencia (mismo snapshot)
+        ns_version, version, value = conn.execute(
+            "SELECT n.version, s.version, s.value FROM namespaces n"
+            " LEFT JOIN state s ON s.namespace = n.namespace AND s.key = ?"
+            " WHERE n.namespace = ?",
+            (key, self.namespace),
+        ).fetchone()
+        entry = (version, json.loads(value)) if version is not None else (0, None)
+        with self._lock:
+            self._sync(ns_version)
+            if ns_version == self._cache_version:
+                self._cache[key] = entry
+        return entry
+
+    def get(self, key: str) -> Any:
+        return self._load(key)[1]
+
+    def version(self, key: str) -> int:
+        return self._load(key)[0]
+
+    def update(self, key: str, fn: Callable[[Any], Any]) -> Tuple[Any, int]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT version, value FROM state WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            version, current = (row[0], json.loads(row[1])) if row else (0, None)
+            value = fn(current)
+            version += 1
+            conn.execute(
+                "INSERT INTO state (namespace, key, value, version, updated_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (namespace, key) DO UPDATE SET"
+                " value = excluded.value, version = excluded.version, updated_at = excluded.updated_at",
+                (self.namespace, key, json.dumps(value), version, time.time()),
+            )
+            conn.execute("UPDATE namespaces SET version = version + 1 WHERE namespace = ?", (self.namespace,))
+            ns_version = conn.execute(
+                "SELECT version FROM namespaces WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            # Solo si no hubo otros commits entre medio; si no, el cache ya no vale
+            if ns_version == self._cache_version + 1:
+                self._cache_version = ns_version
+                self._cache[key] = (version, value)
+            else:
+                self._sync(ns_version)
+        return value, version
+
+
+_stores: Dict[Tuple[str, str, str], StateStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_state_store(namespace: str) -> StateStore:
+    """Store del namespace segun STATE_BACKEND (memory | sqlite); uno por proceso."""
+
+    backend = current_app.config.get("STATE_BACKEND", "memory")
+    path = current_app.config.get("STATE_SQLITE_PATH") or os.path.join(
+        tempfile.gettempdir(), "icc-state.sqlite3"
+    )
+    # Un archivo por namespace: "icc-state.sqlite3" -> "icc-state-control.sqlite3"
+    base, ext = os.path.splitext(path)
+    path = f"{base}-{namespace}{ext}"
+    key = (backend, path if backend == "sqlite" else "", namespace)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                if backend == "sqlite":
+                    store = SQLiteStateStore(path, namespace)
+                elif backend == "memory":
+                    store = MemoryStateStore()
+                else:
+                    raise ValueError(f"STATE_BACKEND desconocido: {backend}")
+                _stores[key] = store
+    return store
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Tuple
+
+from sqlalchemy import event
+
+from app.models import Device, Home, MeasureType
+from app.repositories.reading_repository import SAMPLE_MEASURES
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryCounters:
+    """In-memory counters behind /api/metrics/summary.
+
+    Ingest bumps the per-home reading count and the last value per measure;
+    a background reconciliation replaces everything with the database's
+    numbers every `interval` seconds, which also folds in the writes of
+    other workers and repairs drift from rolled-back transactions. The first
+    reconciliation runs at startup (`init_app`), so a fresh worker already
+    answers with the database's numbers; requests never reconcile inline.
+    Readings still queued in the write-behind buffer are added to the
+    database count, so counts never go backwards.
+    """
+
+    def __init__(self, interval: float = 300.0):
+        self.interval = interval
+        self.homes: Dict[int, str] = {}
+        self.devices = 0
+        self.readings: Dict[int, int] = {}
+        self.last: Dict[int, Dict[MeasureType, Tuple[float, datetime]]] = {}
+        self.reconciled_at: datetime | None = None
+        self._reconciled_mono = 0.0
+        self._reconciling = False
+        self._lock = threading.Lock()
+        self._app = None
+
+    def init_app(self, app):
+        self._app = app
+        self.interval = app.config.get("SUMMARY_RECONCILE_SECONDS", self.interval)
+        with self._lock:
+            self.homes, self.devices, self.readings, self.last = {}, 0, {}, {}
+            self.reconciled_at = None
+            self._reconciled_mono = 0.0
+        try:
+            with app.app_context():
+                self.reconcile()
+        except Exception as exc:
+            # Sin base al arrancar: el primer snapshot reintenta en segundo plano
+            logger.warning("summary reconciliation at startup failed: %s", exc)
+
+    @staticmethod
+    def _count(samples: Iterable[Dict[str, Any]]) -> Dict[int, int]:
+        """Lecturas que se guardan por hogar (las que la compresion conserva)."""
+
+        counts: Dict[int, int] = {}
+        for sample in samples:
+            persist = sample.get("persist")
+            stored = sum(
+                1
+                for key, _measure, _unit in SAMPLE_MEASURES
+                if sample.get(key) is not None and (persist is None or key in persist)
+            )
+            if stored:
+                counts[sample["home_id"]] = counts.get(sample["home_id"], 0) + stored
+        return counts
+
+    def record(self, samples: Iterable[Dict[str, Any]]):
+        """Cuenta las lecturas guardadas y actualiza el ultimo valor por medida."""
+
+        samples = list(samples)
+        counts = self._count(samples)
+        with self._lock:
+            for home_id, count in counts.items():
+                self.readings[home_id] = self.readings.get(home_id, 0) + count
+            for sample in samples:
+                last = self.last.setdefault(sample["home_id"], {})
+                for key, measure, _unit in SAMPLE_MEASURES:
+                    value = sample.get(key)
+                    if value is None:
+                        continue
+                    current = last.get(measure)
+                    if current is None or sample["timestamp"] >= current[1]:
+                        last[measure] = (float(value), sample["timestamp"])
+
+    def reconcile(self):
+        """Recalcula todos los contadores desde la base (requiere app context).
+
+        Corre al arrancar y luego en un hilo aparte: un COUNT agrupado por hogar y una sola consulta
+        a device_latest para los ultimos valores.
+        """
+
+        from app.repositories import DeviceLatestRepository, DeviceRepository, HomeRepository, ReadingRepository
+        from app.repositories.reading_repository import get_write_buffer
+
+        homes = {home.id: home.name for home in HomeRepository().list_homes()}
+        devices = DeviceRepository().count()
+        buffer = get_write_buffer()
+        if buffer is None:
+            readings = ReadingRepository().count_by_home()
+        else:
+            # Sin flushes durante el COUNT: base + cola es exacto
+            with buffer.paused() as pending:
+                readings = ReadingRepository().count_by_home()
+            for home_id, count in self._count(pending).items():
+                readings[home_id] = readings.get(home_id, 0) + count
+        stored_last = DeviceLatestRepository().by_home()
+        last = {home_id: stored_last.get(home_id, {}) for home_id in homes}
+        with self._lock:
+            # Las ultimas lecturas en memoria pueden ser mas nuevas que las de la base (write-behind)
+            for home_id, measures in self.last.items():
+                for measure, current in measures.items():
+                    stored = last.get(home_id, {}).get(measure)
+                    if home_id in last and (stored is None or current[1] > stored[1]):
+                        last[home_id][measure] = current
+            self.homes, self.devices, self.readings, self.last = homes, devices, readings, last
+            self.reconciled_at = datetime.utcnow()
+            self._reconciled_mono = time.monotonic()
+
+    def _reconcile_in_background(self):
+        app = self._app
+        with self._lock:
+            if self._reconciling:
+                return
+            self._reconciling = True
+
+        def run():
+            try:
+                with app.app_context():
+                    self.reconcile()
+            except Exception:
+                logger.exception("summary reconciliation failed")
+            finally:
+                self._reconciling = False
+
+        threading.Thread(target=run, name="summary-reconcile", daemon=True).start()
+
+    def snapshot(self, home_id: int | None = None) -> Dict[str, Any]:
+        # Nunca en linea: al vencer `interval` (o si fallo al arrancar) se lanza en segundo plano
+        if (
+            not self._reconciling
+            and self._app is not None
+            and (self.reconciled_at is None or time.monotonic() - self._reconciled_mono >= self.interval)
+        ):
+            self._reconcile_in_background()
+
+        with self._lock:
+            if home_id not in self.homes:
+                home_id = min(self.homes) if self.homes else None
+            last = self.last.get(home_id, {})
+            newest = max(last.items(), key=lambda item: item[1][1], default=None)
+            return {
+                "home": {"id": home_id, "name": self.homes[home_id]} if home_id is not None else None,
+                "counts": {
+                    "homes": len(self.homes),
+                    "devices": self.devices,
+                    "readings": self.readings.get(home_id, 0),
+                    "readings_total": sum(self.readings.values()),
+                },
+                "last": {
+                    "measure": newest[0].value,
+                    "value": newest[1][0],
+                    "timestamp": newest[1][1].isoformat(),
+                }
+                if newest
+                else None,
+                "last_by_measure": {
+                    measure.value: {"value": value, "timestamp": ts.isoformat()}
+                    for measure, (value, ts) in last.items()
+                },
+                "reconciled_at": self.reconciled_at.isoformat() if self.reconciled_at else None,
+                "timestamp": datetime.utcnow().isoformat(),
+            }
+
+    def _adjust(self, homes: Dict[int, str] | None = None, devices: int = 0, drop_home: int | None = None):
+        with self._lock:
+            if homes:
+                self.homes.update(homes)
+            if drop_home is not None:
+                self.homes.pop(drop_home, None)
+                self.readings.pop(drop_home, None)
+                self.last.pop(drop_home, None)
+            self.devices = max(0, self.devices + devices)
+
+
+summary_counters = SummaryCounters()
+
+
+@event.listens_for(Home, "after_insert")
+def _home_created(mapper, connection, target):
+    summary_counters._adjust(homes={target.id: target.name})
+
+
+@event.listens_for(Home, "after_delete")
+def _home_deleted(mapper, connection, target):
+    summary_counters._adjust(drop_home=target.id)
+
+
+@event.listens_for(Device, "after_insert")
+def _device_created(mapper, connection, target):
+    summary_counters._adjust(devices=1)
+
+
+@event.listens_for(Device, "after_delete")
+def _device_deleted(mapper, connection, target):
+    summary_counters._adjust(devices=-1)
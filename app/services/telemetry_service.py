@@ -1,16 +1,36 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Any, Dict
+import math
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
 
 from app import db
 from app.models import DeviceState, DeviceType, MeasureType
 from app.repositories import (
     ControllerRepository,
+    DeviceLatestRepository,
     DeviceRepository,
     HomeRepository,
     ReadingRepository,
 )
+from app.repositories.reading_repository import SAMPLE_MEASURES
+from .compression import SampleCompressor, sample_compressor
+from .device_registry import DeviceIdentity
+from .device_service import DeviceService
+from .event_log import EventLog, event_log
+from .rule_engine import RuleEngine, rule_engine
+from .state_store import StateStore, get_state_store
+from .summary_counters import SummaryCounters, summary_counters
+from .telemetry_stream import TelemetryBroadcaster, format_event, telemetry_broadcaster
+
+
+class SampleError(ValueError):
+    """Payload de telemetria invalido; `index` es su posicion en el lote (None si es unico)."""
+
+    def __init__(self, message: str, index: int | None = None):
+        super().__init__(message)
+        self.index = index
 
 
 class TelemetryService:
@@ -20,112 +40,279 @@ class TelemetryService:
         home_repo: HomeRepository | None = None,
         controller_repo: ControllerRepository | None = None,
         reading_repo: ReadingRepository | None = None,
+        latest_repo: DeviceLatestRepository | None = None,
+        device_service: DeviceService | None = None,
+        latest_store: StateStore | None = None,
+        broadcaster: TelemetryBroadcaster | None = None,
+        compressor: SampleCompressor | None = None,
+        summary: SummaryCounters | None = None,
+        rules: RuleEngine | None = None,
+        events: EventLog | None = None,
     ):
         self.device_repo = device_repo or DeviceRepository()
         self.home_repo = home_repo or HomeRepository()
         self.controller_repo = controller_repo or ControllerRepository()
         self.reading_repo = reading_repo or ReadingRepository()
-        self._latest_cache: Dict[str, Dict[str, Any]] = {}
-
-    def _ensure_device_graph(self, device_name: str):
-        device = self.device_repo.get_by_name(device_name)
-        if device:
-            return device
-        home = self.home_repo.get_first() or self.home_repo.create_home(
-            name="Demo Home", timezone="UTC"
+        self.latest_repo = latest_repo or DeviceLatestRepository()
+        self.device_service = device_service or DeviceService(
+            self.device_repo, self.home_repo, self.controller_repo
         )
-        controller = self.controller_repo.get_by_hardware_id("esp32-gw")
-        if not controller:
-            controller = self.controller_repo.create_controller(
-                home_id=home.id,
-                name="ESP32 Gateway",
-                hardware_id="esp32-gw",
-                description="Auto-registrado",
-            )
-        return self.device_repo.create_device(
-            home_id=home.id,
-            controller_id=controller.id,
-            name=device_name,
+        self._latest_store = latest_store
+        self.broadcaster = broadcaster or telemetry_broadcaster
+        self.compressor = compressor or sample_compressor
+        self.summary = summary or summary_counters
+        self.rules = rules or rule_engine
+        self.events = events or event_log
+
+    def _ensure_device_graph(self, device_name: str) -> DeviceIdentity:
+        return self.device_service.ensure_identity(
+            device_name,
             description="Dispositivo IoT",
             model=device_name,
             type_=DeviceType.HYBRID,
+            state=None,
         )
 
-    def ingest(self, payload: Dict[str, Any]):
-        device_name = payload.get("device", "esp32-1")
-        device = self._ensure_device_graph(device_name)
+    @staticmethod
+    def _sample_timestamp(payload: Dict[str, Any], default: datetime) -> datetime:
+        """Timestamp de la muestra: `ts` (epoch s) o `timestamp` (ISO, UTC); si no, `default`."""
+
+        ts = payload.get("ts")
+        if isinstance(ts, (int, float)) and not isinstance(ts, bool):
+            try:
+                return datetime.utcfromtimestamp(ts)
+            except (OverflowError, OSError, ValueError):
+                return default
+        raw = payload.get("timestamp")
+        if isinstance(raw, str):
+            try:
+                parsed = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+            except ValueError:
+                return default
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+            return parsed
+        return default
+
+    @staticmethod
+    def _validate(payload: Dict[str, Any], index: int | None = None):
+        """Rechaza el payload antes de escribir nada si algun campo no se puede guardar."""
+
+        device = payload.get("device")
+        if device is not None and not isinstance(device, str):
+            raise SampleError("device debe ser un texto", index)
+        for key in ("temp", "hum"):
+            value = payload.get(key)
+            if value is None:
+                continue
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise SampleError(f"{key} no es numerico: {value!r}", index) from None
+            if isinstance(value, bool) or not math.isfinite(number):
+                raise SampleError(f"{key} no es numerico: {value!r}", index)
+
+    @staticmethod
+    def _build_sample(device: DeviceIdentity, payload: Dict[str, Any], timestamp: datetime):
+        """Normaliza un payload del firmware en (muestra para el repositorio, metrics)."""
 
         metrics: Dict[str, Any] = {}
-        now = datetime.utcnow()
+        sample: Dict[str, Any] = {
+            "device_id": device.device_id,
+            "home_id": device.home_id,
+            "timestamp": timestamp,
+        }
 
         temp = payload.get("temp")
         hum = payload.get("hum")
         motion = payload.get("motion")
 
         if temp is not None:
-            self.reading_repo.add_reading(
-                device_id=device.id,
-                home_id=device.home_id,
-                measure=MeasureType.TEMPERATURE,
-                value=float(temp),
-                unit="C",
-            )
-            metrics["temp"] = float(temp)
-
+            sample["temp"] = metrics["temp"] = float(temp)
         if hum is not None:
-            self.reading_repo.add_reading(
-                device_id=device.id,
-                home_id=device.home_id,
-                measure=MeasureType.HUMIDITY,
-                value=float(hum),
-                unit="%",
-            )
-            metrics["hum"] = float(hum)
-
+            sample["hum"] = metrics["hum"] = float(hum)
         if motion is not None:
-            self.reading_repo.add_reading(
-                device_id=device.id,
-                home_id=device.home_id,
-                measure=MeasureType.MOTION,
-                value=1.0 if motion else 0.0,
-                unit="bool",
-            )
+            sample["motion"] = 1.0 if motion else 0.0
             metrics["motion"] = bool(motion)
+        # Estado de la puerta: solo se guarda con TELEMETRY_STORAGE=samples
+        if payload.get("door_open") is not None:
+            sample["door_open"] = bool(payload["door_open"])
+        if isinstance(payload.get("door_angle"), (int, float)):
+            sample["door_angle"] = payload["door_angle"]
+        return sample, metrics
 
-        # Device state updates
+    @staticmethod
+    def _next_state(state: DeviceState | None, payload: Dict[str, Any]) -> DeviceState | None:
         door_open = payload.get("door_open")
-        door_angle = payload.get("door_angle")
         led1 = payload.get("led1")
         led2 = payload.get("led2")
 
         if door_open is not None:
-            device.state = DeviceState.OPEN if door_open else DeviceState.CLOSED
+            state = DeviceState.OPEN if door_open else DeviceState.CLOSED
         if led1 is True or led2 is True:
-            device.state = DeviceState.ON
+            state = DeviceState.ON
         if led1 is False and led2 is False and door_open is False:
-            device.state = DeviceState.OFF
+            state = DeviceState.OFF
+        return state
 
-        db.session.commit()
+    @property
+    def latest_store(self) -> StateStore:
+        """Ultimo valor por dispositivo, compartido entre workers segun STATE_BACKEND."""
 
-        self._latest_cache[device_name] = {
+        if self._latest_store is None:
+            self._latest_store = get_state_store("latest")
+        return self._latest_store
+
+    def _cache_latest(self, device_name: str, timestamp: datetime, metrics: Dict[str, Any], payload: Dict[str, Any]):
+        motion = payload.get("motion")
+        entry = {
             "device": device_name,
-            "timestamp": now.isoformat(),
+            "timestamp": timestamp.isoformat(),
             "metrics": metrics,
             "motion": bool(motion) if motion is not None else None,
-            "door_open": door_open,
-            "door_angle": door_angle,
-            "led1": led1,
-            "led2": led2,
+            "door_open": payload.get("door_open"),
+            "door_angle": payload.get("door_angle"),
+            "led1": payload.get("led1"),
+            "led2": payload.get("led2"),
         }
+        version = self.latest_store.set(device_name, entry)
+        self.broadcaster.publish(device_name, entry, version)
+
+    def ingest(self, payload: Dict[str, Any]):
+        self._validate(payload)
+        device_name = payload.get("device") or "esp32-1"
+        device = self._ensure_device_graph(device_name)
+
+        now = datetime.utcnow()
+        sample, metrics = self._build_sample(device, payload, now)
+        # Reglas antes de la compresion: se evaluan con cada muestra recibida
+        rule_events = self.rules.evaluate([sample])
+        stored = self.compressor.compress([sample])
+        self.reading_repo.add_samples(stored)
+        self.summary.record(stored)
+        # Eventos (transiciones y reglas) por el buffer del event log, fuera del request
+        self.events.observe(device.device_id, device.home_id, payload, now)
+        events_pending = not self.events.append(rule_events)
+
+        # Device state updates (UPDATE ... WHERE state <> :state, comparado en la base)
+        state = self._next_state(None, payload)
+        state_changed = self.device_service.set_state(device_name, device, state)
+
+        # En modo write-behind solo hay que commitear si cambio el estado
+        if not self.reading_repo.write_behind or state_changed or events_pending:
+            db.session.commit()
+
+        self._cache_latest(device_name, now, metrics, payload)
 
         return {"status": "ingested", "device": device_name, "metrics": metrics}
 
+    def ingest_batch(self, payloads: List[Dict[str, Any]], default_device: str = "esp32-1"):
+        """Ingesta en lote: resuelve cada dispositivo una vez y escribe todo en una transaccion.
+
+        Pensado para gateways que acumulan muestras offline y las reenvian al reconectar;
+        cada payload puede traer su propio `device` y su `ts`/`timestamp` original.
+        Todas las muestras se validan antes de escribir (SampleError con el indice
+        de la primera invalida) y el estado se aplica en orden de timestamp.
+        """
+
+        now = datetime.utcnow()
+        for index, payload in enumerate(payloads):
+            self._validate(payload, index)
+        # Orden por timestamp (estable): el estado final es el de la muestra mas nueva
+        timed = sorted(
+            ((self._sample_timestamp(payload, now), payload) for payload in payloads),
+            key=lambda item: item[0],
+        )
+
+        devices: Dict[str, DeviceIdentity] = {}
+        states: Dict[str, DeviceState | None] = {}
+        samples: List[Dict[str, Any]] = []
+        observed: List[tuple] = []
+        newest: Dict[str, tuple] = {}
+
+        for timestamp, payload in timed:
+            device_name = payload.get("device") or default_device
+            device = devices.get(device_name)
+            if device is None:
+                device = devices[device_name] = self._ensure_device_graph(device_name)
+                states[device_name] = None
+
+            sample, metrics = self._build_sample(device, payload, timestamp)
+            samples.append(sample)
+            observed.append((timestamp, device.device_id, device.home_id, payload))
+            states[device_name] = self._next_state(states[device_name], payload)
+            newest[device_name] = (timestamp, metrics, payload)
+
+        rule_events = self.rules.evaluate(samples)
+        stored = self.compressor.compress(samples)
+        written = self.reading_repo.add_samples(stored)
+        self.summary.record(stored)
+        self.events.observe_many(observed)
+        events_pending = not self.events.append(rule_events)
+        state_changed = False
+        for device_name, device in devices.items():
+            if self.device_service.set_state(device_name, device, states[device_name]):
+                state_changed = True
+        if not self.reading_repo.write_behind or state_changed or events_pending:
+            db.session.commit()
+
+        for device_name, (timestamp, metrics, payload) in newest.items():
+            cached = self.latest_store.get(device_name)
+            if cached and cached["timestamp"] > timestamp.isoformat():
+                continue
+            self._cache_latest(device_name, timestamp, metrics, payload)
+
+        return {
+            "status": "ingested",
+            "samples": len(samples),
+            "readings": written,
+            "devices": sorted(devices),
+        }
+
+    def stream(self, device_name: str, heartbeat: float = 15.0, max_seconds: float = 300.0):
+        """Generador SSE: snapshot inicial y luego cada muestra ingerida del dispositivo.
+
+        Las muestras de este proceso llegan por el broadcaster; las ingeridas por
+        otros workers se detectan por la version del latest_store (STATE_BACKEND=sqlite).
+        Se cierra tras `max_seconds` y EventSource reconecta solo.
+        """
+
+        sub = self.broadcaster.subscribe(device_name)
+        try:
+            yield "retry: 3000\n\n"
+            version = self.latest_store.version(device_name)
+            latest = self.latest_store.get(device_name)
+            if latest:
+                yield format_event(latest, version)
+            sub.last_version = max(sub.last_version, version)
+
+            deadline = time.monotonic() + max_seconds
+            idle = 0.0
+            while time.monotonic() < deadline:
+                message = sub.get(timeout=1.0)
+                if message is None:
+                    version = self.latest_store.version(device_name)
+                    if version > sub.last_version:
+                        sub.last_version = version
+                        latest = self.latest_store.get(device_name)
+                        message = format_event(latest, version) if latest else None
+                if message is not None:
+                    idle = 0.0
+                    yield message
+                    continue
+                idle += 1.0
+                if idle >= heartbeat:
+                    idle = 0.0
+                    yield ": ping\n\n"
+        finally:
+            self.broadcaster.unsubscribe(sub)
+
     def get_latest(self, device_name: str):
-        cached = self._latest_cache.get(device_name)
+        cached = self.latest_store.get(device_name)
         if cached:
             return cached
 
-        device = self.device_repo.get_by_name(device_name)
+        device = self.device_service.get_identity(device_name)
         if not device:
             return {
                 "device": device_name,
@@ -134,23 +321,46 @@ class TelemetryService:
                 "message": "sin datos",
             }
 
-        readings = self.reading_repo.latest_by_home(device.home_id, limit=10)
-        metrics: Dict[str, Any] = {}
-        timestamp = None
-        for r in readings:
-            # Normalizamos a las mismas claves usadas en ingest: temp, hum, motion
-            if r.measure is MeasureType.TEMPERATURE and "temp" not in metrics:
-                metrics["temp"] = r.value
-                timestamp = timestamp or r.timestamp.isoformat()
-            elif r.measure is MeasureType.HUMIDITY and "hum" not in metrics:
-                metrics["hum"] = r.value
-                timestamp = timestamp or r.timestamp.isoformat()
-            elif r.measure is MeasureType.MOTION and "motion" not in metrics:
-                metrics["motion"] = bool(r.value)
-                timestamp = timestamp or r.timestamp.isoformat()
+        latest = self.latest_metrics([device.device_id]).get(device.device_id, {})
+        metrics = latest.get("metrics", {})
+        timestamp = latest.get("timestamp")
 
         return {
             "device": device_name,
             "metrics": metrics,
             "timestamp": timestamp,
         }
+
+    def latest_metrics(self, device_ids: List[int] | None = None) -> Dict[int, Dict[str, Any]]:
+        """Ultimos valores por dispositivo desde device_latest (una consulta por PK).
+
+        Devuelve {device_id: {"metrics": {temp, hum, motion}, "timestamp": iso}}
+        con las mismas claves que la ingesta; el timestamp es el de la medida mas nueva.
+        """
+
+        keys = {measure: key for key, measure, _ in SAMPLE_MEASURES}
+        result: Dict[int, Dict[str, Any]] = {}
+        for device_id, measures in self.latest_repo.for_devices(device_ids).items():
+            metrics: Dict[str, Any] = {}
+            newest = None
+            for measure, (value, ts) in measures.items():
+                key = keys.get(measure)
+                if key is None:
+                    continue
+                metrics[key] = bool(value) if measure is MeasureType.MOTION else value
+                newest = ts if newest is None or ts > newest else newest
+            result[device_id] = {"metrics": metrics, "timestamp": newest.isoformat() if newest else None}
+        return result
+
+    def home_latest(self, home_id: int) -> Dict[str, Dict[str, Any]]:
+        """{temp|hum|motion: {"value", "timestamp"}} del hogar, para el render inicial del panel."""
+
+        keys = {measure: key for key, measure, _ in SAMPLE_MEASURES}
+        return {
+            keys[measure]: {
+                "value": bool(value) if measure is MeasureType.MOTION else value,
+                "timestamp": ts.isoformat(),
+            }
+            for measure, (value, ts) in self.latest_repo.for_home(home_id).items()
+            if measure in keys
+        }
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import json
+import queue
+import threading
+from typing import Any, Dict, Set
+
+
+def format_event(entry: Dict[str, Any], version: int, event: str = "telemetry") -> str:
+    """Mensaje SSE listo para escribir en el stream."""
+
+    return f"event: {event}\nid: {version}\ndata: {json.dumps(entry, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    def __init__(self, device: str, maxsize: int = 32):
+        self.device = device
+        self.queue: "queue.Queue[str]" = queue.Queue(maxsize=maxsize)
+        self.last_version = 0
+
+    def push(self, message: str, version: int):
+        """Enqueue without blocking; a slow client loses its oldest sample."""
+
+        self.last_version = max(self.last_version, version)
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class TelemetryBroadcaster:
+    """Fan-out of ingested samples to the SSE subscribers of each device.
+
+    Each sample is serialised once and the same SSE message is pushed to
+    every subscriber of the device; ingest never blocks on a slow dashboard.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, device: str) -> Subscription:
+        sub = Subscription(device)
+        with self._lock:
+            self._subscribers.setdefault(device, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.device)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.device]
+
+    def publish(self, device: str, entry: Dict[str, Any], version: int):
+        subs = self._subscribers.get(device)
+        if not subs:
+            return
+        with self._lock:
+            targets = list(subs)
+        message = format_event(entry, version)
+        for sub in targets:
+            sub.push(message, version)
+
+    def subscriber_count(self) -> int:
+        return sum(len(subs) for subs in self._subscribers.values())
+
+
+telemetry_broadcaster = TelemetryBroadcaster()
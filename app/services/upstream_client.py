@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .instrumentation import instrumentation
+
+
+class UpstreamClient:
+    """HTTP client for the remote backend with keep-alive connection pooling.
+
+    A single HTTPAdapter (urllib3 pool, thread-safe) is shared by per-thread
+    Sessions, so every request thread and fan-out worker reuses the same
+    TCP connections without sharing Session state (cookies, headers).
+
+    Fan-out (`map`) and background refreshes (`submit`) use separate thread
+    pools: fan-out tasks may block waiting on a refresh, so sharing one pool
+    could leave no thread to run the refresh they wait for.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_size: int = 20,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 5.0,
+        fanout_workers: int = 8,
+        refresh_workers: int = 4,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._local = threading.local()
+        self._fanout = ThreadPoolExecutor(max_workers=fanout_workers, thread_name_prefix="upstream-fanout")
+        self._refresh = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="upstream-refresh")
+
+    @classmethod
+    def from_config(cls, base_url: str, config) -> "UpstreamClient":
+        return cls(
+            base_url,
+            pool_size=config.get("UPSTREAM_POOL_SIZE", 20),
+            connect_timeout=config.get("UPSTREAM_CONNECT_TIMEOUT", 2.0),
+            read_timeout=config.get("UPSTREAM_READ_TIMEOUT", 5.0),
+            fanout_workers=config.get("UPSTREAM_FANOUT_WORKERS", 8),
+            refresh_workers=config.get("UPSTREAM_REFRESH_WORKERS", 4),
+        )
+
+    @property
+    def session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+        return session
+
+    def _timeout(self, extra: float = 0.0):
+        return (self.connect_timeout, self.read_timeout + extra)
+
+    def _request(self, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            resp = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            status = str(resp.status_code)
+            return resp
+        finally:
+            instrumentation.observe_upstream(method, path, status, time.perf_counter() - started)
+
+    def get(self, path: str, params: Dict[str, Any] | None = None, headers: Dict[str, str] | None = None, extra_timeout: float = 0.0):
+        return self._request("GET", path, params=params, headers=headers, timeout=self._timeout(extra_timeout))
+
+    def post(self, path: str, json: Any = None, headers: Dict[str, str] | None = None):
+        return self._request("POST", path, json=json, headers=headers, timeout=self._timeout())
+
+    def submit(self, fn: Callable[[], Any]):
+        """Runs `fn` in the background refresh pool (never the fan-out pool)."""
+
+        return self._refresh.submit(fn)
+
+    def map(self, fn: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """Runs `fn` over `items` concurrently (results in input order)."""
+
+        return list(self._fanout.map(fn, items))
@@ -0,0 +1,124 @@
+"""SQLite profile for edge gateways (DATABASE_URI=sqlite:///...).
+
+- WAL journal with tuned pragmas (synchronous, mmap_size, cache_size,
+  busy_timeout), applied to every new connection.
+- Single writer per process: the driver runs in autocommit mode and a
+  connection only opens a transaction (`BEGIN IMMEDIATE`) on its first
+  write, after taking a process-wide lock. Reads never hold a snapshot that
+  would later need upgrading, which is what makes SQLite answer "database
+  is locked" without waiting for busy_timeout. Writers from other processes
+  queue on busy_timeout instead of failing.
+- The schema is created with `create_all`, without the MySQL scripts in db/.
+"""
+
+from __future__ import annotations
+
+import threading
+
+from flask import Flask
+from sqlalchemy import event
+
+# Sentencias que necesitan el lock de escritura
+WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER")
+
+
+def is_sqlite(app: Flask) -> bool:
+    return app.config.get("SQLALCHEMY_DATABASE_URI", "").startswith("sqlite")
+
+
+class SingleWriter:
+    """Process-wide write lock tied to the connection that holds it."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.waits = 0
+
+    def before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(WRITE_PREFIXES):
+            return
+        info = conn.info
+        acquired = False
+        if not info.get("sqlite_writer"):
+            if not self._lock.acquire(blocking=False):
+                self.waits += 1
+                if not self._lock.acquire(timeout=self.timeout):
+                    raise TimeoutError(f"SQLite: lock de escritura no disponible tras {self.timeout:.0f} s")
+            info["sqlite_writer"] = acquired = True
+        if cursor.connection.in_transaction:
+            return
+        # Primera escritura (o primera tras un commit en la misma conexion)
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+        except Exception:
+            if acquired:
+                self.release(info)
+            raise
+
+    def release(self, info):
+        if info.pop("sqlite_writer", False):
+            self._lock.release()
+
+    def on_reset(self, dbapi_connection, connection_record, reset_state):
+        # La conexion vuelve al pool: si quedo una transaccion abierta se descarta
+        if connection_record.info.get("sqlite_writer") and dbapi_connection.in_transaction:
+            dbapi_connection.rollback()
+        self.release(connection_record.info)
+
+
+def sqlite_engine_options(app: Flask) -> None:
+    """Opciones del engine para SQLite; se llama antes de db.init_app."""
+
+    if not is_sqlite(app):
+        return
+    options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    connect_args = options.setdefault("connect_args", {})
+    connect_args.setdefault("timeout", app.config.get("SQLITE_BUSY_TIMEOUT_MS", 5000) / 1000.0)
+    # Las conexiones del pool se usan desde distintos hilos (requests, write-behind)
+    connect_args.setdefault("check_same_thread", False)
+
+
+def init_sqlite(app: Flask, db) -> SingleWriter | None:
+    """Registra pragmas y el escritor unico en el engine y crea el esquema."""
+
+    if not is_sqlite(app):
+        return None
+
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA synchronous={app.config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA busy_timeout={int(app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA mmap_size={int(app.config.get('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))}",
+        # Negativo = KiB en lugar de paginas
+        f"PRAGMA cache_size=-{int(app.config.get('SQLITE_CACHE_SIZE_KB', 4096))}",
+        f"PRAGMA journal_size_limit={int(app.config.get('SQLITE_JOURNAL_SIZE_LIMIT', 64 * 1024 * 1024))}",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA foreign_keys=ON",
+    ]
+    writer = SingleWriter(app.config.get("SQLITE_BUSY_TIMEOUT_MS", 5000) / 1000.0)
+
+    with app.app_context():
+        engine = db.engine
+
+        @event.listens_for(engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            # Autocommit en el driver: las transacciones las abre SingleWriter
+            dbapi_connection.isolation_level = None
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+        event.listen(engine, "before_cursor_execute", writer.before_execute)
+        event.listen(engine.pool, "reset", writer.on_reset)
+        event.listen(engine.pool, "invalidate", lambda dbapi_conn, record, exc: writer.release(record.info))
+        event.listen(engine.pool, "close", lambda dbapi_conn, record: writer.release(record.info))
+
+        if app.config.get("SQLITE_CREATE_SCHEMA", True):
+            from app import models  # noqa: F401 - registra las tablas
+
+            db.create_all()
+    return writer
+
+
+__all__ = ["SingleWriter", "init_sqlite", "is_sqlite", "sqlite_engine_options"]
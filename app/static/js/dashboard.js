@@ -53,6 +53,50 @@ async function loadTelemetry() {
   }
 }
 
+// ==== STREAM: /api/stream (SSE) ====
+// Con window.APP_STREAM el servidor empuja cada muestra ingerida; si el stream
+// falla antes de recibir datos se vuelve al polling de loadTelemetry.
+function renderSample(sample) {
+  const metrics = sample.metrics || {};
+  const ts = sample.timestamp || "-";
+  if (metrics.temp !== undefined && metrics.temp !== null) {
+    setText("temp-value", `${Number(metrics.temp).toFixed(1)} C`);
+    setText("temp-updated", ts);
+  }
+  if (metrics.hum !== undefined && metrics.hum !== null) {
+    setText("hum-value", `${Number(metrics.hum).toFixed(1)} %`);
+    setText("hum-updated", ts);
+  }
+  if (metrics.motion !== undefined && metrics.motion !== null) {
+    setText("motion-value", metrics.motion ? "Activo" : "Inactivo");
+    setText("motion-updated", ts);
+  }
+}
+
+function startPolling() {
+  loadTelemetry();
+  setInterval(loadTelemetry, 4000);
+}
+
+function startStream() {
+  let received = false;
+  const source = new EventSource(withBase(`/api/stream?device=${encodeURIComponent(deviceId)}`));
+  source.addEventListener("telemetry", (ev) => {
+    received = true;
+    try {
+      renderSample(JSON.parse(ev.data));
+    } catch (err) {
+      console.error("stream", err);
+    }
+  });
+  source.onerror = () => {
+    // EventSource reconecta solo, salvo que el servidor rechace (404/503)
+    if (received && source.readyState !== EventSource.CLOSED) return;
+    source.close();
+    startPolling();
+  };
+}
+
 // ==== CONTROL: /api/control (proxy a EC2 /api/control) ====
 async function applyControl() {
   if (!document.getElementById("apply-control")) return;
@@ -93,6 +137,9 @@ window.addEventListener("DOMContentLoaded", () => {
   if (!dashboardRoot) return; // evitar ejecucion en paginas sin dashboard
 
   wireUI();
-  loadTelemetry();
-  setInterval(loadTelemetry, 4000);
+  if (window.APP_STREAM && window.EventSource) {
+    startStream();
+  } else {
+    startPolling();
+  }
 });
@@ -16,6 +16,7 @@ CREATE TABLE IF NOT EXISTS `homes` (
 	`description` VARCHAR(255),
 	`address` VARCHAR(127),
 	`timezone` VARCHAR(63) NOT NULL,
+	`retention_days` INTEGER,
 	`created_at` DATETIME NOT NULL,
 	`updated_at` DATETIME NOT NULL,
 	PRIMARY KEY(`id`)
@@ -93,6 +94,87 @@ CREATE INDEX `idx_readings_device_id_timestamp`
 ON `readings` (`device_id`, `timestamp`);
 CREATE INDEX `idx_readings_home_id_timestamp`
 ON `readings` (`home_id`, `timestamp`);
+CREATE TABLE IF NOT EXISTS `telemetry_samples` (
+	`id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+	`device_id` BIGINT UNSIGNED NOT NULL,
+	`home_id` BIGINT UNSIGNED NOT NULL,
+	`timestamp` DATETIME NOT NULL,
+	`temp` FLOAT,
+	`hum` FLOAT,
+	`motion` TINYINT(1),
+	`door_open` TINYINT(1),
+	`door_angle` SMALLINT,
+	PRIMARY KEY(`id`)
+);
+
+
+CREATE INDEX `idx_telemetry_samples_device_id_timestamp`
+ON `telemetry_samples` (`device_id`, `timestamp`);
+CREATE INDEX `idx_telemetry_samples_home_id_timestamp`
+ON `telemetry_samples` (`home_id`, `timestamp`);
+CREATE TABLE IF NOT EXISTS `device_latest` (
+	`device_id` BIGINT UNSIGNED NOT NULL,
+	`measure` ENUM('TEMPERATURE', 'HUMIDITY', 'MOTION') NOT NULL,
+	`home_id` BIGINT UNSIGNED NOT NULL,
+	`value` DOUBLE NOT NULL,
+	`timestamp` DATETIME NOT NULL,
+	PRIMARY KEY(`device_id`, `measure`)
+);
+
+
+CREATE INDEX `idx_device_latest_home_id`
+ON `device_latest` (`home_id`);
+CREATE TABLE IF NOT EXISTS `reading_rollups_1m` (
+	`device_id` BIGINT UNSIGNED NOT NULL,
+	`home_id` BIGINT UNSIGNED NOT NULL,
+	`measure` ENUM('TEMPERATURE', 'HUMIDITY', 'MOTION') NOT NULL,
+	`bucket_start` DATETIME NOT NULL,
+	`min_value` DOUBLE NOT NULL,
+	`max_value` DOUBLE NOT NULL,
+	`sum_value` DOUBLE NOT NULL,
+	`count` INTEGER NOT NULL,
+	`last_value` DOUBLE NOT NULL,
+	`last_timestamp` DATETIME NOT NULL,
+	PRIMARY KEY(`device_id`, `measure`, `bucket_start`)
+);
+
+
+CREATE INDEX `idx_reading_rollups_1m_home_id_bucket_start`
+ON `reading_rollups_1m` (`home_id`, `bucket_start`);
+CREATE TABLE IF NOT EXISTS `reading_rollups_1h` (
+	`device_id` BIGINT UNSIGNED NOT NULL,
+	`home_id` BIGINT UNSIGNED NOT NULL,
+	`measure` ENUM('TEMPERATURE', 'HUMIDITY', 'MOTION') NOT NULL,
+	`bucket_start` DATETIME NOT NULL,
+	`min_value` DOUBLE NOT NULL,
+	`max_value` DOUBLE NOT NULL,
+	`sum_value` DOUBLE NOT NULL,
+	`count` INTEGER NOT NULL,
+	`last_value` DOUBLE NOT NULL,
+	`last_timestamp` DATETIME NOT NULL,
+	PRIMARY KEY(`device_id`, `measure`, `bucket_start`)
+);
+
+
+CREATE INDEX `idx_reading_rollups_1h_home_id_bucket_start`
+ON `reading_rollups_1h` (`home_id`, `bucket_start`);
+CREATE TABLE IF NOT EXISTS `reading_rollups_1d` (
+	`device_id` BIGINT UNSIGNED NOT NULL,
+	`home_id` BIGINT UNSIGNED NOT NULL,
+	`measure` ENUM('TEMPERATURE', 'HUMIDITY', 'MOTION') NOT NULL,
+	`bucket_start` DATETIME NOT NULL,
+	`min_value` DOUBLE NOT NULL,
+	`max_value` DOUBLE NOT NULL,
+	`sum_value` DOUBLE NOT NULL,
+	`count` INTEGER NOT NULL,
+	`last_value` DOUBLE NOT NULL,
+	`last_timestamp` DATETIME NOT NULL,
+	PRIMARY KEY(`device_id`, `measure`, `bucket_start`)
+);
+
+
+CREATE INDEX `idx_reading_rollups_1d_home_id_bucket_start`
+ON `reading_rollups_1d` (`home_id`, `bucket_start`);
 CREATE TABLE IF NOT EXISTS `events` (
 	`id` BIGINT UNSIGNED NOT NULL AUTO_INCREMENT UNIQUE,
 	`device_id` BIGINT UNSIGNED NOT NULL,
@@ -171,6 +253,56 @@ ADD CONSTRAINT `fk_readings_home_id`
 FOREIGN KEY(`home_id`) REFERENCES `homes`(`id`)
 ON UPDATE CASCADE ON DELETE CASCADE;
 
+ALTER TABLE `telemetry_samples`
+ADD CONSTRAINT `fk_telemetry_samples_device_id`
+FOREIGN KEY(`device_id`) REFERENCES `devices`(`id`)
+ON UPDATE CASCADE ON DELETE CASCADE;
+
+ALTER TABLE `telemetry_samples`
+ADD CONSTRAINT `fk_telemetry_samples_home_id`
+FOREIGN KEY(`home_id`) REFERENCES `homes`(`id`)
+ON UPDATE CASCADE ON DELETE CASCADE;
+
+ALTER TABLE `device_latest`
+ADD CONSTRAINT `fk_device_latest_device_id`
+FOREIGN KEY(`device_id`) REFERENCES `devices`(`id`)
+ON UPDATE CASCADE ON DELETE CASCADE;
+
+ALTER TABLE `device_latest`
+ADD CONSTRAINT `fk_device_latest_home_id`
+FOREIGN KEY(`home_id`) REFERENCES `homes`(`id`)
+ON UPDATE CASCADE ON DELETE CASCADE;
+
+ALTER TABLE `reading_rollups_1m`
+ADD CONSTRAINT `fk_reading_rollups_1m_device_id`
+FOREIGN KEY(`device_id`) REFERENCES `devices`(`id`)
+ON UPDATE CASCADE ON DELETE CASCADE;
+
+ALTER TABLE `reading_rollups_1m`
+ADD CONSTRAINT `fk_reading_rollups_1m_home_id`
+FOREIGN KEY(`home_id`) REFERENCES `homes`(`id`)
+ON UPDATE CASCADE ON DELETE CASCADE;
+
+ALTER TABLE `reading_rollups_1h`
+ADD CONSTRAINT `fk_reading_rollups_1h_device_id`
+FOREIGN KEY(`device_id`) REFERENCES `devices`(`id`)
+ON UPDATE CASCADE ON DELETE CASCADE;
+
+ALTER TABLE `reading_rollups_1h`
+ADD CONSTRAINT `fk_reading_rollups_1h_home_id`
+FOREIGN KEY(`home_id`) REFERENCES `homes`(`id`)
+ON UPDATE CASCADE ON DELETE CASCADE;
+
+ALTER TABLE `reading_rollups_1d`
+ADD CONSTRAINT `fk_reading_rollups_1d_device_id`
+FOREIGN KEY(`device_id`) REFERENCES `devices`(`id`)
+ON UPDATE CASCADE ON DELETE CASCADE;
+
+ALTER TABLE `reading_rollups_1d`
+ADD CONSTRAINT `fk_reading_rollups_1d_home_id`
+FOREIGN KEY(`home_id`) REFERENCES `homes`(`id`)
+ON UPDATE CASCADE ON DELETE CASCADE;
+
 ALTER TABLE `events`
 ADD CONSTRAINT `fk_events_home_id`
 FOREIGN KEY(`home_id`) REFERENCES `homes`(`id`)
@@ -4,14 +4,29 @@ Script para verificar la comunicacion ESP32 <-> Backend.
 
 Ejecutar:
     python test_communication.py
+    python test_communication.py load --devices 200 --duration 120   # simulador de flota
+
+El modo `load` simula N ESP32 virtuales contra una instancia local (asyncio y
+HTTP/1.1 sobre sockets, sin dependencias): cada uno envia el JSON del firmware
+a POST /api cada 5 s y hace polling de GET /api/control, con jitter configurable
+y "tormentas" de reconexion en las que todos los dispositivos se reconectan y
+envian a la vez (como tras un corte de WiFi). Reporta latencia p50/p95/p99,
+tasa de errores y RPS logrados.
 """
 
 from __future__ import annotations
 
+import argparse
+import asyncio
 import io
 import json
+import random
 import sys
+import time
+from collections import Counter
 from datetime import datetime
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
 
 # Asegurar salida UTF-8 en Windows
 if sys.platform == "win32":
@@ -168,5 +183,281 @@ def main():
     return 1
 
 
+# ==== Simulador de flota (modo `load`) ====
+
+
+class RawHttpClient:
+    """Minimal HTTP/1.1 client over asyncio streams (keep-alive optional)."""
+
+    def __init__(self, host: str, port: int, keepalive: bool, timeout: float):
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.connects = 0
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def close(self):
+        writer, self._reader, self._writer = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def request(self, method: str, path: str, body: bytes | None = None, headers: Dict[str, str] | None = None) -> Tuple[int, bytes]:
+        return await asyncio.wait_for(self._request(method, path, body, headers or {}), self.timeout)
+
+    async def _request(self, method: str, path: str, body: bytes | None, headers: Dict[str, str]) -> Tuple[int, bytes]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            self.connects += 1
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host}:{self.port}",
+            f"Connection: {'keep-alive' if self.keepalive else 'close'}",
+        ]
+        lines += [f"{key}: {value}" for key, value in headers.items()]
+        if body is not None:
+            lines += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+        try:
+            self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + (body or b""))
+            await self._writer.drain()
+            status, response_headers = await self._read_head()
+            payload = await self._read_body(response_headers)
+        except BaseException:
+            await self.close()
+            raise
+        if not self.keepalive or response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, payload
+
+    async def _read_head(self) -> Tuple[int, Dict[str, str]]:
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError("conexion cerrada por el servidor")
+        status = int(status_line.split()[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return status, headers
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+    async def _read_body(self, headers: Dict[str, str]) -> bytes:
+        if "content-length" in headers:
+            return await self._reader.readexactly(int(headers["content-length"]))
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self._reader.readline()
+                    return b"".join(chunks)
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readline()
+        # Sin longitud: el cuerpo termina al cerrar la conexion
+        self.keepalive = False
+        return await self._reader.read()
+
+
+class FleetStats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {"ingest": [], "control": []}
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.failed: Counter = Counter()
+        self.requests = 0
+
+    def record(self, kind: str, started: float, status: int | None = None, error: str | None = None):
+        """Latencia solo de respuestas completas; timeouts y errores de conexion se cuentan aparte."""
+
+        self.requests += 1
+        if error is not None:
+            self.failed[kind] += 1
+            self.errors[f"{kind}:{error}"] += 1
+        else:
+            self.latencies[kind].append((time.perf_counter() - started) * 1000)
+            self.statuses[status] += 1
+            if status >= 400:
+                self.errors[f"{kind}:HTTP {status}"] += 1
+
+
+class StormSignal:
+    """Coordina las tormentas de reconexion: cada `fire` despierta a toda la flota a la vez."""
+
+    def __init__(self):
+        self.generation = 0
+        self._event = asyncio.Event()
+
+    def fire(self):
+        self.generation += 1
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def sleep(self, delay: float, generation: int):
+        if generation != self.generation:
+            return
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=max(0.0, delay))
+        except asyncio.TimeoutError:
+            pass
+
+
+def _jittered(interval: float, jitter: float) -> float:
+    return max(0.05, interval * (1 + random.uniform(-jitter, jitter)))
+
+
+async def _virtual_device(index: int, args, host: str, port: int, stats: FleetStats, storm: StormSignal, deadline: float):
+    loop = asyncio.get_running_loop()
+    name = f"{args.prefix}-{index}"
+    client = RawHttpClient(host, port, args.keepalive, args.timeout)
+    headers = {"X-API-Key": args.token} if args.token else {}
+    state = {"led1": False, "led2": False, "door_open": False, "door_angle": 0}
+
+    await asyncio.sleep(random.uniform(0, args.ramp))
+    next_post = next_poll = loop.time()
+    generation = storm.generation
+    try:
+        while loop.time() < deadline:
+            if storm.generation != generation:
+                generation = storm.generation
+                if random.random() < args.storm_fraction:
+                    # Tormenta: se pierde la conexion y todos envian de inmediato
+                    await client.close()
+                    next_post = next_poll = loop.time()
+
+            now = loop.time()
+            if now >= next_post:
+                payload = {
+                    "device": name,
+                    "temp": round(22 + random.gauss(0, 1.5), 2),
+                    "hum": round(55 + random.gauss(0, 5), 2),
+                    "motion": random.random() < 0.1,
+                    **state,
+                }
+                started = time.perf_counter()
+                try:
+                    status, _ = await client.request("POST", "/api", json.dumps(payload).encode(), headers)
+                    stats.record("ingest", started, status)
+                except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+                    stats.record("ingest", started, error=type(exc).__name__)
+                next_post = max(next_post + _jittered(args.interval, args.jitter), loop.time())
+
+            if args.poll_interval > 0 and loop.time() >= next_poll:
+                started = time.perf_counter()
+                try:
+                    status, body = await client.request("GET", f"/api/control?device={name}", None, headers)
+                    stats.record("control", started, status)
+                    if status == 200:
+                        # Igual que el firmware: aplica los controles recibidos
+                        text = body.decode("utf-8", "replace")
+                        for key in ("led1", "led2", "door_open"):
+                            value = parse_bool_control(text, key)
+                            if value is not None:
+                                state[key] = value
+                except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+                    stats.record("control", started, error=type(exc).__name__)
+                next_poll = max(next_poll + _jittered(args.poll_interval, args.jitter), loop.time())
+
+            wake = min(next_post, next_poll if args.poll_interval > 0 else next_post, deadline)
+            await storm.sleep(wake - loop.time(), generation)
+    finally:
+        await client.close()
+    return client.connects
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+async def _fleet(args) -> int:
+    url = urlsplit(args.url)
+    host, port = url.hostname or "127.0.0.1", url.port or 80
+    stats = FleetStats()
+    storm = StormSignal()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + args.duration
+
+    async def storms():
+        while args.storm_every > 0:
+            await asyncio.sleep(args.storm_every)
+            if loop.time() >= deadline:
+                return
+            print(f"[{loop.time() - started:6.1f}s] tormenta de reconexion")
+            storm.fire()
+
+    async def progress():
+        last = 0
+        while True:
+            await asyncio.sleep(args.report_every)
+            done = stats.requests
+            print(
+                f"[{loop.time() - started:6.1f}s] {(done - last) / args.report_every:8.1f} req/s"
+                f"  errores {sum(stats.errors.values())}"
+            )
+            last = done
+
+    helpers = [asyncio.create_task(storms()), asyncio.create_task(progress())]
+    connects = await asyncio.gather(
+        *(_virtual_device(i, args, host, port, stats, storm, deadline) for i in range(args.devices))
+    )
+    for task in helpers:
+        task.cancel()
+    elapsed = loop.time() - started
+
+    errors = sum(stats.errors.values())
+    error_rate = errors / stats.requests if stats.requests else 0.0
+    print("\n" + "=" * 70)
+    print(f"FLOTA: {args.devices} dispositivos, {elapsed:.1f} s contra {args.url}")
+    print("=" * 70)
+    print(f"Requests: {stats.requests}  RPS logrados: {stats.requests / elapsed:.1f}  conexiones: {sum(connects)}")
+    for kind, values in stats.latencies.items():
+        if values:
+            print(
+                f"{kind:<8} n={len(values):<7} p50 {_percentile(values, 50):8.2f} ms"
+                f"  p95 {_percentile(values, 95):8.2f} ms  p99 {_percentile(values, 99):8.2f} ms"
+                f"  max {max(values):8.2f} ms  sin respuesta {stats.failed[kind]}"
+            )
+        elif stats.failed[kind]:
+            print(f"{kind:<8} n=0       sin respuesta {stats.failed[kind]}")
+    print(f"Status: {dict(sorted(stats.statuses.items()))}")
+    print(f"Errores: {errors} ({error_rate:.2%})" + (f" {dict(stats.errors.most_common(5))}" if errors else ""))
+    return 0 if error_rate <= args.max_error_rate else 1
+
+
+def run_fleet(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="test_communication.py load", description="Simulador de flota de ESP32.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Instancia local a probar.")
+    parser.add_argument("--devices", type=int, default=50, help="Dispositivos virtuales.")
+    parser.add_argument("--duration", type=float, default=60.0, help="Segundos de prueba.")
+    parser.add_argument("--interval", type=float, default=5.0, help="Segundos entre POST /api (como el firmware).")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="Segundos entre GET /api/control (0 = sin polling).")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Variacion relativa de los intervalos (0.2 = +-20%%).")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Segundos en los que se reparten los arranques.")
+    parser.add_argument("--storm-every", type=float, default=0.0, help="Segundos entre tormentas de reconexion (0 = ninguna).")
+    parser.add_argument("--storm-fraction", type=float, default=1.0, help="Fraccion de la flota que se reconecta en cada tormenta.")
+    parser.add_argument("--keepalive", action="store_true", help="Reutiliza la conexion (por defecto una por request, como el firmware).")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Timeout por request en segundos.")
+    parser.add_argument("--token", default="", help="X-API-Key si el backend usa API_TOKEN.")
+    parser.add_argument("--prefix", default="sim", help="Prefijo del nombre de los dispositivos.")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Segundos entre lineas de progreso.")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Tasa de errores tolerada para salir con 0.")
+    args = parser.parse_args(argv)
+    try:
+        return asyncio.run(_fleet(args))
+    except KeyboardInterrupt:  # pragma: no cover - helper script
+        return 130
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "load":
+        sys.exit(run_fleet(sys.argv[2:]))
     sys.exit(main())
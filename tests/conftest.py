@@ -0,0 +1,62 @@
+import os
+import sys
+
+import pytest
+
+# Permite correr `pytest` desde la raiz sin instalar el paquete
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Antes de importar la app: modo local (REMOTE_API_ROOT se lee al importar
+# app.controllers.devices) y SQLite (la config se lee al importar app.config)
+os.environ["REMOTE_API_ROOT"] = ""
+os.environ.setdefault("DATABASE_URI", "sqlite://")
+os.environ.setdefault("STATE_BACKEND", "memory")
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Fabrica de apps sobre un SQLite nuevo; los kwargs sobrescriben la config."""
+
+    from app import create_app, db
+    from app.config import Config
+    from app.controllers import devices
+    from app.repositories.reading_repository import get_write_buffer
+    from app.services import state_store
+    from app.services.event_log import event_log
+    from app.services.rule_engine import rule_engine
+
+    apps = []
+
+    def factory(**overrides):
+        monkeypatch.setattr(state_store, "_stores", {})
+        # Los ControlService de modulo guardan el store de la app anterior
+        for service in (devices.control_service, rule_engine.control_service):
+            monkeypatch.setattr(service, "_store", None)
+        overrides.setdefault("SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / f'app{len(apps)}.db'}")
+        overrides.setdefault("STATE_SQLITE_PATH", str(tmp_path / "state.sqlite3"))
+        for key, value in overrides.items():
+            monkeypatch.setattr(Config, key, value, raising=False)
+        app = create_app()
+        app.config["TESTING"] = True
+        apps.append(app)
+        return app
+
+    yield factory
+
+    for app in apps:
+        for buffer in (get_write_buffer(), event_log._buffer):
+            if buffer is not None:
+                buffer.stop()
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
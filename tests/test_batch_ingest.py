@@ -0,0 +1,89 @@
+from app.controllers import devices
+from app.models import Device, DeviceState, Reading
+
+
+def test_batch_is_written_and_state_follows_newest_sample(app, client):
+    samples = [
+        {"ts": 1_700_000_030, "temp": 23.0, "door_open": False},
+        {"ts": 1_700_000_010, "temp": 21.0, "door_open": True},
+        {"ts": 1_700_000_020, "temp": 22.0, "hum": 50},
+    ]
+    resp = client.post("/api/batch", json={"device": "gw-1", "samples": samples})
+
+    assert resp.status_code == 200
+    with app.app_context():
+        temps = [
+            reading.value
+            for reading in Reading.query.filter(Reading.measure == "TEMPERATURE").order_by(Reading.timestamp).all()
+        ]
+        device = Device.query.filter_by(name="gw-1").one()
+        assert temps == [21.0, 22.0, 23.0]
+        # La muestra mas nueva (ts 30) tiene la puerta cerrada
+        assert device.state == DeviceState.CLOSED
+
+
+def test_per_sample_device_overrides_default(app, client):
+    resp = client.post("/api/batch", json=[{"device": "a", "temp": 1}, {"device": "b", "temp": 2}])
+
+    assert resp.status_code == 200
+    with app.app_context():
+        assert {device.name for device in Device.query.all()} >= {"a", "b"}
+
+
+def test_invalid_sample_rejects_whole_batch_with_index(app, client):
+    samples = [{"temp": 20}, {"temp": 21}, {"temp": "caliente"}]
+    resp = client.post("/api/batch", json={"device": "gw-2", "samples": samples})
+
+    assert resp.status_code == 400
+    body = resp.get_json()
+    assert body["error"] == "invalid_sample"
+    assert body["index"] == 2
+    with app.app_context():
+        assert Reading.query.count() == 0
+
+
+def test_non_finite_and_boolean_values_are_rejected(client):
+    assert client.post("/api/batch", json=[{"temp": float("nan")}]).status_code == 400
+    assert client.post("/api/batch", json=[{"hum": True}]).status_code == 400
+    assert client.post("/api/batch", json=[{"device": 5, "temp": 1}]).status_code == 400
+
+
+def test_payload_shape_is_validated(client):
+    assert client.post("/api/batch", json={"samples": "x"}).status_code == 400
+    assert client.post("/api/batch", json=[1, 2]).status_code == 400
+    assert client.post("/api/batch", json={"device": 3, "samples": []}).status_code == 400
+
+
+def test_batch_size_limit(make_app):
+    client = make_app(INGEST_BATCH_MAX=2).test_client()
+
+    resp = client.post("/api/batch", json=[{"temp": 1}, {"temp": 2}, {"temp": 3}])
+
+    assert resp.status_code == 413
+    assert resp.get_json()["max"] == 2
+
+
+def test_proxy_mode_forwards_batch(app, monkeypatch):
+    calls = []
+
+    class Response:
+        status_code = 202
+
+        def json(self):
+            return {"status": "queued"}
+
+    class Upstream:
+        def post(self, path, json=None, headers=None):
+            calls.append((path, json))
+            return Response()
+
+    monkeypatch.setattr(devices, "REMOTE_API_ROOT", "http://upstream.test")
+    monkeypatch.setattr(devices, "_upstream_client", Upstream())
+
+    payload = {"device": "gw-3", "samples": [{"temp": 20}]}
+    resp = app.test_client().post("/api/batch", json=payload)
+
+    assert resp.status_code == 202
+    assert calls == [("/api/batch", payload)]
+    with app.app_context():
+        assert Reading.query.count() == 0
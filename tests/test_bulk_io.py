@@ -0,0 +1,47 @@
+import pytest
+
+from app import db
+from app.models import DeviceLatest, Reading
+from app.services.bulk_io import BulkTransfer
+
+BASE = 1_700_000_000
+
+
+def _readings():
+    return sorted(
+        (row.device_id, row.home_id, row.measure, row.value, row.timestamp) for row in Reading.query.all()
+    )
+
+
+def _latest():
+    return sorted((row.device_id, row.measure, row.value, row.timestamp) for row in DeviceLatest.query.all())
+
+
+@pytest.mark.parametrize("filename", ["readings.csv", "readings.jsonl", "readings.csv.gz", "readings.jsonl.gz"])
+def test_export_import_round_trip(app, client, tmp_path, filename):
+    samples = [{"ts": BASE + i * 30, "temp": 20 + i * 0.25, "hum": 40 + i % 5, "motion": i % 2} for i in range(40)]
+    client.post("/api/batch", json={"device": "io-1", "samples": samples})
+    client.post("/api/batch", json={"device": "io-2", "samples": samples[:7]})
+    path = str(tmp_path / filename)
+
+    with app.app_context():
+        before, latest = _readings(), _latest()
+        assert len(before) == 47 * 3
+        transfer = BulkTransfer("readings")
+        assert transfer.export(path, chunk_size=16) == len(before)
+
+        Reading.query.delete()
+        DeviceLatest.query.delete()
+        db.session.commit()
+
+        assert transfer.import_(path, batch_size=25) == len(before)
+        assert _readings() == before
+        # device_latest se reconstruye con el valor mas nuevo de cada medida
+        assert _latest() == latest
+
+
+def test_unknown_table_and_format_are_rejected(app, tmp_path):
+    with pytest.raises(ValueError):
+        BulkTransfer("users")
+    with app.app_context(), pytest.raises(ValueError):
+        BulkTransfer("readings").export(str(tmp_path / "readings.xml"))
@@ -0,0 +1,112 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.compression import DeadbandFilter, SampleCompressor, SwingingDoorFilter, stored_fields
+
+T0 = datetime(2024, 1, 1)
+
+
+def _walk(n, seed, step=0.2):
+    rng = random.Random(seed)
+    value, points = 20.0, []
+    for i in range(n):
+        value += rng.uniform(-step, step)
+        points.append((T0 + timedelta(seconds=5 * i), value))
+    return points
+
+
+def _interpolate(stored, t):
+    for (t0, v0), (t1, v1) in zip(stored, stored[1:]):
+        if t0 <= t <= t1:
+            if t1 == t0:
+                return v0
+            return v0 + (v1 - v0) * (t - t0).total_seconds() / (t1 - t0).total_seconds()
+    raise AssertionError(f"{t} fuera de los puntos guardados")
+
+
+def test_deadband_error_is_bounded_by_tolerance():
+    flt = DeadbandFilter(tolerance=0.3, max_interval=1e9)
+    last = None
+    kept = 0
+    for t, v in _walk(2000, seed=1):
+        emitted = flt.offer(t, v)
+        if emitted:
+            last = emitted[0][1]
+            kept += 1
+        assert abs(v - last) <= 0.3
+    assert kept < 2000 / 2
+
+
+def test_deadband_keeps_a_point_every_max_interval():
+    flt = DeadbandFilter(tolerance=10, max_interval=60)
+    kept = [t for i in range(100) for t, _ in flt.offer(T0 + timedelta(seconds=10 * i), 20.0)]
+
+    assert all((b - a).total_seconds() <= 60 for a, b in zip(kept, kept[1:]))
+    assert len(kept) == 17
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_swinging_door_reconstruction_stays_within_tolerance(seed):
+    tolerance = 0.25
+    flt = SwingingDoorFilter(tolerance=tolerance, max_interval=1e9)
+    points = _walk(3000, seed=seed)
+    stored = []
+    for t, v in points:
+        stored.extend(flt.offer(t, v))
+
+    assert len(stored) < len(points) / 3
+    assert stored == sorted(stored)
+    for t, v in points:
+        if t > stored[-1][0]:
+            break  # el tramo final sigue retenido en la puerta
+        assert abs(_interpolate(stored, t) - v) <= tolerance + 1e-9
+
+
+def test_swinging_door_flushes_held_point_on_max_interval():
+    flt = SwingingDoorFilter(tolerance=1, max_interval=30)
+    out = []
+    for i in range(10):
+        out.extend(flt.offer(T0 + timedelta(seconds=10 * i), 20.0))
+
+    assert out[0] == (T0, 20.0)
+    assert all((b[0] - a[0]).total_seconds() <= 30 for a, b in zip(out, out[1:]))
+
+
+def _sample(ts, **values):
+    return {"device_id": 1, "home_id": 1, "timestamp": T0 + timedelta(seconds=ts), **values}
+
+
+def test_readings_storage_compresses_only_stored_fields():
+    compressor = SampleCompressor("deadband", {"temp": 0.5}, fields=stored_fields("readings"))
+    samples = [_sample(i, temp=20.0, hum=50.0, motion=0, door_open=True, door_angle=90) for i in range(10)]
+
+    compressor.compress(samples)
+
+    # 10 muestras x temp/hum/motion; la puerta no se guarda en readings
+    assert compressor.stats()["received"] == 30
+    assert compressor.stats()["persisted"] == 3
+    assert samples[0]["persist"] == {"temp", "hum", "motion"}
+    assert all(sample["persist"] == set() for sample in samples[1:])
+
+
+def test_samples_storage_also_compresses_door():
+    compressor = SampleCompressor("deadband", {}, fields=stored_fields("samples"))
+    samples = [_sample(i, temp=20.0, door_open=i >= 5) for i in range(10)]
+
+    compressor.compress(samples)
+
+    assert compressor.stats()["received"] == 20
+    assert [sorted(sample["persist"]) for sample in samples if sample["persist"]] == [
+        ["door_open", "temp"],
+        ["door_open"],
+    ]
+
+
+def test_compression_off_keeps_everything():
+    compressor = SampleCompressor("off")
+    samples = [_sample(i, temp=20.0) for i in range(3)]
+
+    assert compressor.compress(samples) is samples
+    assert all("persist" not in sample for sample in samples)
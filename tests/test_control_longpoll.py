@@ -0,0 +1,64 @@
+import threading
+import time
+
+from app.controllers import devices
+
+
+def test_etag_and_304(client):
+    first = client.get("/api/control?device=lp-1")
+    etag = first.headers["ETag"]
+
+    assert first.status_code == 200
+    again = client.get("/api/control?device=lp-1", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+
+    client.post("/api/control", json={"device": "lp-1", "led1": True})
+    changed = client.get("/api/control?device=lp-1", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert {"control": "led1", "value": True} in [
+        {"control": item["control"], "value": item["value"]} for item in changed.get_json()
+    ]
+
+
+def test_long_poll_returns_when_controls_change(app, client):
+    etag = client.get("/api/control?device=lp-2").headers["ETag"]
+
+    def change():
+        time.sleep(0.2)
+        with app.app_context():
+            devices.control_service.set_controls("lp-2", {"led2": True})
+
+    worker = threading.Thread(target=change)
+    worker.start()
+    started = time.monotonic()
+    resp = client.get("/api/control?device=lp-2&wait=5", headers={"If-None-Match": etag})
+    elapsed = time.monotonic() - started
+    worker.join()
+
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert 0.1 < elapsed < 4
+
+
+def test_long_poll_times_out_with_304(client):
+    etag = client.get("/api/control?device=lp-3").headers["ETag"]
+
+    started = time.monotonic()
+    resp = client.get("/api/control?device=lp-3&wait=0.3", headers={"If-None-Match": etag})
+
+    assert resp.status_code == 304
+    assert time.monotonic() - started >= 0.25
+
+
+def test_long_poll_without_free_slot_answers_immediately(make_app, monkeypatch):
+    monkeypatch.setattr(devices, "_slots", {})
+    client = make_app(CONTROL_LONGPOLL_MAX_WAITERS=0).test_client()
+    etag = client.get("/api/control?device=lp-4").headers["ETag"]
+
+    started = time.monotonic()
+    resp = client.get("/api/control?device=lp-4&wait=5", headers={"If-None-Match": etag})
+
+    assert resp.status_code == 304
+    assert time.monotonic() - started < 1
@@ -0,0 +1,74 @@
+import numpy as np
+
+from app.services.downsampling import lttb, minmax
+
+
+def test_lttb_returns_everything_when_under_threshold():
+    x = np.arange(5, dtype=float)
+    assert list(lttb(x, x, 5)) == [0, 1, 2, 3, 4]
+    assert list(lttb(x, x, 100)) == [0, 1, 2, 3, 4]
+    assert list(lttb(x[:2], x[:2], 1)) == [0, 1]
+    assert list(lttb(x[:0], x[:0], 10)) == []
+
+
+def test_lttb_tiny_threshold_keeps_endpoints():
+    x = np.arange(50, dtype=float)
+    assert list(lttb(x, np.sin(x), 2)) == [0, 49]
+    assert list(lttb(x, np.sin(x), 1)) == [0, 49]
+
+
+def test_lttb_selects_threshold_sorted_points_and_keeps_spikes():
+    rng = np.random.default_rng(7)
+    x = np.arange(10_000, dtype=float)
+    y = rng.normal(20, 0.1, size=x.size)
+    y[4321] = 80.0
+    y[7777] = -40.0
+
+    idx = lttb(x, y, 300)
+
+    assert len(idx) == 300
+    assert idx[0] == 0 and idx[-1] == x.size - 1
+    assert np.all(np.diff(idx) > 0)
+    assert 4321 in idx and 7777 in idx
+
+
+def test_lttb_threshold_three_picks_one_interior_point():
+    x = np.arange(10, dtype=float)
+    y = np.zeros(10)
+    y[6] = 5
+    assert list(lttb(x, y, 3)) == [0, 6, 9]
+
+
+def test_minmax_empty_and_constant_time():
+    empty = np.array([], dtype=float)
+    lo, hi = minmax(empty, empty, empty, 10)
+    assert lo.size == 0 and hi.size == 0
+
+    x = np.full(4, 100.0)
+    y = np.array([3.0, 1.0, 4.0, 2.0])
+    lo, hi = minmax(x, y, y, 10)
+    assert list(lo) == [1] and list(hi) == [2]
+
+
+def test_minmax_buckets_cover_extremes():
+    rng = np.random.default_rng(3)
+    x = np.sort(rng.uniform(0, 1000, size=5000))
+    y = rng.normal(size=x.size)
+
+    lo, hi = minmax(x, y, y, 100)
+
+    assert len(lo) == len(hi) <= 50
+    assert int(np.argmin(y)) in lo
+    assert int(np.argmax(y)) in hi
+    assert np.all(np.diff(lo) > 0) and np.all(np.diff(hi) > 0)
+    assert np.all(y[lo] <= y[hi])
+
+
+def test_minmax_uses_separate_min_and_max_arrays():
+    x = np.array([0.0, 1.0, 2.0, 3.0])
+    y_min = np.array([5.0, 1.0, 6.0, 7.0])
+    y_max = np.array([9.0, 8.0, 20.0, 10.0])
+
+    lo, hi = minmax(x, y_min, y_max, 2)
+
+    assert list(lo) == [1] and list(hi) == [2]
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from app.models import Event, EventOrigin
+from app.services.event_log import EventLog, event_log
+from app.services.state_store import SQLiteStateStore
+
+BASE = 1_700_000_000
+T0 = datetime(2024, 1, 1)
+
+
+def _events(app):
+    event_log.flush()
+    with app.app_context():
+        return [
+            (event.detail, event.prev_value, event.next_value)
+            for event in Event.query.filter(Event.origin == EventOrigin.SYSTEM).order_by(Event.timestamp, Event.id)
+        ]
+
+
+def test_transitions_are_logged_once_per_change(app, client):
+    for led1 in (True, True, False, False):
+        client.post("/api", json={"device": "ev-1", "temp": 20, "led1": led1})
+
+    # El primer valor solo sirve de referencia; True -> True no es transicion
+    assert _events(app) == [("led1: on -> off", 1.0, 0.0)]
+    assert event_log.stats()["transitions"] == 1
+
+
+def test_batch_transitions_follow_timestamp_order_and_skip_late_samples(app, client):
+    samples = [
+        {"ts": BASE + 20, "door_open": False},
+        {"ts": BASE, "door_open": False},
+        {"ts": BASE + 10, "door_open": True},
+    ]
+    client.post("/api/batch", json={"device": "ev-2", "samples": samples})
+    assert _events(app) == [("door_open: closed -> open", 0.0, 1.0), ("door_open: open -> closed", 1.0, 0.0)]
+
+    # Un lote atrasado no reescribe el estado actual ni genera eventos
+    client.post("/api/batch", json={"device": "ev-2", "samples": [{"ts": BASE + 5, "door_open": True}]})
+    assert len(_events(app)) == 2
+
+
+class Captured:
+    def __init__(self):
+        self.rows = []
+
+    def append(self, rows):
+        self.rows.extend(rows)
+
+
+def _worker(path):
+    log = EventLog()
+    log._store = SQLiteStateStore(path, "device_states")
+    log._buffer = Captured()
+    return log
+
+
+def test_workers_sharing_the_store_log_a_transition_once(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    first, second = _worker(path), _worker(path)
+
+    first.observe(1, 1, {"led2": False}, T0)
+    second.observe(1, 1, {"led2": True}, T0 + timedelta(seconds=1))
+    # El otro worker ya ve el estado nuevo: repetir el valor no es transicion
+    first.observe(1, 1, {"led2": True}, T0 + timedelta(seconds=2))
+
+    assert first._buffer.rows == []
+    assert [row["detail"] for row in second._buffer.rows] == ["led2: off -> on"]
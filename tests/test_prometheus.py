@@ -0,0 +1,80 @@
+import re
+from collections import defaultdict
+
+SAMPLE = re.compile(
+    r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)'
+    r'(?:\{(?P<labels>[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*"(?:,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\\n]|\\.)*")*)\})?'
+    r' (?P<value>[-+]?(?:\d+(?:\.\d*)?(?:[eE][-+]?\d+)?|Inf|NaN))$'
+)
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def _parse(text):
+    types, samples = {}, []
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ", 3)
+            types[name] = kind
+        elif line.startswith("# HELP "):
+            assert len(line.split(" ", 3)) == 4, line
+        else:
+            match = SAMPLE.match(line)
+            assert match, f"linea invalida: {line!r}"
+            labels = dict(LABEL.findall(match["labels"] or ""))
+            samples.append((match["name"], labels, float(match["value"])))
+    return types, samples
+
+
+def _family(name, types):
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and types.get(name[: -len(suffix)]) == "histogram":
+            return name[: -len(suffix)]
+    return name
+
+
+def test_metrics_exposition_format(client):
+    client.post("/api", json={"device": "prom-1", "temp": 21})
+    client.get("/api/telemetry/latest?device=prom-1")
+    client.get("/api/telemetry/latest?device=prom-1")
+
+    resp = client.get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["Content-Type"] == "text/plain; version=0.0.4; charset=utf-8"
+    types, samples = _parse(resp.get_data(as_text=True))
+
+    # Cada serie pertenece a una familia declarada con TYPE
+    for name, _labels, _value in samples:
+        assert _family(name, types) in types, name
+
+    buckets = defaultdict(list)
+    totals = {}
+    for name, labels, value in samples:
+        family = _family(name, types)
+        if types.get(family) != "histogram":
+            continue
+        series = tuple(sorted((k, v) for k, v in labels.items() if k != "le"))
+        if name.endswith("_bucket"):
+            buckets[(family, series)].append((labels["le"], value))
+        elif name.endswith("_count"):
+            totals[(family, series)] = value
+
+    latency = (("blueprint", "devices"), ("endpoint", "devices.latest_telemetry"))
+    assert ("smarthome_http_request_duration_seconds", latency) in buckets
+    for key, series in buckets.items():
+        values = [value for _le, value in series]
+        assert series[-1][0] == "+Inf", key
+        assert values == sorted(values), key
+        assert totals[key] == values[-1], key
+
+    requests = {
+        (labels["endpoint"], labels["status"]): value
+        for name, labels, value in samples
+        if name == "smarthome_http_requests_total"
+    }
+    assert requests[("devices.latest_telemetry", "200")] >= 2
+
+
+def test_metrics_disabled_answers_404(make_app):
+    client = make_app(METRICS_ENABLED=False).test_client()
+    assert client.get("/metrics").status_code == 404
@@ -0,0 +1,117 @@
+import time
+
+from app.controllers import devices
+from app.services.proxy_cache import CircuitBreaker, ProxyCache
+from app.services.upstream_client import UpstreamClient
+
+
+class Upstream:
+    """fetch de prueba: devuelve valores crecientes o falla con `status`."""
+
+    def __init__(self):
+        self.calls = 0
+        self.status = 200
+
+    def __call__(self):
+        self.calls += 1
+        if self.status != 200:
+            return None, self.status, {"error": "remote_error"}
+        return {"temp": self.calls}, 200, None
+
+
+def _inline_cache(**kwargs):
+    # Los refresh en segundo plano se guardan y el test los corre cuando quiere
+    cache = ProxyCache(submit=lambda fn: cache.pending.append(fn), **kwargs)
+    cache.pending = []
+    return cache
+
+
+def test_fresh_entries_are_served_from_memory():
+    upstream = Upstream()
+    cache = _inline_cache(ttl=60)
+
+    assert cache.get("k", upstream)[0] == {"temp": 1}
+    assert cache.get("k", upstream)[0] == {"temp": 1}
+    assert upstream.calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_stale_entry_is_served_while_refreshing():
+    upstream = Upstream()
+    cache = _inline_cache(ttl=0.05, stale_ttl=10)
+    cache.get("k", upstream)
+    time.sleep(0.06)
+
+    stale = cache.get("k", upstream)
+    # Un solo refresh aunque llegue otro lector mientras esta en curso
+    cache.get("k", upstream)
+
+    assert stale[0] == {"temp": 1}
+    assert upstream.calls == 1
+    assert len(cache.pending) == 1
+    assert cache.stats()["stale_hits"] == 2
+    cache.pending.pop()()
+    assert cache.get("k", upstream)[0] == {"temp": 2}
+
+
+def test_breaker_opens_and_last_good_value_is_served():
+    upstream = Upstream()
+    cache = _inline_cache(ttl=0, stale_ttl=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    cache.get("k", upstream)
+    upstream.status = 500
+
+    for _ in range(2):
+        assert cache.get("k", upstream)[0] == {"temp": 1}
+    assert cache.breaker.state == "open"
+
+    calls = upstream.calls
+    assert cache.get("k", upstream)[0] == {"temp": 1}
+    assert upstream.calls == calls
+    assert cache.stats()["fallbacks"] >= 3
+
+
+def test_open_breaker_without_cached_value_answers_503():
+    upstream = Upstream()
+    upstream.status = 502
+    cache = _inline_cache(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+
+    assert cache.get("k", upstream)[1] == 502
+    assert cache.get("k", upstream)[1] == 503
+    assert upstream.calls == 1
+
+
+def test_fetch_exception_counts_as_failure_and_half_open_recovers():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    cache = _inline_cache(ttl=0, stale_ttl=0, breaker=breaker)
+
+    def boom():
+        raise ValueError("bad json")
+
+    assert cache.get("k", boom)[1] == 502
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert cache.get("k", Upstream())[1] == 200
+    assert breaker.state == "closed"
+
+
+def test_latest_telemetry_fans_out_without_app_context(app, monkeypatch):
+    class Response:
+        status_code = 200
+
+        def __init__(self, path):
+            self.path = path
+
+        def json(self):
+            return {"device": "esp32-1", "value": len(self.path), "time": "2024-01-01T00:00:00"}
+
+    client = UpstreamClient.from_config("http://upstream.test", app.config)
+    monkeypatch.setattr(client, "get", lambda path, **kwargs: Response(path))
+    monkeypatch.setattr(devices, "REMOTE_API_ROOT", "http://upstream.test")
+    monkeypatch.setattr(devices, "_upstream_client", client)
+    monkeypatch.setattr(devices, "_sensor_cache", None)
+
+    body = app.test_client().get("/api/telemetry/latest").get_json()
+
+    assert body["metrics"] == {"temp": len("/api/temp"), "hum": len("/api/hum"), "motion": len("/api/motion")}
+    assert devices._sensor_cache.stats()["misses"] == 3
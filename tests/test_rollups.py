@@ -0,0 +1,67 @@
+from collections import defaultdict
+
+from app.models import Home, Reading, ReadingRollupDay, ReadingRollupHour, ReadingRollupMinute
+from app.repositories import RollupRepository
+
+BASE = 1_700_000_000  # 2023-11-14 22:13:20 UTC
+
+
+def _raw_aggregates(home_id, zone, resolution):
+    groups = defaultdict(list)
+    for reading in Reading.query.filter(Reading.home_id == home_id).order_by(Reading.timestamp, Reading.id):
+        start = RollupRepository.bucket_start(reading.timestamp, resolution, zone)
+        groups[(reading.device_id, reading.measure, start)].append(reading)
+    return {
+        key: (
+            min(r.value for r in rows),
+            max(r.value for r in rows),
+            round(sum(r.value for r in rows), 6),
+            len(rows),
+            rows[-1].value,
+        )
+        for key, rows in groups.items()
+    }
+
+
+def _rollups(model):
+    return {
+        (row.device_id, row.measure, row.bucket_start): (
+            row.min_value,
+            row.max_value,
+            round(row.sum_value, 6),
+            row.count,
+            row.last_value,
+        )
+        for row in model.query.all()
+    }
+
+
+def _ingest(client, offsets, device="r-1"):
+    samples = [{"ts": BASE + offset, "temp": 20 + (offset % 7) * 0.5, "hum": 40 + offset % 3} for offset in offsets]
+    assert client.post("/api/batch", json={"device": device, "samples": samples}).status_code == 200
+
+
+def test_rollups_match_raw_aggregates_after_incremental_upserts(app, client):
+    # Tres lotes que caen en los mismos buckets: los rollups se fusionan con upsert
+    _ingest(client, range(0, 180, 7))
+    _ingest(client, range(3, 180, 11))
+    _ingest(client, range(1, 4000, 97), device="r-2")
+
+    with app.app_context():
+        home_id = Home.query.first().id
+        zone = RollupRepository().home_zone(home_id)
+        for model, resolution in ((ReadingRollupMinute, "1m"), (ReadingRollupHour, "1h"), (ReadingRollupDay, "1d")):
+            assert _rollups(model) == _raw_aggregates(home_id, zone, resolution)
+
+
+def test_rebuild_reproduces_incremental_rollups(app, client):
+    _ingest(client, range(0, 600, 13))
+    _ingest(client, range(5, 600, 17))
+
+    with app.app_context():
+        home_id = Home.query.first().id
+        incremental = _rollups(ReadingRollupMinute)
+        RollupRepository().rebuild(home_id, chunk_size=10)
+
+        assert _rollups(ReadingRollupMinute) == incremental
+        assert sum(count for _, _, _, count, _ in incremental.values()) == Reading.query.count()
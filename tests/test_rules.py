@@ -0,0 +1,82 @@
+import pytest
+
+from app import db
+from app.controllers import devices
+from app.models import Device, Event, EventOrigin, Rule, RuleAction
+from app.services.event_log import event_log
+from app.services.rule_engine import RuleError, compile_condition, parse_action, rule_engine
+
+
+@pytest.mark.parametrize(
+    "condition, context, expected",
+    [
+        ("temp > 28", {"temp": 29}, True),
+        ("temp > 28", {"temp": 28}, False),
+        ("temp >= 28 and hum < 60", {"temp": 28, "hum": 59.9}, True),
+        ("temp > 28 or hum > 80 and motion == on", {"temp": 20, "hum": 90, "motion": 0}, False),
+        ("(temp > 28 or hum > 80) and not motion == off", {"temp": 30, "motion": 1}, True),
+        ("door_open == open", {"door_open": 1}, True),
+        ("temp > 28", {}, False),
+    ],
+)
+def test_condition_parsing(condition, context, expected):
+    predicate, _fields = compile_condition(condition)
+    assert predicate(context) is expected
+
+
+def test_condition_fields():
+    assert compile_condition("temp > 1 and (hum < 2 or motion == on)")[1] == {"temp", "hum", "motion"}
+
+
+@pytest.mark.parametrize("condition", ["", "temp >", "temp > 28 and", "(temp > 1", "pressure > 3", "temp ~ 3"])
+def test_invalid_conditions_raise(condition):
+    with pytest.raises(RuleError):
+        compile_condition(condition)
+
+
+def test_parse_action():
+    assert parse_action("led1=on") == ("led1", True)
+    assert parse_action("LED2 = 0") == ("led2", False)
+    assert parse_action("door_angle=270") == ("door_angle", 180)
+    for bad in ("led1", "fan=on", "led1=maybe", "door_angle=abierta"):
+        with pytest.raises(RuleError):
+            parse_action(bad)
+
+
+def _controls(device):
+    return {item["control"]: item["value"] for item in devices.control_service.get_controls(device)}
+
+
+def test_rule_fires_on_rising_edge_only(app, client):
+    client.post("/api/control", json={"device": "rule-dev", "led1": False})
+    client.post("/api", json={"device": "rule-dev", "temp": 20})
+    with app.app_context():
+        device = Device.query.filter_by(name="rule-dev").one()
+        rule = Rule(home_id=device.home_id, condition="temp > 28")
+        db.session.add(rule)
+        db.session.flush()
+        db.session.add(RuleAction(rule_id=rule.id, action_type="led1=on", device_id=device.id))
+        db.session.commit()
+    rule_engine.invalidate()
+
+    client.post("/api", json={"device": "rule-dev", "temp": 30})
+    assert _controls("rule-dev")["led1"] is True
+    assert rule_engine.fired == 1
+
+    # La condicion sigue siendo cierta: no vuelve a disparar
+    client.post("/api/control", json={"device": "rule-dev", "led1": False})
+    client.post("/api", json={"device": "rule-dev", "temp": 31})
+    assert _controls("rule-dev")["led1"] is False
+    assert rule_engine.fired == 1
+
+    # Baja y vuelve a subir: nuevo flanco
+    client.post("/api", json={"device": "rule-dev", "temp": 25})
+    client.post("/api", json={"device": "rule-dev", "temp": 29})
+    assert _controls("rule-dev")["led1"] is True
+    assert rule_engine.fired == 2
+
+    event_log.flush()
+    with app.app_context():
+        rule_events = Event.query.filter(Event.origin == EventOrigin.RULE).all()
+        assert len(rule_events) == 2
+        assert all(event.prev_value == 0.0 and event.next_value == 1.0 for event in rule_events)
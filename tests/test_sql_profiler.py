@@ -0,0 +1,60 @@
+import pytest
+
+from app import db
+from app.models import Device, Home
+
+
+@pytest.fixture
+def profiled(make_app):
+    app = make_app(SQL_PROFILER_ENABLED=True, SQL_PROFILER_N1_THRESHOLD=3, SQL_PROFILER_LOG="off")
+
+    @app.get("/_test/n-plus-one")
+    def n_plus_one():
+        # Patron N+1: una consulta por dispositivo para buscar su hogar
+        names = []
+        for device in Device.query.order_by(Device.id).all():
+            names.append(db.session.get(Home, device.home_id, populate_existing=True).name)
+        return {"homes": names}
+
+    @app.get("/_test/single")
+    def single():
+        return {"devices": Device.query.count()}
+
+    client = app.test_client()
+    for i in range(5):
+        client.post("/api", json={"device": f"sql-{i}", "temp": 20})
+    return client
+
+
+def _report(client, resp):
+    assert resp.status_code == 200
+    report_id = resp.headers["X-SQL-Profile"]
+    assert int(resp.headers["X-SQL-Queries"]) >= 1
+    return client.get(f"/api/metrics/sql/{report_id}").get_json()
+
+
+def test_repeated_statement_is_reported_as_n_plus_one(profiled):
+    report = _report(profiled, profiled.get("/_test/n-plus-one"))
+
+    assert report["endpoint"] == "n_plus_one"
+    [group] = report["n_plus_one"]
+    assert "FROM homes" in group["sql"]
+    assert group["count"] == 5
+    assert group["distinct_params"] == 1
+    assert sum(group["callers"].values()) == 5
+    assert all("n_plus_one" in caller for caller in group["callers"])
+
+
+def test_light_request_has_no_issues(profiled):
+    report = _report(profiled, profiled.get("/_test/single"))
+
+    assert report["queries"] == 1
+    assert report["n_plus_one"] == []
+    issues = profiled.get("/api/metrics/sql?issues=1").get_json()["reports"]
+    assert report["id"] not in [item["id"] for item in issues]
+
+
+def test_profiler_disabled_by_default(client):
+    resp = client.get("/api/telemetry/latest")
+    assert "X-SQL-Profile" not in resp.headers
+    assert client.get("/api/metrics/sql").status_code == 404
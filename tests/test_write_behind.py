@@ -0,0 +1,137 @@
+import time
+
+import pytest
+from sqlalchemy import exc as sa_exc
+
+from app.repositories.write_behind import WriteBehindBuffer, WriteBehindUnavailable
+
+
+def _operational():
+    return sa_exc.OperationalError("INSERT INTO readings", {}, Exception("server has gone away"))
+
+
+class FlakyWriter:
+    """flush_fn de prueba: falla mientras `down` es True y rechaza los items "bad"."""
+
+    def __init__(self):
+        self.down = False
+        self.written = []
+        self.calls = 0
+
+    def __call__(self, batch):
+        self.calls += 1
+        if self.down:
+            raise _operational()
+        if "bad" in batch:
+            raise sa_exc.IntegrityError("INSERT INTO readings", {}, Exception("foreign key"))
+        self.written.extend(batch)
+
+
+def test_failed_batch_is_requeued_in_order():
+    writer = FlakyWriter()
+    buf = WriteBehindBuffer("t", writer, max_rows=100, interval=0.01)
+    buf.append([1, 2, 3])
+    writer.down = True
+    assert buf.flush() is False
+    buf.append([4, 5])
+    assert buf.depth() == 5
+
+    writer.down = False
+    assert buf.flush() is True
+    assert writer.written == [1, 2, 3, 4, 5]
+    assert buf.depth() == 0
+
+
+def test_backoff_grows_and_is_capped():
+    writer = FlakyWriter()
+    writer.down = True
+    buf = WriteBehindBuffer("t", writer, interval=0.1, max_backoff=0.3, max_retries=10)
+    buf.append([1])
+
+    buf.flush()
+    first = buf._retry_at - time.monotonic()
+    buf.flush()
+    second = buf._retry_at - time.monotonic()
+    buf.flush()
+    third = buf._retry_at - time.monotonic()
+
+    assert 0.1 < first <= 0.2
+    assert first < second <= 0.3
+    assert third <= 0.3
+
+
+def test_failing_clears_after_successful_flush():
+    writer = FlakyWriter()
+    writer.down = True
+    buf = WriteBehindBuffer("t", writer, max_retries=2)
+    buf.append([1])
+    buf.flush()
+    buf.flush()
+
+    assert buf.failing
+    with pytest.raises(WriteBehindUnavailable):
+        buf.append([2])
+    assert buf.stats()["bounced_rows"] == 1
+
+    writer.down = False
+    assert buf.flush() is True
+    assert not buf.failing
+    assert buf.stats()["consecutive_failures"] == 0
+    buf.append([3])
+    assert writer.written == [1]
+
+
+def test_poison_rows_are_isolated_and_good_rows_flush():
+    writer = FlakyWriter()
+    buf = WriteBehindBuffer("t", writer, max_retries=1)
+    buf.append([1, 2, "bad", 4, 5, "bad", 7])
+
+    assert buf.flush() is True
+    assert writer.written == [1, 2, 4, 5, 7]
+    stats = buf.stats()
+    assert stats["dead_letter_rows"] == 2
+    assert "IntegrityError" in stats["last_dead_letter"]
+    assert not stats["failing"]
+    assert stats["depth"] == 0
+
+
+def test_operational_error_during_bisection_requeues_the_rest():
+    writer = FlakyWriter()
+    buf = WriteBehindBuffer("t", writer)
+    buf.append([1, "bad", 3, 4])
+
+    original = writer.__call__
+
+    def flaky(batch):
+        if batch == [3, 4]:
+            writer.down = True
+        return original(batch)
+
+    buf.flush_fn = flaky
+    assert buf.flush() is False
+    assert buf.depth() == 2
+    assert buf.stats()["dead_letter_rows"] == 1
+
+    writer.down = False
+    buf.flush_fn = writer
+    assert buf.flush() is True
+    assert writer.written == [1, 3, 4]
+
+
+def test_background_worker_retries_after_backoff():
+    writer = FlakyWriter()
+    writer.down = True
+    buf = WriteBehindBuffer("t", writer, max_rows=1, interval=0.01, max_backoff=0.05)
+    buf.start()
+    try:
+        buf.append([1, 2])
+        deadline = time.monotonic() + 2
+        while writer.calls < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        writer.down = False
+        while writer.written != [1, 2] and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        buf.stop()
+    assert writer.written == [1, 2]
+    assert buf.stats()["failed_flushes"] >= 1